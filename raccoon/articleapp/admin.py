@@ -59,3 +59,18 @@ class PostAdmin(admin.ModelAdmin):
 @admin.register(models.Tag)
 class TagAdmin(admin.ModelAdmin):
     pass
+
+
+@admin.register(models.Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "attempts", "run_at", "progress", "updated_at")
+    list_filter = ("status", "name")
+    readonly_fields = (
+        "attempts",
+        "locked_at",
+        "locked_by",
+        "progress",
+        "error",
+        "created_at",
+        "updated_at",
+    )
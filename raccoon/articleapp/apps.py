@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ArticleappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "articleapp"
+
+    def ready(self):
+        # シグナルハンドラを登録する
+        from . import signals  # noqa: F401
+
+        # runworkerコマンドで実行するタスクを登録する
+        from . import tasks  # noqa: F401
@@ -19,6 +19,18 @@ class ProfileUpdateForm(ModelForm):
             "profile_image": ClearableFileInput(),
         }
 
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # アップロードハンドラ（ProfileImageUploadHandler）が受信中に検出したエラー
+        self.upload_errors = upload_errors or {}
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field_name, message in self.upload_errors.items():
+            if field_name in self.fields:
+                self.add_error(field_name, message)
+        return cleaned_data
+
 
 class AccountUpdateForm(ModelForm):
     class Meta:
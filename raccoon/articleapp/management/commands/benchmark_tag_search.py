@@ -0,0 +1,139 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from articleapp.models import Post, Tag, User
+
+
+class Rollback(Exception):
+    pass
+
+
+def filter_tags_or_chain(tag_names):
+    """
+    比較用: 以前のsearchビューの実装（タグごとのquerysetをORで連結する）
+    """
+    posts_filtered_tags = Post.objects.none()
+    tags = Tag.objects.filter(name__in=tag_names)
+    for tag in tags:
+        posts_filtered_tags = posts_filtered_tags | Post.objects.filter(tags=tag)
+    return posts_filtered_tags.annotate(post_count=Count("id")).filter(
+        post_count__exact=len(tags)
+    )
+
+
+def filter_tags_grouped(tag_names):
+    return Post.objects.filter_tags(tag_names)
+
+
+class Command(BaseCommand):
+    help = (
+        "searchビューのタグによる絞り込みのレイテンシを、投稿数とタグ数ごとに計測する。"
+        "計測用のデータはトランザクション内で作成し、終了時にロールバックする。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--posts",
+            type=int,
+            nargs="+",
+            default=[1000, 10000],
+            help="計測する投稿数（複数指定可）",
+        )
+        parser.add_argument(
+            "--tag-counts",
+            type=int,
+            nargs="+",
+            default=[1, 2, 4, 8],
+            help="1回の検索で指定するタグ数（複数指定可）",
+        )
+        parser.add_argument("--tags", type=int, default=100, help="作成するタグの総数")
+        parser.add_argument("--tags-per-post", type=int, default=5, help="1投稿あたりのタグ数")
+        parser.add_argument("--repeat", type=int, default=20, help="計測の繰り返し回数")
+        parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        implementations = [
+            ("or_chain", filter_tags_or_chain),
+            ("grouped", filter_tags_grouped),
+        ]
+
+        self.stdout.write("posts\ttags\timplementation\tmedian_ms\tp95_ms\tlast_count")
+        for number_of_posts in options["posts"]:
+            try:
+                with transaction.atomic():
+                    tag_names = self.create_data(rng, number_of_posts, options)
+                    for tag_count in options["tag_counts"]:
+                        # 各実装で同じ検索条件を使う
+                        # 結果が空ばかりにならないよう、上位のタグから選ぶ
+                        candidates = tag_names[: max(tag_count * 2, 10)]
+                        samples = [
+                            rng.sample(candidates, tag_count)
+                            for _ in range(options["repeat"])
+                        ]
+                        for name, implementation in implementations:
+                            self.measure(
+                                number_of_posts,
+                                tag_count,
+                                name,
+                                implementation,
+                                samples,
+                            )
+                    raise Rollback()
+            except Rollback:
+                pass
+
+    def create_data(self, rng, number_of_posts, options):
+        user = User.objects.create_user(
+            username=f"benchmark_{rng.getrandbits(32)}", password=None
+        )
+        tags = Tag.objects.bulk_create(
+            [
+                Tag(name=f"benchmark_tag_{rng.getrandbits(32)}_{i}")
+                for i in range(options["tags"])
+            ]
+        )
+        posts = Post.objects.bulk_create(
+            [
+                Post(
+                    title=f"post_{i}",
+                    user=user,
+                    slug=f"benchmark-{i}",
+                    is_published=True,
+                )
+                for i in range(number_of_posts)
+            ]
+        )
+        # 人気のタグほど多くの投稿に付くように偏りを持たせる
+        weights = [1 / (rank + 1) for rank in range(len(tags))]
+        through = Post.tags.through
+        links = []
+        for post in posts:
+            post_tags = set(
+                rng.choices(tags, weights=weights, k=options["tags_per_post"])
+            )
+            links += [through(post_id=post.id, tag_id=tag.id) for tag in post_tags]
+        through.objects.bulk_create(links, batch_size=1000)
+        return [tag.name for tag in tags]
+
+    def measure(self, number_of_posts, tag_count, name, implementation, samples):
+        durations = []
+        results = 0
+        for names in samples:
+            start = time.perf_counter()
+            queryset = implementation(names)
+            results = queryset.count()
+            list(queryset[:10])
+            durations.append((time.perf_counter() - start) * 1000)
+
+        durations.sort()
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        self.stdout.write(
+            f"{number_of_posts}\t{tag_count}\t{name}\t"
+            f"{statistics.median(durations):.2f}\t{p95:.2f}\t{results}"
+        )
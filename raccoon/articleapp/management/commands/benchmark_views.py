@@ -0,0 +1,315 @@
+import datetime
+import json
+import random
+import re
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from articleapp.models import Post, Tag, User
+
+from .seed_benchmark_data import SUBJECTS
+
+# Server-Timingヘッダ（articleapp.middleware）のSQLの実行回数
+SERVER_TIMING_QUERIES_PATTERN = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def percentile(sorted_values, p):
+    """
+    昇順に並べた値のpパーセンタイル（nearest-rank法）
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(samples):
+    durations = sorted(sample["ms"] for sample in samples)
+    queries = [sample["queries"] for sample in samples if sample["queries"] is not None]
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample["status"])] = statuses.get(str(sample["status"]), 0) + 1
+    return {
+        "requests": len(samples),
+        "statuses": statuses,
+        "p50_ms": round(percentile(durations, 50), 3),
+        "p95_ms": round(percentile(durations, 95), 3),
+        "p99_ms": round(percentile(durations, 99), 3),
+        "mean_ms": round(sum(durations) / len(durations), 3),
+        "max_ms": round(durations[-1], 3),
+        "queries": {
+            "min": min(queries),
+            "max": max(queries),
+            "mean": round(sum(queries) / len(queries), 2),
+        }
+        if queries
+        else None,
+    }
+
+
+def get_git_commit():
+    try:
+        return (
+            subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout.strip()
+            or None
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class ClientRunner:
+    """
+    テストクライアントでプロセス内からビューを呼び出す（SQLの実行回数も数える）
+    """
+
+    def __init__(self, host, login_user=None, cold=False):
+        self.client = Client(SERVER_NAME=host)
+        if login_user is not None:
+            self.client.force_login(login_user)
+        self.cold = cold
+
+    def request(self, url):
+        if self.cold:
+            for alias in [settings.PAGE_CACHE_ALIAS, settings.POST_CARD_CACHE_ALIAS]:
+                caches[alias].clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = self.client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = (time.perf_counter() - start) * 1000
+        return {"status": response.status_code, "ms": elapsed, "queries": len(queries)}
+
+
+class HttpRunner:
+    """
+    起動中のサーバーにHTTPでリクエストする
+
+    SQLの実行回数はServer-Timingヘッダ（settings.SERVER_TIMING_HEADER）から読み取る。
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, url):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(self.base_url + url) as response:
+                response.read()
+                status = response.status
+                server_timing = response.headers.get("Server-Timing", "")
+        except urllib.error.HTTPError as e:
+            status = e.code
+            server_timing = e.headers.get("Server-Timing", "")
+        elapsed = (time.perf_counter() - start) * 1000
+        match = SERVER_TIMING_QUERIES_PATTERN.search(server_timing)
+        return {
+            "status": status,
+            "ms": elapsed,
+            "queries": int(match.group(1)) if match else None,
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "seed_benchmark_dataで作成したデータに対して、index・search・search_tags・"
+        "post_detail・user_homeのレイテンシ（p50/p95/p99）とSQLの実行回数を計測し、JSONで出力する。"
+        "同じシードでは同じURLの順にリクエストするため、コミット間で結果を比較できる。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prefix", default="bench", help="seed_benchmark_dataで指定した接頭辞"
+        )
+        parser.add_argument("--repeat", type=int, default=30, help="シナリオごとのリクエスト数")
+        parser.add_argument("--warmup", type=int, default=3, help="計測前にシナリオごとに送るリクエスト数")
+        parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            help="計測するシナリオの名前（複数指定可。省略時は全て）",
+        )
+        parser.add_argument(
+            "--base-url",
+            help="起動中のサーバーのURL（省略時はテストクライアントでプロセス内から呼び出す）",
+        )
+        parser.add_argument("--host", default="localhost", help="テストクライアントのホスト名")
+        parser.add_argument(
+            "--login", action="store_true", help="ログイン中のユーザーとして計測する（テストクライアントのみ）"
+        )
+        parser.add_argument(
+            "--cold",
+            action="store_true",
+            help="リクエストごとにページ・断片のキャッシュを空にする（テストクライアントのみ）",
+        )
+        parser.add_argument("--output", help="結果のJSONを書き込むファイル（省略時は標準出力）")
+        parser.add_argument("--compare", help="比較する以前の結果のJSONファイル")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if not User.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(f"接頭辞「{prefix}」のデータがありません。seed_benchmark_dataを実行してください。")
+
+        scenarios = self.build_scenarios(options)
+        if options["scenario"]:
+            unknown = set(options["scenario"]) - set(scenarios)
+            if unknown:
+                raise CommandError(f"不明なシナリオ: {', '.join(sorted(unknown))}")
+            scenarios = {name: scenarios[name] for name in options["scenario"]}
+
+        if options["base_url"]:
+            runner = HttpRunner(options["base_url"])
+        else:
+            login_user = None
+            if options["login"]:
+                login_user = User.objects.get(username=f"{prefix}_0")
+            runner = ClientRunner(options["host"], login_user, options["cold"])
+
+        results = {}
+        for name, urls in scenarios.items():
+            for url in urls[: options["warmup"]]:
+                runner.request(url)
+            samples = [runner.request(url) for url in urls[options["warmup"] :]]
+            results[name] = summarize(samples)
+
+        report = {
+            "meta": {
+                "git_commit": get_git_commit(),
+                "created_at": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "mode": "http" if options["base_url"] else "client",
+                "login": options["login"],
+                "cold": options["cold"],
+                "seed": options["seed"],
+                "repeat": options["repeat"],
+                "users": User.objects.filter(username__startswith=f"{prefix}_").count(),
+                "posts": Post.objects.filter(
+                    user__username__startswith=f"{prefix}_"
+                ).count(),
+                "tags": Tag.objects.filter(name__startswith=f"{prefix}_").count(),
+            },
+            "scenarios": results,
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                self.compare(json.load(f), report)
+
+    def build_scenarios(self, options):
+        """
+        シナリオの名前とリクエストするURLのリストを作成する
+        """
+        rng = random.Random(options["seed"])
+        prefix = options["prefix"]
+        repeat = options["repeat"] + options["warmup"]
+
+        posts = list(
+            Post.objects.filter(
+                user__username__startswith=f"{prefix}_", is_published=True
+            ).values_list("user__username", "slug")
+        )
+        usernames = sorted({username for username, _ in posts})
+        tags = list(
+            Tag.objects.filter(
+                name__startswith=f"{prefix}_", published_post_count__gt=0
+            )
+            .order_by("-published_post_count", "id")
+            .values_list("name", flat=True)
+        )
+        if not posts or not tags:
+            raise CommandError("公開中の投稿とタグが必要です。")
+        popular_tags = tags[:20]
+        today = timezone.now().date()
+
+        def search(**params):
+            return f"{reverse('search')}?{urlencode(params, doseq=True)}"
+
+        def search_tags():
+            # 接頭辞を除いたタグの名前の先頭の数文字を入力した場合
+            name = rng.choice(tags)[len(prefix) + 1 :]
+            keyword = name[: rng.randint(1, 3)]
+            return f"{reverse('search_tags')}?{urlencode({'keyword': keyword})}"
+
+        def period():
+            end = today - datetime.timedelta(days=rng.randrange(365))
+            start = end - datetime.timedelta(days=rng.choice([7, 30, 90]))
+            return {
+                "period_start_date": start.isoformat(),
+                "period_end_date": end.isoformat(),
+            }
+
+        generators = {
+            "index": lambda: reverse("index"),
+            "search_keyword": lambda: search(keyword=rng.choice(SUBJECTS)),
+            "search_tag": lambda: search(tags=[rng.choice(popular_tags)]),
+            "search_rare_tag": lambda: search(tags=[rng.choice(tags)]),
+            "search_two_tags": lambda: search(
+                tags=rng.sample(popular_tags, min(2, len(popular_tags)))
+            ),
+            "search_period": lambda: search(**period()),
+            "search_sort_asc": lambda: search(sort="date_publish_asc"),
+            "search_deep_page": lambda: search(page=rng.randint(5, 20)),
+            "search_combined": lambda: search(
+                keyword=rng.choice(SUBJECTS),
+                tags=[rng.choice(popular_tags)],
+                sort=rng.choice(["date_publish_desc", "date_publish_asc"]),
+                **period(),
+            ),
+            "search_tags": search_tags,
+            "post_detail": lambda: reverse(
+                "post_detail",
+                kwargs=dict(zip(["username", "slug"], rng.choice(posts))),
+            ),
+            "user_home": lambda: reverse(
+                "user_home", kwargs={"username": rng.choice(usernames)}
+            ),
+        }
+        return {
+            name: [generate() for _ in range(repeat)]
+            for name, generate in generators.items()
+        }
+
+    def compare(self, previous, current):
+        """
+        以前の結果との差を標準エラー出力に表示する
+        """
+        self.stderr.write(
+            f"比較: {previous['meta'].get('git_commit')} -> "
+            f"{current['meta'].get('git_commit')}"
+        )
+        self.stderr.write("scenario\tp50_ms\tp95_ms\tp99_ms\tqueries_mean")
+        for name, result in current["scenarios"].items():
+            before = previous["scenarios"].get(name)
+            if before is None:
+                continue
+            columns = [name]
+            for key in ["p50_ms", "p95_ms", "p99_ms"]:
+                change = (result[key] - before[key]) / (before[key] or 1) * 100
+                columns.append(f"{before[key]:.1f}->{result[key]:.1f}({change:+.0f}%)")
+            queries = [(r["queries"] or {}).get("mean") for r in [before, result]]
+            columns.append(f"{queries[0]}->{queries[1]}")
+            self.stderr.write("\t".join(columns))
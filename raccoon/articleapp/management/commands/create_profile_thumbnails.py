@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from articleapp.models import User
+from articleapp.tasks import create_profile_thumbnails
+
+
+class Command(BaseCommand):
+    help = "プロフィール画像のサムネイルを作成する（サムネイルが無い・古いユーザーのみ）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="サムネイルが作成済みのユーザーも含めて全て作り直す",
+        )
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="キューに追加せずにこのコマンドで作成する",
+        )
+
+    def handle(self, *args, **options):
+        users = (
+            User.objects.exclude(profile_image="")
+            .exclude(profile_image__isnull=True)
+            .only("id", "profile_image", "profile_thumbnails")
+            .order_by("id")
+        )
+        count = 0
+        for user in users.iterator():
+            if (
+                not options["all"]
+                and user.profile_thumbnails.get("source") == user.profile_image.name
+            ):
+                continue
+            if options["sync"]:
+                create_profile_thumbnails(None, user_id=user.id, force=options["all"])
+            else:
+                create_profile_thumbnails.enqueue(user_id=user.id, force=options["all"])
+            count += 1
+
+        if options["sync"]:
+            self.stdout.write(f"{count}人のユーザーのサムネイルを作成しました。")
+        else:
+            self.stdout.write(
+                f"{count}人のユーザーのサムネイルの作成をキューに追加しました。runworkerコマンドで実行してください。"
+            )
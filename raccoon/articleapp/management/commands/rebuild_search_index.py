@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from articleapp.models import Post
+from articleapp.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "全ての投稿を検索の索引に登録し直す（bulk_create等で追加した投稿の登録用）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="1回のクエリで読み込む投稿の件数",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        posts = Post.objects.only("id", "title", "body").order_by("id")
+        count = 0
+        for post in posts.iterator(chunk_size=options["batch_size"]):
+            backend.index_post(post)
+            count += 1
+        self.stdout.write(f"{count}件の投稿を索引に登録しました。")
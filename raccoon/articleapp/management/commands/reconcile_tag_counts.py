@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q
+
+from articleapp.models import Tag
+
+
+class Command(BaseCommand):
+    help = (
+        "タグの公開中の投稿数（Tag.published_post_count）を中間テーブルから数え直す。"
+        "bulk_create等でシグナルを通さずに投稿・タグを変更した後に実行する。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="1回のクエリで更新するタグの個数",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="ずれているタグを表示するのみで更新しない"
+        )
+
+    def handle(self, *args, **options):
+        mismatched = (
+            Tag.objects.annotate(
+                actual_count=Count("post", filter=Q(post__is_published=True))
+            )
+            .exclude(published_post_count=F("actual_count"))
+            .order_by("id")
+        )
+        tag_ids = []
+        for tag in mismatched:
+            tag_ids.append(tag.id)
+            if options["dry_run"] or options["verbosity"] >= 2:
+                self.stdout.write(
+                    f"{tag.name}: {tag.published_post_count} -> {tag.actual_count}"
+                )
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(tag_ids)}個のタグの公開中の投稿数がずれています。")
+            return
+
+        batch_size = options["batch_size"]
+        for start in range(0, len(tag_ids), batch_size):
+            Tag.objects.filter(
+                id__in=tag_ids[start : start + batch_size]
+            ).refresh_published_post_count()
+        self.stdout.write(f"{len(tag_ids)}個のタグの公開中の投稿数を修正しました。")
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from articleapp.models import Post
+from articleapp.utils.markup import get_renderer_signature
+
+
+class Command(BaseCommand):
+    help = "投稿の本文をHTMLに描画し直す（現在の設定で描画されていない投稿のみ）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="1回のクエリで読み込み・更新する投稿の件数",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="現在の設定で描画済みの投稿も含めて全て描画し直す",
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if not options["all"]:
+            posts = posts.exclude(body_html_signature=get_renderer_signature())
+        posts = posts.only("id", "body").order_by("id")
+
+        # idの順にbatch_size件ずつ読み込んで更新する（OFFSETを使わない）
+        # bulk_updateはupdated_atを更新しない
+        last_id = 0
+        count = 0
+        while True:
+            batch = list(posts.filter(id__gt=last_id)[: options["batch_size"]])
+            if not batch:
+                break
+            for post in batch:
+                post.render_body()
+            Post.objects.bulk_update(batch, ["body_html", "body_html_signature"])
+            last_id = batch[-1].id
+            count += len(batch)
+            self.stdout.write(f"{count}件の投稿の本文を描画しました。")
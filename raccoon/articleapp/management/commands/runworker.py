@@ -0,0 +1,94 @@
+import multiprocessing
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from articleapp.task_queue import work
+
+
+class Command(BaseCommand):
+    help = "キューに追加されたタスクを実行する"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="実行できるタスクが無くなったら終了する",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="実行できるタスクが無い場合に次に確認するまでの秒数",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="タスクを実行するプロセスの数",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=1,
+            help="各プロセスでタスクを実行するスレッドの数",
+        )
+
+    def handle(self, *args, **options):
+        if options["processes"] <= 1:
+            self.run_threads(options)
+            return
+
+        # 子プロセスに接続を引き継がないよう、forkする前に閉じる
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=self.run_threads, args=(options,))
+            for _ in range(options["processes"])
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+                process.join()
+
+    def run_threads(self, options):
+        stop_event = threading.Event()
+        worker_options = {
+            "burst": options["burst"],
+            "sleep": options["sleep"],
+            "stop_event": stop_event,
+            "on_task_done": self.report,
+        }
+        if options["threads"] <= 1:
+            try:
+                work(**worker_options)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        threads = [
+            threading.Thread(target=work, kwargs=worker_options)
+            for _ in range(options["threads"])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            # 実行中のタスクが終わったら終了する
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+
+    def report(self, task):
+        self.stdout.write(
+            f"タスク{task.name} (id={task.id}, {task.attempts}回目): "
+            f"{task.get_status_display()} {task.progress}"
+        )
@@ -0,0 +1,229 @@
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from articleapp.models import Post, Tag, User
+from articleapp.utils import page_cache
+from articleapp.utils.markup import create_excerpt
+from articleapp.utils.tag_autocomplete import tag_autocomplete
+from articleapp.utils.tag_pool import published_tag_pool
+
+# 本文・タイトルの材料（技術ブログ・日記を想定）
+SUBJECTS = [
+    "Django",
+    "Python",
+    "データベース",
+    "インデックス",
+    "キャッシュ",
+    "テンプレート",
+    "全文検索",
+    "非同期処理",
+    "画像処理",
+    "デプロイ",
+    "自宅サーバー",
+    "週末の料理",
+    "近所の散歩道",
+    "読書記録",
+    "家庭菜園",
+]
+PREDICATES = [
+    "を試してみました",
+    "の設定を見直しました",
+    "で少しハマりました",
+    "についてまとめます",
+    "の使い方を整理しました",
+    "を毎日続けています",
+    "の性能を計測しました",
+]
+SENTENCES = [
+    "{subject}について調べたことを順番に書いていきます。",
+    "最初は{subject}の公式ドキュメントを読みながら進めました。",
+    "思っていたよりも{subject}は奥が深く、一度では理解できませんでした。",
+    "結論から言うと、{subject}は小さく始めて少しずつ改善するのが良さそうです。",
+    "{subject}で困ったときは、まず再現する最小の例を作るようにしています。",
+    "今回の作業では{subject}の設定を三つほど変更しました。",
+    "同じ問題で悩んでいる人の参考になればうれしいです。",
+    "計測してみると、{subject}の部分に時間がかかっていることが分かりました。",
+    "次回は{subject}をもう少し深く掘り下げてみたいと思います。",
+    "天気が良かったので、作業の合間に少し外を歩きました。",
+]
+CODE_SNIPPETS = [
+    "```python\nposts = Post.objects.filter(is_published=True)[:10]\n```",
+    "```bash\npython manage.py migrate\n```",
+    "```sql\nSELECT COUNT(*) FROM articleapp_post;\n```",
+]
+# タグの名前の材料（先頭ほど人気のタグになる）
+TAG_WORDS = [
+    "Python",
+    "Django",
+    "日記",
+    "JavaScript",
+    "料理",
+    "SQL",
+    "Linux",
+    "旅行",
+    "読書",
+    "Docker",
+    "CSS",
+    "写真",
+    "TypeScript",
+    "散歩",
+    "機械学習",
+    "ゲーム",
+    "音楽",
+    "Rust",
+    "家庭菜園",
+    "自作PC",
+]
+
+
+def generate_body(rng):
+    """
+    見出し・段落・箇条書き・コードを含むMarkdownの本文を作成する
+    """
+    subject = rng.choice(SUBJECTS)
+    blocks = []
+    for _ in range(rng.randint(1, 4)):
+        blocks.append(f"## {rng.choice(SUBJECTS)}{rng.choice(PREDICATES)}")
+        for _ in range(rng.randint(1, 3)):
+            sentences = rng.choices(SENTENCES, k=rng.randint(2, 6))
+            blocks.append("".join(s.format(subject=subject) for s in sentences))
+        if rng.random() < 0.3:
+            blocks.append(
+                "\n".join(f"- {rng.choice(SUBJECTS)}" for _ in range(rng.randint(2, 5)))
+            )
+        if rng.random() < 0.2:
+            blocks.append(rng.choice(CODE_SNIPPETS))
+    return "\n\n".join(blocks)
+
+
+def generate_tag_names(rng, count):
+    names = list(TAG_WORDS[:count])
+    while len(names) < count:
+        names.append(f"{rng.choice(TAG_WORDS)}_{len(names)}")
+    return names
+
+
+class Command(BaseCommand):
+    help = (
+        "性能計測用のユーザー・投稿・タグを作成する（benchmark_viewsコマンドで使う）。"
+        "投稿に付けるタグの人気はZipf分布に従う。同じ引数では同じデータを作成する。"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100, help="作成するユーザー数")
+        parser.add_argument("--posts", type=int, default=10000, help="作成する投稿数")
+        parser.add_argument("--tags", type=int, default=500, help="作成するタグの総数")
+        parser.add_argument(
+            "--max-tags-per-post", type=int, default=6, help="1投稿あたりの最大のタグ数"
+        )
+        parser.add_argument(
+            "--zipf-exponent",
+            type=float,
+            default=1.1,
+            help="タグの人気の偏り（Zipf分布の指数。大きいほど上位のタグに集中する）",
+        )
+        parser.add_argument(
+            "--draft-ratio", type=float, default=0.1, help="下書きにする投稿の割合"
+        )
+        parser.add_argument("--days", type=int, default=730, help="投稿日を分布させる日数")
+        parser.add_argument("--prefix", default="bench", help="作成するユーザー名・タグ名の接頭辞")
+        parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+        parser.add_argument("--clear", action="store_true", help="同じ接頭辞で作成したデータを先に削除する")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = options["prefix"]
+        batch_size = options["batch_size"]
+
+        with transaction.atomic():
+            if options["clear"]:
+                Post.objects.filter(user__username__startswith=f"{prefix}_").delete()
+                User.objects.filter(username__startswith=f"{prefix}_").delete()
+                Tag.objects.filter(name__startswith=f"{prefix}_").delete()
+
+            # パスワード（ユーザー名と同じ接頭辞）のハッシュ化は1回だけ行う
+            password = make_password(prefix)
+            users = User.objects.bulk_create(
+                [
+                    User(
+                        username=f"{prefix}_{i}",
+                        display_name=f"ベンチマーク{i}",
+                        password=password,
+                    )
+                    for i in range(options["users"])
+                ],
+                batch_size=batch_size,
+            )
+            tags = Tag.objects.bulk_create(
+                [
+                    Tag(name=f"{prefix}_{name}")
+                    for name in generate_tag_names(rng, options["tags"])
+                ],
+                batch_size=batch_size,
+            )
+            self.create_posts(rng, users, tags, options)
+            # bulk_createではタグの公開中の投稿数が更新されないため数え直す
+            Tag.objects.filter(
+                id__in=[tag.id for tag in tags]
+            ).refresh_published_post_count()
+
+        # bulk_createではシグナルが送られないため、索引の登録とキャッシュの無効化を行う
+        call_command("rebuild_search_index", stdout=self.stdout)
+        page_cache.invalidate(page_cache.SCOPE_ALL)
+        published_tag_pool.invalidate()
+        tag_autocomplete.invalidate()
+        self.stdout.write(
+            f"ユーザー{len(users)}人、タグ{len(tags)}個、投稿{options['posts']}件を作成しました。"
+        )
+
+    def create_posts(self, rng, users, tags, options):
+        today = timezone.now().date()
+        # 人気の順位がkのタグが選ばれる確率は1/k^s に比例する
+        weights = [
+            1 / (rank + 1) ** options["zipf_exponent"] for rank in range(len(tags))
+        ]
+        # 投稿数の多いユーザーと少ないユーザーがいるように偏りを持たせる
+        user_weights = [1 / (rank + 1) for rank in range(len(users))]
+        through = Post.tags.through
+
+        for start in range(0, options["posts"], options["batch_size"]):
+            posts = []
+            post_tags = []
+            end = min(start + options["batch_size"], options["posts"])
+            for i in range(start, end):
+                body = generate_body(rng)
+                is_published = rng.random() >= options["draft_ratio"]
+                post = Post(
+                    title=f"{rng.choice(SUBJECTS)}{rng.choice(PREDICATES)}（{i}）",
+                    body=body,
+                    user=rng.choices(users, weights=user_weights)[0],
+                    slug=f"{options['prefix']}-{i}",
+                    is_published=is_published,
+                    date_publish=(
+                        today - datetime.timedelta(days=rng.randrange(options["days"]))
+                        if is_published
+                        else None
+                    ),
+                    excerpt=create_excerpt(body),
+                )
+                # bulk_createではsave()が呼ばれないため、保存時と同様に描画しておく
+                post.render_body()
+                posts.append(post)
+                k = rng.randint(0, options["max_tags_per_post"])
+                post_tags.append(set(rng.choices(tags, weights=weights, k=k)))
+            posts = Post.objects.bulk_create(posts)
+            through.objects.bulk_create(
+                [
+                    through(post_id=post.id, tag_id=tag.id)
+                    for post, tags_of_post in zip(posts, post_tags)
+                    for tag in tags_of_post
+                ]
+            )
+            self.stdout.write(f"{end}/{options['posts']}件の投稿を作成しました。")
@@ -0,0 +1,283 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+# リクエストの処理時間のヒストグラムのバケットの上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# URLに一致しなかったリクエストのview
+UNMATCHED_VIEW = "<unmatched>"
+# プロセスごとのファイルの拡張子
+METRICS_FILE_SUFFIX = ".metrics.json"
+
+
+def _merge(target, source):
+    """
+    sourceの値をtargetに足し合わせる（辞書・リストは再帰的に）
+    """
+    for key, value in source.items():
+        if isinstance(value, dict):
+            _merge(target.setdefault(key, {}), value)
+        elif isinstance(value, list):
+            current = target.setdefault(key, [0] * len(value))
+            for i, item in enumerate(value):
+                current[i] += item
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def _is_process_alive(pid):
+    """
+    プロセスIDのプロセスが存在するかを返す
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 別のユーザーのプロセスは存在する
+        return True
+    return True
+
+
+class MetricsCollector:
+    """
+    リクエストの処理時間・SQLの実行回数・キャッシュのヒット数を集計する（プロセスごと）
+
+    gunicorn等で複数のプロセスが動作する場合、各プロセスは集計結果を
+    settings.METRICS_DIRECTORYのプロセスごとのファイルに書き込み、
+    /metricsでは全てのファイルを合計して出力する。
+    ファイルへの書き込みは最大でMETRICS_FLUSH_INTERVAL秒に1回とする。
+    METRICS_DIRECTORYがNoneの場合は処理中のプロセスの集計結果のみ出力する。
+
+    終了したプロセスのファイルは、ファイル名のプロセスIDが存在しなければ
+    集計時に削除する（そのプロセスの分だけカウンターが減るが、Prometheusでは
+    カウンターのリセットとして扱われる）。プロセスIDで判定するため、
+    METRICS_DIRECTORYは複数のサーバーで共有しない。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file_name = f"{os.getpid()}-{uuid.uuid4().hex}{METRICS_FILE_SUFFIX}"
+        self._flushed_at = 0.0
+        self._pid = os.getpid()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._values = {
+                # {view: {method: {status: 回数}}}
+                "requests": {},
+                # {view: {"buckets": [バケットごとの回数], "sum": 秒, "count": 回数}}
+                "duration": {},
+                # {view: {"queries": 回数, "seconds": 秒}}
+                "db": {},
+                # {キャッシュの名前: {"hits": 回数, "misses": 回数}}
+                "cache": {},
+            }
+
+    def record_request(self, view, method, status, stats):
+        """
+        1つのリクエストの計測結果を集計する
+
+        Args:
+            view (str): URLパターンの名前
+            method (str): HTTPメソッド
+            status (int): レスポンスのステータスコード
+            stats (articleapp.utils.instrumentation.RequestStats): 計測結果
+        """
+        duration = stats.total_time / 1000
+        bucket = next(
+            (i for i, le in enumerate(LATENCY_BUCKETS) if duration <= le),
+            len(LATENCY_BUCKETS),
+        )
+        with self._lock:
+            self._check_fork()
+            statuses = (
+                self._values["requests"].setdefault(view, {}).setdefault(method, {})
+            )
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+            histogram = self._values["duration"].setdefault(
+                view,
+                {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0, "count": 0},
+            )
+            histogram["buckets"][bucket] += 1
+            histogram["sum"] += duration
+            histogram["count"] += 1
+
+            db = self._values["db"].setdefault(view, {"queries": 0, "seconds": 0})
+            db["queries"] += stats.query_count
+            db["seconds"] += stats.query_time / 1000
+
+            _merge(self._values["cache"], stats.cache)
+        self.flush()
+
+    def _check_fork(self):
+        # fork後の子プロセスは親プロセスの集計結果を引き継がず、別のファイルに書き込む
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._file_name = f"{self._pid}-{uuid.uuid4().hex}{METRICS_FILE_SUFFIX}"
+            self._flushed_at = 0.0
+            self._values = {key: {} for key in self._values}
+
+    def flush(self, force=False):
+        """
+        集計結果をプロセスごとのファイルに書き込む
+        """
+        directory = settings.METRICS_DIRECTORY
+        if directory is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._flushed_at < settings.METRICS_FLUSH_INTERVAL:
+                return
+            self._flushed_at = now
+            data = json.dumps(self._values)
+            path = os.path.join(directory, self._file_name)
+        os.makedirs(directory, exist_ok=True)
+        # 読み込み中のプロセスが書きかけのファイルを読まないよう、置き換える
+        fd, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.replace(temporary_path, path)
+
+    def collect(self):
+        """
+        全てのプロセスの集計結果を合計して返す
+        """
+        with self._lock:
+            self._check_fork()
+            values = json.loads(json.dumps(self._values))
+            own_file_name = self._file_name
+        directory = settings.METRICS_DIRECTORY
+        if directory is None or not os.path.isdir(directory):
+            return values
+        for file_name in os.listdir(directory):
+            if (
+                not file_name.endswith(METRICS_FILE_SUFFIX)
+                or file_name == own_file_name
+            ):
+                continue
+            pid = file_name.split("-", 1)[0]
+            if pid.isdigit() and not _is_process_alive(int(pid)):
+                try:
+                    os.remove(os.path.join(directory, file_name))
+                except OSError:
+                    # 他のプロセスが先に削除した場合等
+                    pass
+                continue
+            try:
+                with open(os.path.join(directory, file_name)) as f:
+                    _merge(values, json.load(f))
+            except (OSError, ValueError):
+                # 削除されたファイル等は無視する
+                continue
+        return values
+
+
+collector = MetricsCollector()
+atexit.register(collector.flush, force=True)
+
+
+def _format_labels(**labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def get_task_queue_depth():
+    """
+    状態ごとのタスクの数と、実行を待っている（実行日時を過ぎた）タスクの数を返す
+    """
+    from .models import Task
+
+    counts = dict.fromkeys(Task.Status.values, 0)
+    for row in Task.objects.values("status").annotate(count=Count("id")).order_by():
+        counts[row["status"]] = row["count"]
+    ready = Task.objects.filter(
+        status=Task.Status.QUEUED, run_at__lte=timezone.now()
+    ).count()
+    return counts, ready
+
+
+def render_metrics():
+    """
+    集計結果をPrometheusのテキスト形式で出力する
+    """
+    values = collector.collect()
+    lines = []
+
+    def metric(name, metric_type, help_text):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    def sample(name, value, **labels):
+        label_text = f"{{{_format_labels(**labels)}}}" if labels else ""
+        lines.append(f"{name}{label_text} {_format_number(value)}")
+
+    metric("raccoon_http_requests_total", "counter", "Total HTTP requests.")
+    for view, methods in sorted(values["requests"].items()):
+        for method, statuses in sorted(methods.items()):
+            for status, count in sorted(statuses.items()):
+                sample(
+                    "raccoon_http_requests_total",
+                    count,
+                    view=view,
+                    method=method,
+                    status=status,
+                )
+
+    name = "raccoon_http_request_duration_seconds"
+    metric(name, "histogram", "HTTP request latency per URL name.")
+    for view, histogram in sorted(values["duration"].items()):
+        cumulative = 0
+        for le, count in zip([*LATENCY_BUCKETS, "+Inf"], histogram["buckets"]):
+            cumulative += count
+            sample(f"{name}_bucket", cumulative, view=view, le=le)
+        sample(f"{name}_sum", float(histogram["sum"]), view=view)
+        sample(f"{name}_count", histogram["count"], view=view)
+
+    metric("raccoon_db_queries_total", "counter", "Total DB queries per URL name.")
+    for view, db in sorted(values["db"].items()):
+        sample("raccoon_db_queries_total", db["queries"], view=view)
+    metric(
+        "raccoon_db_query_duration_seconds_total",
+        "counter",
+        "Total time spent in DB queries per URL name.",
+    )
+    for view, db in sorted(values["db"].items()):
+        sample(
+            "raccoon_db_query_duration_seconds_total", float(db["seconds"]), view=view
+        )
+
+    for result in ["hits", "misses"]:
+        metric(f"raccoon_cache_{result}_total", "counter", f"Total cache {result}.")
+        for cache_name, counts in sorted(values["cache"].items()):
+            sample(f"raccoon_cache_{result}_total", counts[result], cache=cache_name)
+    metric("raccoon_cache_hit_ratio", "gauge", "Cache hit ratio since startup.")
+    for cache_name, counts in sorted(values["cache"].items()):
+        total = counts["hits"] + counts["misses"]
+        if total:
+            sample("raccoon_cache_hit_ratio", counts["hits"] / total, cache=cache_name)
+
+    counts, ready = get_task_queue_depth()
+    metric("raccoon_task_queue_tasks", "gauge", "Tasks in the queue per status.")
+    for status, count in counts.items():
+        sample("raccoon_task_queue_tasks", count, status=status)
+    metric("raccoon_task_queue_ready", "gauge", "Queued tasks ready to run.")
+    sample("raccoon_task_queue_ready", ready)
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,110 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import UNMATCHED_VIEW, collector
+from .utils import instrumentation
+
+logger = logging.getLogger("articleapp.requests")
+
+
+class RequestTimingMiddleware:
+    """
+    リクエストごとにSQLの実行回数・時間、テンプレートの描画時間、
+    キャッシュのヒット数、ビューの処理時間を計測する。
+
+    計測結果はロガー「articleapp.requests」に1リクエスト1行のJSONで出力し、
+    settings.SERVER_TIMING_HEADERがTrueの場合はServer-Timingヘッダにも付ける。
+    また、/metricsで出力するためにarticleapp.metrics.collectorで集計する。
+    REQUEST_QUERY_BUDGET（SQLの実行回数）、REQUEST_TIME_BUDGET（ミリ秒）を
+    超えたリクエストは警告として出力する。
+
+    全体の時間を計測するため、MIDDLEWAREの先頭に追加する。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with instrumentation.collect_stats() as stats, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(instrumentation.query_timer)
+                )
+            response = self.get_response(request)
+            view_started_at = getattr(request, "_view_started_at", None)
+            if view_started_at is not None:
+                stats.view_time = (time.perf_counter() - view_started_at) * 1000
+
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = format_server_timing(stats)
+        self.log(request, response, stats)
+        resolver_match = getattr(request, "resolver_match", None)
+        collector.record_request(
+            resolver_match.view_name if resolver_match else UNMATCHED_VIEW,
+            request.method,
+            response.status_code,
+            stats,
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # ビューの処理時間（ミドルウェアの前処理を除いた時間）の計測を開始する
+        request._view_started_at = time.perf_counter()
+
+    def log(self, request, response, stats):
+        over_budget = get_over_budget(stats)
+        resolver_match = getattr(request, "resolver_match", None)
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": resolver_match.view_name if resolver_match else None,
+            "status": response.status_code,
+            "total_ms": round(stats.total_time, 2),
+            "view_ms": round(stats.view_time, 2),
+            "db_queries": stats.query_count,
+            "db_ms": round(stats.query_time, 2),
+            "template_ms": round(stats.template_time, 2),
+            "cache": stats.cache,
+            "over_budget": over_budget,
+        }
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            json.dumps(record, ensure_ascii=False),
+            extra={"request_stats": record},
+        )
+
+
+def get_over_budget(stats):
+    """
+    設定した上限を超えた項目の名前のリストを返す
+    """
+    over_budget = []
+    query_budget = settings.REQUEST_QUERY_BUDGET
+    if query_budget is not None and stats.query_count > query_budget:
+        over_budget.append("db_queries")
+    time_budget = settings.REQUEST_TIME_BUDGET
+    if time_budget is not None and stats.total_time > time_budget:
+        over_budget.append("total_ms")
+    return over_budget
+
+
+def format_server_timing(stats):
+    """
+    計測結果をServer-Timingヘッダの値にする
+    """
+    metrics = [
+        f'db;dur={stats.query_time:.2f};desc="{stats.query_count} queries"',
+        f"tpl;dur={stats.template_time:.2f}",
+    ]
+    for name, counts in stats.cache.items():
+        metrics.append(
+            f'cache-{name};desc="hits={counts["hits"]} misses={counts["misses"]}"'
+        )
+    metrics.append(f"view;dur={stats.view_time:.2f}")
+    metrics.append(f"total;dur={stats.total_time:.2f}")
+    return ", ".join(metrics)
@@ -0,0 +1,42 @@
+# Generated by Django 4.1.3 on 2026-10-18 20:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articleapp", "0014_post_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostSearchToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=10)),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="articleapp.post",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="postsearchtoken",
+            constraint=models.UniqueConstraint(
+                fields=("token", "post"), name="unique_search_token_post"
+            ),
+        ),
+    ]
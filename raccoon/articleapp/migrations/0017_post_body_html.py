@@ -0,0 +1,93 @@
+# Generated by Django 4.1.3 on 2026-10-18 20:30
+
+import sqlite3
+
+from django.db import migrations, models
+
+# SQLiteではテーブルが作り直されて検索の索引のトリガーが削除されるため再作成する
+# （0014_post_search_indexと同じSQL。以降のアプリのコードの変更で内容が変わらないよう複製する）
+SQLITE_CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS articleapp_post_fts USING fts5(
+        title, body,
+        content='articleapp_post', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS articleapp_post_fts_ai
+    AFTER INSERT ON articleapp_post BEGIN
+        INSERT INTO articleapp_post_fts(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS articleapp_post_fts_ad
+    AFTER DELETE ON articleapp_post BEGIN
+        INSERT INTO articleapp_post_fts(articleapp_post_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS articleapp_post_fts_au
+    AFTER UPDATE OF title, body ON articleapp_post BEGIN
+        INSERT INTO articleapp_post_fts(articleapp_post_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO articleapp_post_fts(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    """,
+    # 既存の投稿から索引を作り直す
+    "INSERT INTO articleapp_post_fts(articleapp_post_fts) VALUES ('rebuild')",
+]
+
+POSTGRESQL_CREATE_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # DjangoのicontainsはUPPER("col"::text) LIKE UPPER(%s)となるため、同じ式で作成する
+    """
+    CREATE INDEX IF NOT EXISTS articleapp_post_title_trgm
+    ON articleapp_post USING gin (UPPER(title::text) gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS articleapp_post_body_trgm
+    ON articleapp_post USING gin (UPPER(body::text) gin_trgm_ops)
+    """,
+]
+
+
+def execute_for_vendor(schema_editor, sqlite_sql, postgresql_sql):
+    # FTS5のtrigramトークナイザーはSQLite 3.34.0以降で利用可能
+    vendor = schema_editor.connection.vendor
+    statements = []
+    if vendor == "sqlite" and sqlite3.sqlite_version_info >= (3, 34, 0):
+        statements = sqlite_sql
+    elif vendor == "postgresql":
+        statements = postgresql_sql
+    for sql in statements:
+        schema_editor.execute(sql, params=None)
+
+
+def create_search_index(apps, schema_editor):
+    execute_for_vendor(schema_editor, SQLITE_CREATE_SQL, POSTGRESQL_CREATE_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articleapp", "0016_post_excerpt"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="body_html",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="body_html_signature",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        # SQLiteではテーブルが作り直されて検索の索引のトリガーが削除されるため再作成する
+        migrations.RunPython(create_search_index, migrations.RunPython.noop),
+        # 既存の投稿の本文はrerender_post_bodiesコマンドか詳細ページの表示時に描画する
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.1.3 on 2026-10-18 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articleapp", "0017_post_body_html"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["-date_publish", "-created_at", "-id"],
+                name="post_published_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["user", "-date_publish", "-created_at", "-id"],
+                name="post_user_published_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.1.3 on 2026-10-18 20:55
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articleapp", "0019_task"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="task",
+            name="task_status_idx",
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="attempts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="locked_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="locked_by",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="max_attempts",
+            field=models.PositiveIntegerField(default=3),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="run_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["status", "run_at", "id"], name="task_status_idx"
+            ),
+        ),
+    ]
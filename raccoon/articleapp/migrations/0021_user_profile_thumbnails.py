@@ -0,0 +1,18 @@
+# Generated by Django 4.1.3 on 2026-10-18 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articleapp", "0020_task_retries"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="profile_thumbnails",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.1.3 on 2026-10-18 21:10
+
+import articleapp.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articleapp", "0021_user_profile_thumbnails"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredFile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("size", models.PositiveBigIntegerField(default=0)),
+                ("ref_count", models.PositiveIntegerField(default=1)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "保存したファイル",
+                "verbose_name_plural": "保存したファイル",
+            },
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="profile_image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=articleapp.storage.get_media_storage,
+                upload_to="uploads/",
+                verbose_name="プロフィール画像",
+            ),
+        ),
+    ]
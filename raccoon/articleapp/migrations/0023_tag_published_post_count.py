@@ -0,0 +1,35 @@
+# Generated by Django 4.1.3 on 2026-10-18 21:25
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_published_posts(apps, schema_editor):
+    # 既存のタグの公開中の投稿数を数える（reconcile_tag_countsコマンドと同じ処理）
+    Tag = apps.get_model("articleapp", "Tag")
+    Post = apps.get_model("articleapp", "Post")
+    counts = (
+        Post.tags.through.objects.filter(
+            tag_id=models.OuterRef("pk"), post__is_published=True
+        )
+        .values("tag_id")
+        .annotate(count=models.Count("post_id"))
+        .values("count")
+    )
+    Tag.objects.update(published_post_count=Coalesce(models.Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articleapp", "0022_stored_file"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tag",
+            name="published_post_count",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(count_published_posts, migrations.RunPython.noop),
+    ]
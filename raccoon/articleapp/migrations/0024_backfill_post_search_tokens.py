@@ -0,0 +1,47 @@
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def ngrams(text, n):
+    # articleapp.search.tokenizers.NgramTokenizerと同じ処理
+    # （以降のアプリのコードの変更で内容が変わらないよう複製する）
+    for word in unicodedata.normalize("NFKC", text).lower().split():
+        for i in range(len(word) - n + 1):
+            yield word[i : i + n]
+
+
+def index_posts(apps, schema_editor):
+    # SQLite・PostgreSQLでも3文字未満のキーワードの検索にn-gramの転置索引を使うため、
+    # 既存の全ての投稿を索引に登録し直す
+    Post = apps.get_model("articleapp", "Post")
+    PostSearchToken = apps.get_model("articleapp", "PostSearchToken")
+    db_alias = schema_editor.connection.alias
+    n = getattr(settings, "POST_SEARCH_NGRAM_SIZE", 2)
+
+    PostSearchToken.objects.using(db_alias).all().delete()
+    tokens = []
+    posts = Post.objects.using(db_alias).only("id", "title", "body").order_by("id")
+    for post in posts.iterator(chunk_size=BATCH_SIZE):
+        post_tokens = set(ngrams(post.title, n)) | set(ngrams(post.body, n))
+        tokens.extend(
+            PostSearchToken(token=token, post_id=post.id) for token in post_tokens
+        )
+        if len(tokens) >= BATCH_SIZE * 10:
+            PostSearchToken.objects.using(db_alias).bulk_create(tokens)
+            tokens = []
+    PostSearchToken.objects.using(db_alias).bulk_create(tokens)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articleapp", "0023_tag_published_post_count"),
+    ]
+
+    operations = [
+        migrations.RunPython(index_posts, migrations.RunPython.noop),
+    ]
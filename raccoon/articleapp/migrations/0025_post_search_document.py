@@ -0,0 +1,76 @@
+# Generated by Django 4.1.3 on 2026-10-18 22:16
+
+import sqlite3
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def normalize(text):
+    # articleapp.search.tokenizers.normalizeと同じ処理
+    # （以降のアプリのコードの変更で内容が変わらないよう複製する）
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def uses_documents(schema_editor):
+    # NgramSearchBackendを使う場合のみ正規化したタイトル・本文を利用する
+    # （articleapp.search.backends.get_search_backendと同じ判定）
+    backend_path = getattr(settings, "POST_SEARCH_BACKEND", None)
+    if backend_path:
+        return backend_path.endswith(".NgramSearchBackend")
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        return sqlite3.sqlite_version_info < (3, 34, 0)
+    return vendor != "postgresql"
+
+
+def index_documents(apps, schema_editor):
+    if not uses_documents(schema_editor):
+        return
+    Post = apps.get_model("articleapp", "Post")
+    PostSearchDocument = apps.get_model("articleapp", "PostSearchDocument")
+    db_alias = schema_editor.connection.alias
+
+    documents = []
+    posts = Post.objects.using(db_alias).only("id", "title", "body").order_by("id")
+    for post in posts.iterator(chunk_size=BATCH_SIZE):
+        documents.append(
+            PostSearchDocument(
+                post_id=post.id, title=normalize(post.title), body=normalize(post.body)
+            )
+        )
+        if len(documents) >= BATCH_SIZE:
+            PostSearchDocument.objects.using(db_alias).bulk_create(documents)
+            documents = []
+    PostSearchDocument.objects.using(db_alias).bulk_create(documents)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("articleapp", "0024_backfill_post_search_tokens"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostSearchDocument",
+            fields=[
+                (
+                    "post",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to="articleapp.post",
+                    ),
+                ),
+                ("title", models.TextField()),
+                ("body", models.TextField()),
+            ],
+        ),
+        migrations.RunPython(index_documents, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,23 @@
+import hashlib
 import random
 import string
 
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import ASCIIUsernameValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .storage import get_media_storage
+from .utils.markup import (
+    EXCERPT_LENGTH,
+    create_excerpt,
+    get_renderer_signature,
+    render_markdown,
+)
+
 
 def generate_random_slug():
     seed = string.ascii_lowercase + string.digits
@@ -27,8 +37,15 @@ class User(AbstractUser):
         max_length=100, null=True, verbose_name="ニックネーム", blank=True
     )
     profile_image = models.ImageField(
-        upload_to="uploads/", null=True, verbose_name="プロフィール画像", blank=True
+        upload_to="uploads/",
+        storage=get_media_storage,
+        null=True,
+        verbose_name="プロフィール画像",
+        blank=True,
     )
+    # プロフィール画像のサムネイル（utils.images.create_thumbnailsの戻り値）
+    # 画像の変更後にrunworkerコマンドで作成する
+    profile_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
 
     username_validator = ASCIIUsernameValidator()
     username = models.CharField(
@@ -44,19 +61,113 @@ class User(AbstractUser):
         },
     )
 
+    def save(self, *args, **kwargs):
+        # 新しいプロフィール画像の保存（ContentAddressedStorageの参照数の加算）を
+        # ユーザーの行の保存と同じトランザクションで行う
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+    def get_profile_version(self):
+        """
+        他のユーザーに表示するプロフィール（ユーザー名・ニックネーム・画像）の版を返す
+
+        プロフィールを含むページのキャッシュのキーやETagに使う。
+        """
+        profile = "\n".join(
+            [
+                self.username,
+                self.display_name or "",
+                str(self.profile_image or ""),
+                # サムネイルの作成後は画像の表示が変わる
+                str(self.profile_thumbnails.get("source", "")),
+            ]
+        )
+        return hashlib.sha256(profile.encode()).hexdigest()[:16]
+
     def deactivate(self):
         self.is_active = False
         self.display_name = None
-        self.post_set.all().delete()
-        self.profile_image.delete(save=False)
+        # 投稿はすぐに非公開にし、削除はrunworkerコマンドで少しずつ行う
+        # update()ではPost.save()が呼ばれないため、タグの公開中の投稿数を数え直す
+        with transaction.atomic():
+            tag_ids = list(
+                Post.tags.through.objects.filter(
+                    post__user=self, post__is_published=True
+                )
+                .values_list("tag_id", flat=True)
+                .distinct()
+            )
+            self.post_set.update(is_published=False)
+            Tag.objects.filter(id__in=tag_ids).refresh_published_post_count()
+        # 画像の参照はsignals.release_previous_profile_imageで解放する
+        self.profile_image = None
         self.set_password(generate_random_password())  # パスワードをランダムに上書きして復元不可にする
         self.save()
 
+        from .tasks import delete_user_posts
+
+        delete_user_posts.enqueue(user_id=self.id)
+
     class Meta(AbstractUser.Meta):
         verbose_name = "ユーザー"
         verbose_name_plural = "ユーザー"
 
 
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        投稿一覧（snippets/post_list.html）の表示に必要なデータをまとめて取得する。
+
+        投稿ユーザーはJOINで、タグは1回の追加クエリで取得し、
+        投稿ごとのクエリ（N+1）が発生しないようにする。
+        """
+        return (
+            self.select_related("user")
+            .prefetch_related("tags")
+            .only(
+                "title",
+                "slug",
+                # 本文は読み込まず、保存時に作成した抜粋を表示する
+                "excerpt",
+                "is_published",
+                "date_publish",
+                "created_at",
+                "updated_at",
+                "user",
+                "user__username",
+                "user__display_name",
+                "user__profile_image",
+                "user__profile_thumbnails",
+            )
+        )
+
+    def filter_tags(self, tag_names):
+        """
+        指定した名前のタグを全て持つ投稿に絞り込む。
+
+        中間テーブル（post_tags）をpost_idでグループ化し、一致したタグの数が
+        指定したタグの数と等しい投稿のみを残す（1回のサブクエリで完結する）。
+        存在しない名前のタグは無視し、1つも存在しない場合は空のquerysetを返す。
+
+        Args:
+            tag_names (list of str): タグ名のリスト
+        """
+        tag_ids = set(
+            Tag.objects.filter(name__in=tag_names).values_list("id", flat=True)
+        )
+        if not tag_ids:
+            return self.none()
+
+        post_ids = (
+            Post.tags.through.objects.filter(tag_id__in=tag_ids)
+            .values("post_id")
+            .annotate(tag_count=models.Count("tag_id", distinct=True))
+            .filter(tag_count=len(tag_ids))
+            .values("post_id")
+        )
+        return self.filter(id__in=post_ids)
+
+
 class Post(models.Model):
     title = models.CharField(max_length=200, verbose_name="タイトル")
     body = models.TextField(verbose_name="本文", blank=True)
@@ -67,18 +178,115 @@ class Post(models.Model):
     date_publish = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # 一覧に表示する本文の抜粋（保存時に本文から作成する）
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, editable=False)
+    # 詳細ページに表示する本文のHTML（保存時に本文から描画する）
+    body_html = models.TextField(blank=True, editable=False)
+    # body_htmlを描画した際の設定（get_renderer_signatureの値）
+    body_html_signature = models.CharField(max_length=64, blank=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ["-date_publish", "-created_at"]
         constraints = [
             models.UniqueConstraint(fields=["user", "slug"], name="unique_user_slug"),
         ]
+        indexes = [
+            # 公開中の投稿の一覧（トップページ・検索）
+            # 部分インデックスに対応していないDBでは作成されない
+            models.Index(
+                fields=["-date_publish", "-created_at", "-id"],
+                condition=models.Q(is_published=True),
+                name="post_published_idx",
+            ),
+            # ユーザーごとの投稿の一覧（ユーザーホーム・他の記事）
+            # 公開中・下書きの両方の一覧で使えるようにis_publishedは含めない
+            # （SQLiteは真偽値の列をインデックスの等価条件として扱わないため）
+            models.Index(
+                fields=["user", "-date_publish", "-created_at", "-id"],
+                name="post_user_published_idx",
+            ),
+        ]
         verbose_name = "投稿"
         verbose_name_plural = "投稿"
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 公開状態の変化をタグの公開中の投稿数に反映するため、読み込んだ時点の値を保持する
+        if "is_published" in field_names:
+            instance._published_in_db = instance.is_published
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.excerpt = create_excerpt(self.body)
+        self.render_body()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "body" in update_fields:
+            kwargs["update_fields"] = {
+                *update_fields,
+                "excerpt",
+                "body_html",
+                "body_html_signature",
+            }
+        if update_fields is not None and "is_published" not in update_fields:
+            super().save(*args, **kwargs)
+            return
+
+        with transaction.atomic():
+            # 読み込んだ時点の値では、同時に公開状態を変更した他の保存と二重に
+            # 増減するため、行をロックして読み直す
+            was_published = self.get_published_in_db(for_update=True)
+            super().save(*args, **kwargs)
+            if self.is_published != was_published:
+                Tag.objects.filter(post=self).change_published_post_count(
+                    1 if self.is_published else -1
+                )
+        self._published_in_db = self.is_published
+
+    def get_published_in_db(self, for_update=False):
+        """
+        DBに保存されている公開状態を返す（未保存の場合はFalse）
+
+        Args:
+            for_update (bool): Trueの場合は読み込んだ時点の値を使わず、
+                select_for_update()で行をロックして読み直す（トランザクション内で呼び出す）
+        """
+        if self._state.adding:
+            return False
+        if hasattr(self, "_published_in_db") and not for_update:
+            return self._published_in_db
+        queryset = Post.objects.filter(id=self.id)
+        if for_update:
+            queryset = queryset.select_for_update()
+        return queryset.values_list("is_published", flat=True).first() or False
+
+    def render_body(self):
+        """
+        本文をHTMLに描画してbody_htmlに設定する（保存はしない）
+        """
+        self.body_html = render_markdown(self.body)
+        self.body_html_signature = get_renderer_signature()
+
+    def ensure_body_html(self):
+        """
+        body_htmlが現在の設定で描画されていなければ再描画して保存する
+
+        保存時に描画されなかった投稿（bulk_create等）や設定変更前に描画された投稿を、
+        詳細ページの表示時に一度だけ描画し直すために使う。
+        """
+        if self.body_html_signature == get_renderer_signature():
+            return
+        self.render_body()
+        # updated_atを変えないようにsave()ではなくupdate()で保存する
+        Post.objects.filter(id=self.id).update(
+            body_html=self.body_html, body_html_signature=self.body_html_signature
+        )
+
     def publish(self):
         """
         投稿のステータスを公開中に切り替えて投稿日を記録する
@@ -101,8 +309,40 @@ class Post(models.Model):
         return reverse("post_detail", kwargs={"username": self.user, "slug": self.slug})
 
 
+class TagQuerySet(models.QuerySet):
+    def change_published_post_count(self, delta):
+        """
+        タグの公開中の投稿数をdeltaだけ増減する
+        """
+        return self.update(
+            published_post_count=models.F("published_post_count") + delta
+        )
+
+    def refresh_published_post_count(self):
+        """
+        タグの公開中の投稿数を中間テーブルから数え直して保存する
+        """
+        counts = (
+            Post.tags.through.objects.filter(
+                tag_id=models.OuterRef("pk"), post__is_published=True
+            )
+            .values("tag_id")
+            .annotate(count=models.Count("post_id"))
+            .values("count")
+        )
+        return self.update(published_post_count=Coalesce(models.Subquery(counts), 0))
+
+
 class Tag(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    # 公開中の投稿のうちこのタグが付いている投稿の数
+    # 投稿の公開状態・タグの変更時に更新する（Post.save、signals）
+    # ずれた場合はreconcile_tag_countsコマンドで数え直す
+    published_post_count = models.PositiveIntegerField(
+        default=0, db_index=True, editable=False
+    )
+
+    objects = TagQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -110,3 +350,96 @@ class Tag(models.Model):
     class Meta:
         verbose_name = "タグ"
         verbose_name_plural = "タグ"
+
+
+class PostSearchToken(models.Model):
+    """
+    投稿のタイトル・本文のn-gramの転置索引
+    （articleapp.search.backends.NgramSearchBackendが利用する）
+    """
+
+    token = models.CharField(max_length=10)
+    post = models.ForeignKey(to=Post, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["token", "post"], name="unique_search_token_post"
+            ),
+        ]
+
+
+class PostSearchDocument(models.Model):
+    """
+    検索用に正規化した投稿のタイトル・本文
+    （NgramSearchBackendがn-gramの候補の部分一致をSQLで確認するのに使う）
+    """
+
+    post = models.OneToOneField(to=Post, on_delete=models.CASCADE, primary_key=True)
+    title = models.TextField()
+    body = models.TextField()
+
+
+class Task(models.Model):
+    """
+    リクエストの外で実行する処理（runworkerコマンドが実行する）
+
+    nameはarticleapp.task_queue.taskで登録した関数の名前で、payloadを引数として渡す。
+    失敗した場合はmax_attempts回まで間隔を空けて再実行する。
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "待機中"
+        RUNNING = "running", "実行中"
+        DONE = "done", "完了"
+        FAILED = "failed", "失敗"
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.QUEUED
+    )
+    # 実行した回数と最大の回数
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # この日時以降に実行する（再実行までの待機に使う）
+    run_at = models.DateTimeField(default=timezone.now)
+    # 実行中のワーカーが最後に応答した日時（応答が途絶えたタスクは再実行する）
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    # 処理の進捗（処理済みの件数等、内容はタスクごとに異なる）
+    progress = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "run_at", "id"], name="task_status_idx"),
+        ]
+        verbose_name = "タスク"
+        verbose_name_plural = "タスク"
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+
+class StoredFile(models.Model):
+    """
+    ContentAddressedStorage（articleapp.storage）が保存したファイルの参照数
+
+    内容が同じファイルは1つだけ保存し、参照数が0になった時点で削除する。
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "保存したファイル"
+        verbose_name_plural = "保存したファイル"
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
@@ -0,0 +1,237 @@
+import sqlite3
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from ..models import PostSearchDocument, PostSearchToken
+from .tokenizers import NgramTokenizer, normalize
+
+# SQLiteのFTS5で部分一致検索に利用するtrigramトークナイザーは3.34.0以降で利用可能
+SQLITE_TRIGRAM_MIN_VERSION = (3, 34, 0)
+
+# FTS5の仮想テーブル名（マイグレーション0014で作成）
+SQLITE_FTS_TABLE = "articleapp_post_fts"
+
+
+class BaseSearchBackend:
+    """
+    投稿（Post）のキーワード検索を行うバックエンドの基底クラス。
+
+    キーワードによる絞り込みと、投稿の保存・削除時の索引の同期を担当する。
+    索引をデータベース側（トリガーや式インデックス）で同期するバックエンドでは
+    index_post/remove_postは何もしない。
+    """
+
+    def __init__(self, using="default"):
+        self.using = using
+
+    def filter(self, queryset, keyword):
+        """
+        キーワードを含む投稿（タイトルまたは本文）に絞り込んだquerysetを返す。
+
+        Args:
+            queryset (django.db.models.QuerySet): Postのqueryset
+            keyword (str): 空白を含まない検索キーワード1つ
+
+        Returns:
+            django.db.models.QuerySet: 絞り込み後のqueryset
+        """
+        raise NotImplementedError
+
+    def index_post(self, post):
+        """
+        保存された投稿を索引に反映する。
+        """
+
+    def remove_post(self, post):
+        """
+        削除された投稿を索引から取り除く。
+        """
+
+
+class IContainsSearchBackend(BaseSearchBackend):
+    """
+    索引を使わずにLIKE '%...%'で部分一致検索を行うバックエンド。
+    全文検索に対応していないデータベースでのフォールバックとして利用する。
+    """
+
+    def filter(self, queryset, keyword):
+        return self.filter_icontains(queryset, keyword)
+
+    def filter_icontains(self, queryset, keyword):
+        return queryset.filter(Q(title__icontains=keyword) | Q(body__icontains=keyword))
+
+
+class NgramSearchBackend(IContainsSearchBackend):
+    """
+    Pythonで作成した文字n-gramの転置索引（PostSearchToken）を使って検索するバックエンド。
+
+    データベースの全文検索機能に依存しないため、どのデータベースでも利用できる。
+    索引は投稿の保存・削除時に更新されるため、bulk_create等で追加した投稿は
+    rebuild_search_indexコマンドで索引に登録する。
+
+    キーワードのn-gramを全て含む投稿を候補とし、n文字より長いキーワードは
+    候補に対してのみ部分一致を確認する（n-gramの位置は保持していないため、
+    候補には部分一致しない投稿も含まれる）。確認は索引と同じく正規化したタイトル・本文
+    （PostSearchDocument）に対してSQLで行う。
+    n文字未満のキーワード（bigramでは1文字）は索引を使えないため、LIKE検索で扱う。
+    """
+
+    # 正規化したタイトル・本文（PostSearchDocument）を索引に登録するか
+    index_documents = True
+
+    def __init__(self, using="default"):
+        super().__init__(using=using)
+        self.tokenizer = NgramTokenizer(
+            n=getattr(settings, "POST_SEARCH_NGRAM_SIZE", 2)
+        )
+
+    def filter(self, queryset, keyword):
+        tokens = self.tokenizer.tokenize_query(keyword)
+        if not tokens:
+            # n文字未満のキーワードは索引を使えない
+            return self.filter_icontains(queryset, keyword)
+
+        candidate_ids = (
+            PostSearchToken.objects.using(self.using)
+            .filter(token__in=tokens)
+            .values("post_id")
+            .annotate(token_count=Count("token"))
+            .filter(token_count=len(tokens))
+            .values("post_id")
+        )
+        normalized_keyword = normalize(keyword)
+        if len(normalized_keyword) <= self.tokenizer.n:
+            # n文字のキーワードはトークンそのものなので、候補は全て部分一致する
+            return queryset.filter(id__in=candidate_ids)
+
+        if not self.index_documents:
+            # 正規化した文字列を持たない場合は候補に対してLIKE検索で確認する
+            return self.filter_icontains(queryset.filter(id__in=candidate_ids), keyword)
+        # 候補のみについて、正規化したタイトル・本文に部分一致するかを確認する
+        # （全角・半角や大文字・小文字の違いを無視する）
+        matched_ids = (
+            PostSearchDocument.objects.using(self.using)
+            .filter(post_id__in=candidate_ids)
+            .filter(
+                Q(title__contains=normalized_keyword)
+                | Q(body__contains=normalized_keyword)
+            )
+            .values("post_id")
+        )
+        return queryset.filter(id__in=matched_ids)
+
+    def get_post_tokens(self, post):
+        return self.tokenizer.tokenize(post.title) | self.tokenizer.tokenize(post.body)
+
+    def index_post(self, post):
+        tokens = self.get_post_tokens(post)
+        with transaction.atomic(using=self.using):
+            # 登録済みのトークンとの差分のみを追加・削除する
+            indexed_tokens = set(
+                PostSearchToken.objects.using(self.using)
+                .filter(post=post)
+                .values_list("token", flat=True)
+            )
+            PostSearchToken.objects.using(self.using).filter(
+                post=post, token__in=indexed_tokens - tokens
+            ).delete()
+            PostSearchToken.objects.using(self.using).bulk_create(
+                [
+                    PostSearchToken(token=token, post=post)
+                    for token in tokens - indexed_tokens
+                ]
+            )
+            if self.index_documents:
+                PostSearchDocument.objects.using(self.using).update_or_create(
+                    post=post,
+                    defaults={
+                        "title": normalize(post.title),
+                        "body": normalize(post.body),
+                    },
+                )
+
+    def remove_post(self, post):
+        PostSearchToken.objects.using(self.using).filter(post_id=post.id).delete()
+        PostSearchDocument.objects.using(self.using).filter(post_id=post.id).delete()
+
+
+class SQLiteFTS5SearchBackend(NgramSearchBackend):
+    """
+    SQLiteのFTS5（trigramトークナイザー）の仮想テーブルを使って検索するバックエンド。
+
+    仮想テーブルはarticleapp_postテーブルを外部コンテンツとして参照し、
+    INSERT/UPDATE/DELETEのトリガーで同期される（bulk_create等も含む）。
+    トリガーはarticleapp_postテーブルが作り直されると削除されるため、フィールドの追加等の
+    マイグレーションでは0017_post_body_htmlと同様にSQLを複製して作り直す。
+
+    trigramは3文字単位の索引のため、3文字未満のキーワード（日本語では2文字の語が多い）は
+    NgramSearchBackendのn-gram（bigram）の転置索引で検索する。
+    n文字以下のキーワードは候補がそのまま結果になるため、正規化したタイトル・本文は
+    索引に登録しない。
+    """
+
+    min_keyword_length = 3
+    index_documents = False
+
+    def filter(self, queryset, keyword):
+        if len(keyword) < self.min_keyword_length:
+            return super().filter(queryset, keyword)
+
+        # キーワードをFTS5のフレーズ（"..."）として渡し、部分一致させる
+        phrase = '"%s"' % keyword.replace('"', '""')
+        match = RawSQL(
+            f"SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s",
+            (phrase,),
+        )
+        return queryset.filter(id__in=match)
+
+
+class PostgreSQLTrigramSearchBackend(NgramSearchBackend):
+    """
+    PostgreSQLのpg_trgm拡張のGINインデックスを使って検索するバックエンド。
+
+    日本語は単語の区切りが無くtsvectorでは部分一致させられないため、
+    タイトル・本文のUPPER(...)に対するtrigramの式インデックスを作成している。
+    DjangoのicontainsはUPPER(col::text) LIKE UPPER(%s)を発行するので、
+    クエリはIContainsSearchBackendと同じままインデックスが利用される。
+
+    trigramのインデックスを使えない3文字未満のキーワードは、
+    NgramSearchBackendのn-gram（bigram）の転置索引で検索する
+    （SQLiteFTS5SearchBackendと同じく、正規化したタイトル・本文は索引に登録しない）。
+    """
+
+    min_keyword_length = 3
+    index_documents = False
+
+    def filter(self, queryset, keyword):
+        if len(keyword) < self.min_keyword_length:
+            return super().filter(queryset, keyword)
+        return self.filter_icontains(queryset, keyword)
+
+
+def sqlite_supports_trigram():
+    return sqlite3.sqlite_version_info >= SQLITE_TRIGRAM_MIN_VERSION
+
+
+def get_search_backend(using="default"):
+    """
+    設定またはデータベースの種類に応じた検索バックエンドを返す。
+
+    settings.POST_SEARCH_BACKENDにクラスのパスが指定されていればそれを利用する。
+    """
+    backend_path = getattr(settings, "POST_SEARCH_BACKEND", None)
+    if backend_path:
+        return import_string(backend_path)(using=using)
+
+    vendor = connections[using].vendor
+    # いずれも3文字未満のキーワードはn-gramの転置索引（NgramSearchBackend）で検索する
+    if vendor == "sqlite" and sqlite_supports_trigram():
+        return SQLiteFTS5SearchBackend(using=using)
+    if vendor == "postgresql":
+        return PostgreSQLTrigramSearchBackend(using=using)
+    # 全文検索の索引を作成できないデータベースではn-gramの転置索引を利用する
+    return NgramSearchBackend(using=using)
@@ -0,0 +1,49 @@
+import unicodedata
+
+
+def normalize(text):
+    """
+    索引・検索の両方で共通の正規化を行う。
+
+    NFKCで全角英数字・半角カナ等を統一し、大文字小文字を区別しないよう小文字にする。
+    """
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+class NgramTokenizer:
+    """
+    文字n-gramのトークナイザー。
+
+    日本語は単語の間に空白が無いため、形態素解析の代わりに連続するn文字を
+    トークンとする。空白をまたぐトークンは作らない（検索キーワードは空白で区切るため）。
+    キーワードに含まれるn-gramが全て文書に含まれていれば、その文書は
+    キーワードを部分文字列として含む候補となる。
+
+    Args:
+        n (int): 1トークンの文字数（2ならbigram、3ならtrigram）
+    """
+
+    def __init__(self, n=2):
+        self.n = n
+
+    def _ngrams(self, text):
+        n = self.n
+        for word in normalize(text).split():
+            for i in range(len(word) - n + 1):
+                yield word[i : i + n]
+
+    def tokenize(self, text):
+        """
+        文書（タイトル・本文）から索引に登録するトークンの集合を返す。
+
+        n文字未満の語はキーワードの一部にしかならないため、索引には登録しない。
+        """
+        return set(self._ngrams(text))
+
+    def tokenize_query(self, keyword):
+        """
+        検索キーワードから索引を引くためのトークンの集合を返す。
+
+        キーワードがn文字未満の場合は索引を使えないため空の集合を返す。
+        """
+        return set(self._ngrams(keyword))
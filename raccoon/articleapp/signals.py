@@ -0,0 +1,224 @@
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Post, Tag, User
+from .search import get_search_backend
+from .tasks import create_profile_thumbnails
+from .utils import page_cache
+from .utils.tag_autocomplete import tag_autocomplete
+from .utils.tag_pool import published_tag_pool
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, **kwargs):
+    # 投稿の保存時に検索の索引を更新する
+    get_search_backend().index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_search_index(sender, instance, **kwargs):
+    # 投稿の削除時に検索の索引から取り除く
+    get_search_backend().remove_post(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_tag_pool(sender, **kwargs):
+    # 公開状態やタグの紐づけが変わったらトップページのタグの候補を読み込み直す
+    published_tag_pool.invalidate()
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_tag_counts_on_tags_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    # 公開中の投稿のタグの紐づけが変わったらタグの公開中の投稿数を増減する
+    through = Post.tags.through
+    if not reverse:
+        # 保存前の公開状態の変更はPost.save()で反映する
+        if not instance.get_published_in_db():
+            return
+        if action in ("pre_remove", "pre_clear"):
+            # 紐づいていないタグのremoveは無視されるため、実際に外れるタグを記録する
+            links = through.objects.filter(post_id=instance.id)
+            if action == "pre_remove":
+                links = links.filter(tag_id__in=pk_set)
+            instance._removed_tag_ids = list(links.values_list("tag_id", flat=True))
+        elif action == "post_add":
+            Tag.objects.filter(id__in=pk_set).change_published_post_count(1)
+        elif action in ("post_remove", "post_clear"):
+            tag_ids = getattr(instance, "_removed_tag_ids", [])
+            Tag.objects.filter(id__in=tag_ids).change_published_post_count(-1)
+            instance._removed_tag_ids = []
+        return
+
+    # タグ側（tag.post_set）から変更された場合
+    if action == "post_add":
+        count = Post.objects.filter(id__in=pk_set, is_published=True).count()
+        Tag.objects.filter(id=instance.id).change_published_post_count(count)
+    elif action in ("post_remove", "post_clear"):
+        Tag.objects.filter(id=instance.id).refresh_published_post_count()
+
+
+@receiver(pre_delete, sender=Post)
+def update_tag_counts_on_post_delete(sender, instance, **kwargs):
+    # 紐づけは投稿と一緒に削除されるため、削除前に減らす
+    if instance.get_published_in_db():
+        Tag.objects.filter(post=instance).change_published_post_count(-1)
+
+
+def invalidate_post_pages(post):
+    # 投稿が表示されるトップページと投稿者のページのキャッシュを無効化する
+    page_cache.invalidate(
+        page_cache.SCOPE_INDEX, page_cache.user_scope(post.user.username)
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_pages_on_post_change(sender, instance, **kwargs):
+    invalidate_post_pages(instance)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_pages_on_post_tags_change(sender, instance, action, reverse, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # タグ側から変更された場合はどの投稿が変わったか分からないため全て無効化する
+        page_cache.invalidate(page_cache.SCOPE_ALL)
+    else:
+        invalidate_post_pages(instance)
+
+
+@receiver(post_save, sender=Tag)
+def invalidate_pages_on_tag_save(sender, instance, created, **kwargs):
+    # 作成されたばかりのタグはまだどの投稿にも紐づいていない
+    if not created:
+        page_cache.invalidate(page_cache.SCOPE_ALL)
+
+
+@receiver(post_delete, sender=Tag)
+def invalidate_pages_on_tag_delete(sender, instance, **kwargs):
+    page_cache.invalidate(page_cache.SCOPE_ALL)
+
+
+@receiver(post_save, sender=Tag)
+def add_to_tag_autocomplete(sender, instance, **kwargs):
+    # タグの作成・名前の変更をコミット後に入力補完の索引に反映する
+    tag_id, name = instance.id, instance.name
+    transaction.on_commit(lambda: tag_autocomplete.add(tag_id, name))
+
+
+@receiver(post_delete, sender=Tag)
+def remove_from_tag_autocomplete(sender, instance, **kwargs):
+    tag_id = instance.id
+    transaction.on_commit(lambda: tag_autocomplete.remove(tag_id))
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_username(sender, instance, update_fields, **kwargs):
+    # ユーザー名が変わった場合に変更前のURLのキャッシュも無効化できるよう記録する
+    if instance.pk is None:
+        return
+    if update_fields is not None and "username" not in update_fields:
+        return
+    instance._previous_username = (
+        User.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_pages_on_user_change(sender, instance, update_fields=None, **kwargs):
+    # ログイン時の最終ログイン日時の更新はページの表示に影響しない
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    usernames = {instance.username, getattr(instance, "_previous_username", None)}
+    page_cache.invalidate(
+        page_cache.SCOPE_INDEX,
+        *[page_cache.user_scope(username) for username in usernames if username],
+    )
+
+
+def touch_posts(posts):
+    # 投稿の一覧の項目のキャッシュのキーが変わるよう、投稿の更新日時を更新する
+    posts.update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def touch_posts_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            touch_posts(Post.objects.filter(id=instance.id))
+    elif action in ("post_add", "post_remove"):
+        touch_posts(Post.objects.filter(id__in=pk_set))
+    elif action == "pre_clear":
+        # 紐づけが削除される前に対象の投稿を更新する
+        touch_posts(Post.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Tag)
+def touch_posts_on_tag_rename(sender, instance, created, **kwargs):
+    if not created:
+        touch_posts(Post.objects.filter(tags=instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def touch_posts_on_tag_delete(sender, instance, **kwargs):
+    touch_posts(Post.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=User)
+def enqueue_profile_thumbnails(sender, instance, update_fields=None, **kwargs):
+    # プロフィール画像が変更されたらサムネイルの作成（または削除）をキューに追加する
+    if update_fields is not None and "profile_image" not in update_fields:
+        return
+    image_name = instance.profile_image.name if instance.profile_image else None
+    if not image_name and not instance.profile_thumbnails:
+        return
+    if image_name and instance.profile_thumbnails.get("source") == image_name:
+        return
+    create_profile_thumbnails.enqueue(user_id=instance.id)
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_profile_image(sender, instance, update_fields, **kwargs):
+    if instance.pk is None:
+        return
+    if update_fields is not None and "profile_image" not in update_fields:
+        return
+    instance._previous_profile_image = (
+        User.objects.filter(pk=instance.pk)
+        .values_list("profile_image", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=User)
+def release_previous_profile_image(sender, instance, **kwargs):
+    # 変更・削除されたプロフィール画像の参照を解放する（参照が無くなればファイルを削除）
+    previous = getattr(instance, "_previous_profile_image", None)
+    instance._previous_profile_image = None
+    if not previous or previous == instance.profile_image.name:
+        return
+    storage = instance.profile_image.storage
+    transaction.on_commit(lambda: storage.delete(previous))
+
+
+@receiver(post_delete, sender=User)
+def release_profile_image(sender, instance, **kwargs):
+    if not instance.profile_image:
+        return
+    name = instance.profile_image.name
+    storage = instance.profile_image.storage
+    transaction.on_commit(lambda: storage.delete(name))
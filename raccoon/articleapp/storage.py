@@ -0,0 +1,147 @@
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+# ContentAddressedStorageが保存したファイルの名前（ディレクトリ/ab/cd/abcd...（64文字）.拡張子）
+CONTENT_ADDRESSED_NAME_PATTERN = re.compile(
+    r"(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}(?:\.[0-9A-Za-z]+)?$"
+)
+
+# 内容が変わらないファイルを配信する際のCache-Control（1年間、再検証しない）
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def is_content_addressed(name):
+    """
+    ファイル名がContentAddressedStorageで保存したファイル（内容が変わらない）の名前かどうか
+    """
+    return CONTENT_ADDRESSED_NAME_PATTERN.search(name) is not None
+
+
+def hash_content(content):
+    """
+    ファイルの内容のSHA-256を16進数の文字列で返す（ファイル全体をメモリに読み込まない）
+    """
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    ファイルを内容のハッシュ値の名前で保存するストレージ。
+
+    保存先は「upload_toのディレクトリ/ハッシュ値の先頭2文字/次の2文字/ハッシュ値.拡張子」
+    とし、1つのディレクトリのファイル数が増えすぎないようにする。
+    内容が同じファイルは1つだけ保存し、StoredFileで参照数を数えて、
+    参照が無くなった時点でファイルを削除する。
+
+    ファイルの内容が変わればURLも変わるため、保存したファイルのURLは
+    期限なくキャッシュさせてよい（is_content_addressedで判別できる）。
+    StoredFileが無いファイル（このストレージを使う前に保存したファイル）も
+    そのまま読み込み・削除できる。
+    """
+
+    def get_content_name(self, name, content):
+        directory = posixpath.dirname(name.replace("\\", "/"))
+        extension = os.path.splitext(name)[1].lower()
+        digest = hash_content(content)
+        return posixpath.join(directory, digest[:2], digest[2:4], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        """
+        ファイルを保存し、参照数を1つ増やす
+
+        参照数の加算は呼び出し元のトランザクションに含める。ファイルを参照する行の
+        保存と同じトランザクションで呼び出せば、行の保存が失敗した場合は参照数も
+        元に戻る（書き込んだファイルは残るが、同じ内容のファイルの保存時に再利用する）。
+        """
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        validate_file_name(name, allow_relative_path=True)
+
+        from .models import StoredFile
+
+        with transaction.atomic():
+            # 先にUPDATEで行をロックし、同じ名前のdelete()と同時に実行されないようにする
+            # （SQLiteではデータベース全体の書き込みのロックになる）
+            updated = StoredFile.objects.filter(name=name).update(
+                ref_count=F("ref_count") + 1
+            )
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        StoredFile.objects.create(name=name, size=content.size)
+                except IntegrityError:
+                    # 同時に同じ内容のファイルが保存された
+                    StoredFile.objects.filter(name=name).update(
+                        ref_count=F("ref_count") + 1
+                    )
+            # ロックしている間に確認するため、delete()が削除したファイルを参照しない
+            if not self.exists(name):
+                try:
+                    self._save(name, content)
+                except FileExistsError:
+                    # 同時に同じ内容のファイルが書き込まれた
+                    pass
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # 同じ名前のファイルは同じ内容のため、別の名前にはしない
+        # （_saveでファイルが既にあった場合に呼ばれる）
+        raise FileExistsError(f"{name} は既に保存されています。")
+
+    def delete(self, name):
+        """
+        参照数を1つ減らし、参照が無くなればファイルを削除する
+        """
+        if not name:
+            raise ValueError("The name must be given to delete().")
+
+        from .models import StoredFile
+
+        if not is_content_addressed(name):
+            # このストレージを使う前に保存したファイル
+            super().delete(name)
+            return
+
+        with transaction.atomic():
+            # save()と同じく先にUPDATEで行をロックしてから参照数を確認する
+            # （読み込んでから減らすと、その間に増えた参照を見落とす）
+            updated = StoredFile.objects.filter(name=name, ref_count__gt=0).update(
+                ref_count=F("ref_count") - 1
+            )
+            if not updated:
+                # 参照は解放済み
+                return
+            deleted, _ = StoredFile.objects.filter(name=name, ref_count=0).delete()
+            if deleted:
+                # 行のロックを保持している間に削除する（同じ内容のsave()は
+                # ロックの解放後に行が無いことを確認して、ファイルを書き込み直す）
+                super().delete(name)
+
+
+# メディアファイル（プロフィール画像とそのサムネイル）の保存先
+content_addressed_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    """
+    プロフィール画像のImageFieldのstorageに指定する
+    （マイグレーションにストレージの設定を含めないよう呼び出し可能オブジェクトにする）
+    """
+    return content_addressed_storage
@@ -0,0 +1,324 @@
+import datetime
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import OperationalError, connections, router, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# タスクの名前と関数の対応（taskデコレータで登録する）
+registry = {}
+
+# DBのロック等で失敗した取り出し・結果の保存を再試行する回数と、最初の待ち時間（秒）
+DB_RETRY_ATTEMPTS = 8
+DB_RETRY_DELAY = 0.05
+
+
+def task(func=None, *, max_attempts=None):
+    """
+    関数をrunworkerコマンドで実行できるタスクとして登録するデコレータ。
+
+    登録した関数は func.enqueue(**payload) でキューに追加できる。
+    関数は実行中のTaskを第1引数として、payloadをキーワード引数として受け取る。
+    タスクは少なくとも1回実行される（途中で失敗・中断した場合は再実行される）ため、
+    同じ引数で複数回実行されても問題ない処理にする。
+
+    Args:
+        max_attempts (int): 失敗した場合を含めて実行する最大の回数
+            （省略時はsettings.TASK_MAX_ATTEMPTS）
+    """
+
+    def decorator(func):
+        registry[func.__name__] = func
+        func.enqueue = lambda **payload: enqueue(
+            func.__name__, max_attempts=max_attempts, **payload
+        )
+        return func
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def enqueue(name, max_attempts=None, **payload):
+    """
+    タスクをキューに追加する。
+
+    Args:
+        name (str): 登録したタスクの名前
+        max_attempts (int): 実行する最大の回数（省略時はsettings.TASK_MAX_ATTEMPTS）
+        **payload: タスクの関数に渡す引数（JSONに変換できる値）
+
+    Returns:
+        Task: 追加したタスク
+    """
+    if name not in registry:
+        raise ValueError(f"未登録のタスクです: {name}")
+    return Task.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+    )
+
+
+def get_worker_name():
+    """
+    タスクを実行中のワーカー（ホスト・プロセス・スレッド）を表す文字列を返す
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def retry_on_operational_error(func, *args, **kwargs):
+    """
+    funcを呼び出し、OperationalError（SQLiteの「database table is locked」等）で
+    失敗した場合は待ち時間を2倍にしながらDB_RETRY_ATTEMPTS回まで再試行する
+    """
+    delay = DB_RETRY_DELAY
+    for attempt in range(1, DB_RETRY_ATTEMPTS + 1):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError:
+            if attempt == DB_RETRY_ATTEMPTS:
+                raise
+            logger.warning("DBの操作に失敗したため再試行します。", exc_info=True)
+            time.sleep(delay * random.uniform(1.0, 1.5))
+            delay *= 2
+
+
+def _abandoned_tasks(now):
+    # ワーカーの応答が途絶えた実行中のタスク
+    expired = now - datetime.timedelta(seconds=settings.TASK_LOCK_TIMEOUT)
+    return Q(status=Task.Status.RUNNING, locked_at__lt=expired)
+
+
+def _claimable_tasks(now):
+    # 実行日時を過ぎた待機中のタスクと、ワーカーの応答が途絶えた実行中のタスク
+    # （実行した回数がmax_attemptsに達したタスクは_fail_abandoned_tasksで失敗にする）
+    return Task.objects.filter(
+        Q(status=Task.Status.QUEUED, run_at__lte=now)
+        | (_abandoned_tasks(now) & Q(attempts__lt=F("max_attempts")))
+    ).order_by("run_at", "id")
+
+
+def _fail_abandoned_tasks(using, now):
+    # 応答が途絶えたまま実行した回数がmax_attemptsに達したタスクは再実行せず失敗にする
+    return (
+        Task.objects.using(using)
+        .filter(_abandoned_tasks(now), attempts__gte=F("max_attempts"))
+        .update(
+            status=Task.Status.FAILED,
+            locked_at=None,
+            locked_by="",
+            error="ワーカーの応答が途絶えたまま最大の回数に達しました。",
+            updated_at=now,
+        )
+    )
+
+
+def claim_next_task(worker_name=None):
+    """
+    実行できるタスクを1つ取り出して実行中にする。
+
+    応答が途絶えた実行中のタスクは、実行した回数がmax_attemptsに達していなければ
+    再実行し、達していれば失敗にする。
+
+    SELECT ... FOR UPDATE SKIP LOCKEDに対応したDB（PostgreSQL等）では、
+    他のワーカーがロック中の行を読み飛ばして取り出す。
+    対応していないDB（SQLite）では、取り出した時点の状態のままであれば
+    実行中に更新する条件付きのUPDATEで取り出しを確定する。
+
+    Returns:
+        Task or None: 取り出したタスク（実行できるタスクが無ければNone）
+    """
+    worker_name = worker_name or get_worker_name()
+    using = router.db_for_write(Task)
+    _fail_abandoned_tasks(using, timezone.now())
+    if connections[using].features.has_select_for_update_skip_locked:
+        return _claim_with_skip_locked(using, worker_name)
+    return _claim_with_conditional_update(using, worker_name)
+
+
+def _mark_claimed(task, now, worker_name):
+    task.status = Task.Status.RUNNING
+    task.attempts += 1
+    task.locked_at = now
+    task.locked_by = worker_name
+    return task
+
+
+def _claim_with_skip_locked(using, worker_name):
+    with transaction.atomic(using=using):
+        now = timezone.now()
+        task = (
+            _claimable_tasks(now)
+            .using(using)
+            .select_for_update(skip_locked=True)
+            .first()
+        )
+        if task is None:
+            return None
+        _mark_claimed(task, now, worker_name)
+        task.save(
+            update_fields=["status", "attempts", "locked_at", "locked_by", "updated_at"]
+        )
+        return task
+
+
+def _claim_with_conditional_update(using, worker_name):
+    while True:
+        now = timezone.now()
+        task = _claimable_tasks(now).using(using).first()
+        if task is None:
+            return None
+        claimed = (
+            Task.objects.using(using)
+            .filter(
+                id=task.id,
+                status=task.status,
+                attempts=task.attempts,
+            )
+            .update(
+                status=Task.Status.RUNNING,
+                attempts=F("attempts") + 1,
+                locked_at=now,
+                locked_by=worker_name,
+                updated_at=now,
+            )
+        )
+        if claimed:
+            return _mark_claimed(task, now, worker_name)
+
+
+def get_retry_delay(attempts):
+    """
+    attempts回目の実行に失敗したタスクを再実行するまでの秒数を返す。
+
+    間隔は失敗するたびに2倍にし（上限はsettings.TASK_RETRY_MAX_DELAY）、
+    同時に失敗したタスクの再実行が重ならないよう最大で1割ずらす。
+    """
+    delay = min(
+        settings.TASK_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+        settings.TASK_RETRY_MAX_DELAY,
+    )
+    return delay * random.uniform(1.0, 1.1)
+
+
+def run_task(task):
+    """
+    タスクを実行し、結果をステータスに記録する。
+
+    失敗した場合は実行した回数がmax_attemptsに達するまで待機中に戻して再実行する。
+    結果の保存がDBのロック等で失敗した場合は再試行する。
+    """
+    try:
+        registry[task.name](task, **task.payload)
+    except Exception:
+        logger.exception("タスク%s (id=%s) が失敗しました。", task.name, task.id)
+        task.error = traceback.format_exc()
+        if task.attempts < task.max_attempts:
+            task.status = Task.Status.QUEUED
+            task.run_at = timezone.now() + datetime.timedelta(
+                seconds=get_retry_delay(task.attempts)
+            )
+        else:
+            task.status = Task.Status.FAILED
+    else:
+        task.status = Task.Status.DONE
+    task.locked_at = None
+    task.locked_by = ""
+    retry_on_operational_error(
+        task.save,
+        update_fields=[
+            "status",
+            "run_at",
+            "locked_at",
+            "locked_by",
+            "error",
+            "updated_at",
+        ],
+    )
+
+
+def report_progress(task, **progress):
+    """
+    タスクの進捗を記録する（タスクの関数から呼び出す）
+
+    実行中であることの応答も兼ねるため、時間のかかるタスクは定期的に呼び出す。
+    """
+    task.progress = progress
+    task.locked_at = timezone.now()
+    task.save(update_fields=["progress", "locked_at", "updated_at"])
+
+
+def close_old_connections():
+    """
+    タイムアウト等で使えなくなったDBの接続を閉じる（リクエストの終了時と同じ処理）
+
+    トランザクション中の接続（テスト等）は閉じない。
+    """
+    for conn in connections.all(initialized_only=True):
+        if not conn.in_atomic_block:
+            conn.close_if_unusable_or_obsolete()
+
+
+def _wait(seconds, stop_event):
+    if stop_event is not None:
+        stop_event.wait(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def work(burst=False, sleep=1.0, stop_event=None, on_task_done=None):
+    """
+    タスクを取り出して実行することを繰り返す（runworkerコマンドの各スレッドで実行する）
+
+    Args:
+        burst (bool): Trueの場合は実行できるタスクが無くなったら終了する
+        sleep (float): 実行できるタスクが無い場合に次に確認するまでの秒数
+        stop_event (threading.Event): 設定されたら終了する
+        on_task_done (callable): タスクの実行後に呼び出す関数（Taskを受け取る）
+
+    Returns:
+        int: 実行したタスクの数
+    """
+    worker_name = get_worker_name()
+    count = 0
+    try:
+        while stop_event is None or not stop_event.is_set():
+            close_old_connections()
+            try:
+                task = retry_on_operational_error(claim_next_task, worker_name)
+            except OperationalError:
+                # 再試行しても取り出せない場合は待ってから次のタスクを確認する
+                logger.exception("タスクを取り出せませんでした。")
+                _wait(sleep, stop_event)
+                continue
+            if task is None:
+                if burst:
+                    break
+                _wait(sleep, stop_event)
+                continue
+            try:
+                run_task(task)
+            except OperationalError:
+                # 結果を保存できなかったタスクは、応答が途絶えたタスクとして再実行される
+                logger.exception("タスク%s (id=%s) の結果を保存できませんでした。", task.name, task.id)
+                continue
+            count += 1
+            if on_task_done is not None:
+                on_task_done(task)
+    finally:
+        # スレッドごとのDBの接続を閉じる
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+    return count
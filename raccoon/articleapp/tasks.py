@@ -0,0 +1,61 @@
+from django.db import router, transaction
+from django.db.models.deletion import Collector
+
+from .models import Post, User
+from .task_queue import report_progress, task
+from .utils.images import create_thumbnails, delete_thumbnails
+
+
+@task
+def delete_user_posts(task, user_id, batch_size=500):
+    """
+    ユーザーの投稿とタグの紐づけをbatch_size件ずつ削除する（User.deactivateを参照）
+
+    1回のトランザクションで削除する件数を抑えてロックの保持時間を短くする。
+    """
+    total = Post.objects.filter(user_id=user_id).count()
+    deleted = 0
+    report_progress(task, total=total, deleted=deleted)
+    while True:
+        # シグナルハンドラが投稿のユーザーを参照するため合わせて読み込む
+        posts = list(
+            Post.objects.filter(user_id=user_id)
+            .select_related("user")
+            .order_by("id")[:batch_size]
+        )
+        if not posts:
+            break
+        using = router.db_for_write(Post)
+        with transaction.atomic(using=using):
+            # 読み込んだ投稿をまとめて削除する（タグの紐づけ等も合わせて削除される）
+            collector = Collector(using=using)
+            collector.collect(posts)
+            collector.delete()
+        deleted += len(posts)
+        report_progress(task, total=max(total, deleted), deleted=deleted)
+
+
+@task
+def create_profile_thumbnails(task, user_id, force=False):
+    """
+    ユーザーのプロフィール画像のサムネイルを作成し、以前のサムネイルを削除する
+
+    画像が削除されていればサムネイルのみ削除する。
+    forceがFalseの場合、現在の画像のサムネイルが作成済みであれば何もしない。
+    """
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return
+    previous_thumbnails = user.profile_thumbnails
+    if user.profile_image:
+        if not force and previous_thumbnails.get("source") == user.profile_image.name:
+            return
+    elif not previous_thumbnails:
+        return
+
+    # サムネイルの参照数の加算とユーザーの行の保存を同じトランザクションで行う
+    with transaction.atomic():
+        thumbnails = create_thumbnails(user.profile_image) if user.profile_image else {}
+        user.profile_thumbnails = thumbnails
+        user.save(update_fields=["profile_thumbnails"])
+    delete_thumbnails(previous_thumbnails, storage=user.profile_image.storage)
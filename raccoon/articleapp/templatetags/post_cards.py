@@ -0,0 +1,61 @@
+from django import template
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from ..utils import instrumentation
+
+register = template.Library()
+
+POST_CARD_TEMPLATE = "articleapp/snippets/post_card.html"
+
+
+def get_post_card_cache_key(post, is_logged_in_user_home):
+    """
+    投稿の一覧の項目（カード）のキャッシュのキーを返す。
+
+    投稿の更新日時とユーザーのプロフィールの版を含めるため、
+    どちらかが変わると別のキーになる（タグの紐づけの変更でも更新日時を変える）。
+    """
+    return ":".join(
+        [
+            "post_card",
+            str(post.id),
+            str(post.updated_at.timestamp()),
+            post.user.get_profile_version(),
+            # 自分のユーザーホームでは編集・削除のリンクを表示する
+            "owner" if is_logged_in_user_home else "visitor",
+        ]
+    )
+
+
+@register.simple_tag(takes_context=True)
+def render_post_cards(context, posts):
+    """
+    投稿の一覧の項目（カード）をまとめて表示する。
+
+    各カードの描画結果をキャッシュし、ページ内のカードは1回のget_manyで取得する。
+    キャッシュに無いカードのみ描画してset_manyで保存する。
+    """
+    is_logged_in_user_home = context.get("is_logged_in_user_home", False)
+    posts = list(posts)
+    keys = [get_post_card_cache_key(post, is_logged_in_user_home) for post in posts]
+
+    cache = caches[settings.POST_CARD_CACHE_ALIAS]
+    cards = cache.get_many(keys)
+    rendered_cards = {}
+    card_template = get_template(POST_CARD_TEMPLATE)
+    for post, key in zip(posts, keys):
+        if key not in cards:
+            rendered_cards[key] = card_template.render(
+                {"post": post, "is_logged_in_user_home": is_logged_in_user_home}
+            )
+    instrumentation.record_cache(
+        "post_cards", hits=len(cards), misses=len(rendered_cards)
+    )
+    if rendered_cards:
+        cache.set_many(rendered_cards, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(rendered_cards)
+
+    return mark_safe("".join(cards[key] for key in keys))
@@ -0,0 +1,55 @@
+from django import template
+
+register = template.Library()
+
+
+def _pick_variant(variants, min_size):
+    # min_size以上で最も小さいサムネイル（無ければ最も大きいもの）
+    sizes = sorted(int(size) for size in variants)
+    for size in sizes:
+        if size >= min_size:
+            return variants[str(size)]
+    return variants[str(sizes[-1])]
+
+
+def _srcset(storage, variants, size, image_format):
+    candidates = []
+    for density in [1, 2]:
+        variant = _pick_variant(variants, size * density)
+        if image_format in variant:
+            url = storage.url(variant[image_format])
+            candidates.append(f"{url} {density}x")
+    return ", ".join(candidates)
+
+
+@register.inclusion_tag("articleapp/snippets/profile_image.html")
+def profile_image(user, size, css_class=""):
+    """
+    ユーザーのプロフィール画像を表示する。
+
+    サムネイルが作成済みであれば、表示する大きさと画面の解像度に合うサムネイルを
+    srcsetで指定し、対応するブラウザにはWebPを表示する。
+    作成前は元の画像を表示する。
+
+    Args:
+        user (User): 画像を表示するユーザー
+        size (int): 表示する大きさ（CSSのピクセル数）
+        css_class (str): imgタグのclass属性
+    """
+    context = {"css_class": css_class, "size": size, "src": ""}
+    if not user.profile_image:
+        return context
+
+    variants = user.profile_thumbnails.get("variants")
+    if user.profile_thumbnails.get("source") != user.profile_image.name or not variants:
+        context["src"] = user.profile_image.url
+        return context
+
+    fallback = _pick_variant(variants, size)
+    fallback_format = next(name for name in fallback if name != "webp")
+    # サムネイルは元の画像と同じストレージに保存している
+    storage = user.profile_image.storage
+    context["src"] = storage.url(fallback[fallback_format])
+    context["srcset"] = _srcset(storage, variants, size, fallback_format)
+    context["webp_srcset"] = _srcset(storage, variants, size, "webp")
+    return context
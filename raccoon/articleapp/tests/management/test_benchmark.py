@@ -0,0 +1,75 @@
+import json
+from io import StringIO
+
+from articleapp.models import Post, Tag, User
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class BenchmarkCommandsTests(TestCase):
+    def seed(self, **options):
+        call_command(
+            "seed_benchmark_data",
+            users=3,
+            posts=30,
+            tags=10,
+            stdout=StringIO(),
+            **options,
+        )
+
+    def test_同じシードでは同じデータを作成(self):
+        self.seed(seed=1)
+        first = list(
+            Post.objects.order_by("slug").values_list("slug", "title", "user__username")
+        )
+        first_tags = list(
+            Post.tags.through.objects.order_by("post__slug", "tag__name").values_list(
+                "post__slug", "tag__name"
+            )
+        )
+
+        self.seed(seed=1, clear=True)
+        self.assertEqual(User.objects.filter(username__startswith="bench_").count(), 3)
+        self.assertEqual(Tag.objects.filter(name__startswith="bench_").count(), 10)
+        self.assertEqual(
+            list(
+                Post.objects.order_by("slug").values_list(
+                    "slug", "title", "user__username"
+                )
+            ),
+            first,
+        )
+        self.assertEqual(
+            list(
+                Post.tags.through.objects.order_by(
+                    "post__slug", "tag__name"
+                ).values_list("post__slug", "tag__name")
+            ),
+            first_tags,
+        )
+        # 保存時と同様に抜粋と本文のHTMLを作成する
+        post = Post.objects.first()
+        self.assertNotEqual(post.excerpt, "")
+        self.assertNotEqual(post.body_html, "")
+
+    def test_シナリオごとのレイテンシとクエリ数をJSONで出力(self):
+        self.seed()
+        out = StringIO()
+        call_command(
+            "benchmark_views", repeat=4, warmup=1, host="testserver", stdout=out
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["meta"]["posts"], 30)
+        scenarios = report["scenarios"]
+        for name in ["index", "search_keyword", "post_detail", "user_home"]:
+            self.assertIn(name, scenarios)
+        for name, result in scenarios.items():
+            self.assertEqual(result["requests"], 4)
+            self.assertEqual(result["statuses"], {"200": 4})
+            self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+            self.assertLessEqual(result["p95_ms"], result["p99_ms"])
+            if name != "search_tags":
+                self.assertGreater(result["queries"]["min"], 0)
+        # タグの入力補完は計測前に読み込んだ索引で検索する
+        self.assertEqual(scenarios["search_tags"]["queries"]["max"], 0)
@@ -1,6 +1,9 @@
 import datetime
+from io import StringIO
 
-from articleapp.models import Post, User
+from articleapp.models import Post, Tag, User
+from articleapp.utils.markup import get_renderer_signature
+from django.core.management import call_command
 from django.test import Client, TestCase
 from django.utils import timezone
 
@@ -51,3 +54,136 @@ class PostTests(TestCase):
         c = Client()
         response = c.get(url)
         self.assertEqual(response.status_code, 200)
+
+    def test_filter_tagsメソッド(self):
+        user = User.objects.create_user(username="testuser", password="testuser")
+        tags = Tag.objects.bulk_create([Tag(name=f"tag_{i}") for i in range(4)])
+        posts = [
+            Post.objects.create(
+                title=f"post_{i}",
+                user=user,
+                slug=f"post_{i}",
+                is_published=True,
+                date_publish=self.today_datetime.date() - datetime.timedelta(days=i),
+            )
+            for i in range(3)
+        ]
+        posts[0].tags.add(*tags)
+        posts[1].tags.add(tags[0], tags[1])
+        posts[2].tags.add(tags[0])
+
+        # タグの数に関わらず、タグの取得と投稿の取得の2クエリで完結する
+        with self.assertNumQueries(2):
+            self.assertListEqual(list(Post.objects.filter_tags(["tag_0"])), posts)
+        with self.assertNumQueries(2):
+            self.assertListEqual(
+                list(Post.objects.filter_tags(["tag_0", "tag_1"])), posts[0:2]
+            )
+        with self.assertNumQueries(2):
+            self.assertListEqual(
+                list(Post.objects.filter_tags([tag.name for tag in tags])), [posts[0]]
+            )
+
+        # 他の絞り込みと組み合わせられる
+        self.assertListEqual(
+            list(Post.objects.filter(slug="post_1").filter_tags(["tag_1"])),
+            [posts[1]],
+        )
+        # 存在しないタグのみの場合は空
+        self.assertListEqual(list(Post.objects.filter_tags(["tag_x"])), [])
+
+    def test_抜粋の作成(self):
+        user = User.objects.create_user(username="testuser", password="testuser")
+        post = Post.objects.create(
+            title="タイトル",
+            body="# 見出し\n\n**太字**と[リンク](https://example.com)A&B\n\n- 項目",
+            user=user,
+        )
+        # マークダウンの記法を取り除く
+        self.assertEqual(post.excerpt, "見出し 太字とリンクA&B 項目")
+
+        # 150文字を超える場合は切り詰める
+        post.body = "あ" * 200
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, "あ" * 149 + "…")
+
+        # update_fieldsに本文を指定した場合も抜粋を更新する
+        post.body = "更新後の本文"
+        post.save(update_fields=["body"])
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, "更新後の本文")
+
+    def test_一覧の取得で本文を読み込まない(self):
+        sql = str(Post.objects.for_listing().query)
+        self.assertNotIn('"articleapp_post"."body"', sql)
+        self.assertIn('"articleapp_post"."excerpt"', sql)
+
+    def test_抜粋の作成コマンド(self):
+        user = User.objects.create_user(username="testuser", password="testuser")
+        posts = Post.objects.bulk_create(
+            [
+                Post(title=f"post_{i}", body=f"*本文{i}*", user=user, slug=f"post_{i}")
+                for i in range(5)
+            ]
+        )
+        # bulk_createでは抜粋は作成されない
+        self.assertFalse(Post.objects.exclude(excerpt="").exists())
+
+        call_command("backfill_post_excerpts", batch_size=2, stdout=StringIO())
+        self.assertListEqual(
+            list(Post.objects.order_by("id").values_list("excerpt", flat=True)),
+            [f"本文{i}" for i in range(5)],
+        )
+        # updated_atは変更しない
+        self.assertListEqual(
+            list(Post.objects.order_by("id").values_list("updated_at", flat=True)),
+            [post.updated_at for post in posts],
+        )
+
+    def test_本文の描画(self):
+        user = User.objects.create_user(username="testuser", password="testuser")
+        post = Post.objects.create(
+            title="post", body="本文\n\n```\n<b>code</b>\n```", user=user
+        )
+        self.assertInHTML(
+            '<div class="codehilite"><pre><span></span><code>&lt;b&gt;code&lt;/b&gt;\n'
+            "</code></pre></div>",
+            post.body_html,
+        )
+        self.assertEqual(post.body_html_signature, get_renderer_signature())
+
+        # 本文を更新したらHTMLも更新する
+        post.body = "*更新*"
+        post.save(update_fields=["body"])
+        self.assertEqual(Post.objects.get(id=post.id).body_html, "<p><em>更新</em></p>")
+
+    def test_本文の描画コマンド(self):
+        user = User.objects.create_user(username="testuser", password="testuser")
+        posts = Post.objects.bulk_create(
+            [
+                Post(title=f"post_{i}", body=f"*本文{i}*", user=user, slug=f"post_{i}")
+                for i in range(5)
+            ]
+        )
+        # bulk_createでは本文は描画されない
+        self.assertFalse(Post.objects.exclude(body_html="").exists())
+
+        call_command("rerender_post_bodies", batch_size=2, stdout=StringIO())
+        self.assertListEqual(
+            list(Post.objects.order_by("id").values_list("body_html", flat=True)),
+            [f"<p><em>本文{i}</em></p>" for i in range(5)],
+        )
+        self.assertFalse(
+            Post.objects.exclude(body_html_signature=get_renderer_signature()).exists()
+        )
+        # updated_atは変更しない
+        self.assertListEqual(
+            list(Post.objects.order_by("id").values_list("updated_at", flat=True)),
+            [post.updated_at for post in posts],
+        )
+
+        # 描画済みの投稿は対象にしない
+        out = StringIO()
+        call_command("rerender_post_bodies", stdout=out)
+        self.assertEqual(out.getvalue(), "")
@@ -0,0 +1,130 @@
+from io import StringIO
+
+from articleapp.models import Post, Tag, User
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+
+class TagPublishedPostCountTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testuser")
+        self.tags = [Tag.objects.create(name=f"tag_{i}") for i in range(3)]
+
+    def create_post(self, slug, tags, published=True):
+        post = Post.objects.create(
+            title=slug, body="body", user=self.user, slug=slug, is_published=published
+        )
+        post.tags.add(*tags)
+        return post
+
+    def assertCounts(self, counts):
+        self.assertEqual(
+            [tag.published_post_count for tag in Tag.objects.order_by("id")], counts
+        )
+        # 中間テーブルから数え直した値と一致する
+        out = StringIO()
+        call_command("reconcile_tag_counts", dry_run=True, stdout=out)
+        self.assertIn("0個のタグ", out.getvalue())
+
+    def test_公開状態の変更(self):
+        post = self.create_post("post_0", self.tags[:2], published=False)
+        self.assertCounts([0, 0, 0])
+
+        post.publish()
+        self.assertCounts([1, 1, 0])
+        # 公開中のまま保存しても変わらない
+        post.title = "changed"
+        post.save()
+        self.assertCounts([1, 1, 0])
+
+        Post.objects.get(id=post.id).unpublish()
+        self.assertCounts([0, 0, 0])
+
+    def test_同じ投稿を別々に読み込んで公開状態を変更(self):
+        post = self.create_post("post_0", self.tags[:2], published=False)
+        # 両方とも非公開の時点で読み込んだ投稿
+        first = Post.objects.get(id=post.id)
+        second = Post.objects.get(id=post.id)
+
+        first.publish()
+        second.publish()
+        self.assertCounts([1, 1, 0])
+
+        first.unpublish()
+        second.unpublish()
+        self.assertCounts([0, 0, 0])
+
+    def test_公開中の投稿のタグの変更(self):
+        post = self.create_post("post_0", self.tags[:2])
+        self.create_post("post_1", self.tags[:1])
+        self.assertCounts([2, 1, 0])
+
+        post.tags.set([self.tags[1], self.tags[2]])
+        self.assertCounts([1, 1, 1])
+        # 紐づいていないタグを外しても変わらない
+        post.tags.remove(self.tags[0])
+        self.assertCounts([1, 1, 1])
+        post.tags.clear()
+        self.assertCounts([1, 0, 0])
+
+    def test_タグ側からの変更(self):
+        posts = [self.create_post(f"post_{i}", []) for i in range(2)]
+        draft = self.create_post("draft", [], published=False)
+
+        self.tags[0].post_set.add(*posts, draft)
+        self.assertCounts([2, 0, 0])
+        self.tags[0].post_set.remove(posts[0])
+        self.assertCounts([1, 0, 0])
+        self.tags[0].post_set.clear()
+        self.assertCounts([0, 0, 0])
+
+    def test_投稿の削除(self):
+        self.create_post("post_0", self.tags[:2])
+        self.create_post("draft", self.tags[:2], published=False)
+
+        Post.objects.all().delete()
+        self.assertCounts([0, 0, 0])
+
+    def test_投稿の作成と更新(self):
+        c = Client()
+        c.login(username="testuser", password="testuser")
+        post_data = {
+            "title": "title",
+            "slug": "post_0",
+            "tags_text": "tag_0 tag_1",
+            "body": "body",
+            "save_option": "save_and_publish",
+        }
+        c.post(reverse("post_create"), post_data)
+        self.assertCounts([1, 1, 0])
+
+        url = reverse("post_update", kwargs={"username": "testuser", "slug": "post_0"})
+        c.post(url, {**post_data, "tags_text": "tag_1 tag_2"})
+        self.assertCounts([0, 1, 1])
+
+        c.post(url, {**post_data, "save_option": "save_as_draft"})
+        self.assertCounts([0, 0, 0])
+
+    def test_ユーザーの退会(self):
+        other_user = User.objects.create_user(username="other", password="other")
+        self.create_post("post_0", self.tags[:2])
+        post = Post.objects.create(
+            title="other", user=other_user, slug="other", is_published=True
+        )
+        post.tags.add(self.tags[0])
+        self.assertCounts([2, 1, 0])
+
+        self.user.deactivate()
+        self.assertCounts([1, 0, 0])
+
+    def test_数え直し(self):
+        self.create_post("post_0", self.tags[:2])
+        # シグナルを経由しない変更
+        Post.objects.update(is_published=False)
+        Tag.objects.update(published_post_count=5)
+
+        out = StringIO()
+        call_command("reconcile_tag_counts", stdout=out)
+        self.assertIn("3個のタグ", out.getvalue())
+        self.assertCounts([0, 0, 0])
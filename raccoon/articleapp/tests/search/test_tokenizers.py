@@ -0,0 +1,28 @@
+from articleapp.search.tokenizers import NgramTokenizer
+from django.test import SimpleTestCase
+
+
+class NgramTokenizerTests(SimpleTestCase):
+    def test_bigram(self):
+        tokenizer = NgramTokenizer(n=2)
+        self.assertSetEqual(tokenizer.tokenize("東京都"), {"東京", "京都"})
+        # 空白をまたぐトークンは作らない
+        self.assertSetEqual(tokenizer.tokenize("東京 都庁"), {"東京", "都庁"})
+        # n文字未満の語は登録しない
+        self.assertSetEqual(tokenizer.tokenize("東 京"), set())
+
+    def test_trigram(self):
+        tokenizer = NgramTokenizer(n=3)
+        self.assertSetEqual(tokenizer.tokenize("東京都庁"), {"東京都", "京都庁"})
+
+    def test_正規化(self):
+        tokenizer = NgramTokenizer(n=2)
+        # 全角英数字・半角カナ・大文字はNFKC正規化と小文字化で統一される
+        self.assertSetEqual(tokenizer.tokenize("ＡＢc"), {"ab", "bc"})
+        self.assertSetEqual(tokenizer.tokenize("ｶﾀｶﾅ"), {"カタ", "タカ", "カナ"})
+
+    def test_検索キーワード(self):
+        tokenizer = NgramTokenizer(n=2)
+        self.assertSetEqual(tokenizer.tokenize_query("京都"), {"京都"})
+        # n文字未満のキーワードは索引を使えない
+        self.assertSetEqual(tokenizer.tokenize_query("京"), set())
@@ -0,0 +1,148 @@
+import hashlib
+import shutil
+import tempfile
+from pathlib import Path
+
+from articleapp import tests
+from articleapp.models import StoredFile, User
+from articleapp.storage import (
+    IMMUTABLE_CACHE_CONTROL,
+    content_addressed_storage,
+    is_content_addressed,
+)
+from articleapp.views import serve_media
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.test import RequestFactory, TestCase, override_settings
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.storage = content_addressed_storage
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_内容のハッシュ値で分割したディレクトリに保存(self):
+        content = b"content"
+        digest = hashlib.sha256(content).hexdigest()
+
+        name = self.storage.save("uploads/image.PNG", ContentFile(content))
+
+        self.assertEqual(name, f"uploads/{digest[:2]}/{digest[2:4]}/{digest}.png")
+        self.assertTrue(is_content_addressed(name))
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).ref_count, 1)
+
+    def test_同じ内容のファイルは1つだけ保存して参照数を数える(self):
+        names = [
+            self.storage.save(f"uploads/image_{i}.png", ContentFile(b"content"))
+            for i in range(3)
+        ]
+        other = self.storage.save("uploads/other.png", ContentFile(b"other"))
+
+        self.assertEqual(len(set(names)), 1)
+        self.assertNotEqual(names[0], other)
+        self.assertEqual(StoredFile.objects.get(name=names[0]).ref_count, 3)
+
+        # 参照が残っている間はファイルを削除しない
+        for _ in range(2):
+            self.storage.delete(names[0])
+            self.assertTrue(self.storage.exists(names[0]))
+        self.assertEqual(StoredFile.objects.get(name=names[0]).ref_count, 1)
+
+        self.storage.delete(names[0])
+        self.assertFalse(self.storage.exists(names[0]))
+        self.assertFalse(StoredFile.objects.filter(name=names[0]).exists())
+        self.assertTrue(self.storage.exists(other))
+
+    def test_参照する行の保存と同じトランザクションで参照数を数える(self):
+        user = User.objects.create_user(username="testuser", password="testuser")
+        User.objects.create_user(username="other", password="other")
+        sample_files = Path(tests.__path__[0]) / "sample_files"
+        with (sample_files / "profile_image.png").open(mode="rb") as f:
+            # 行の保存に失敗した場合は参照数の加算も取り消す
+            user.username = "other"
+            user.profile_image = File(f, name="image.png")
+            with self.assertRaises(IntegrityError):
+                with transaction.atomic():
+                    user.save()
+            self.assertFalse(StoredFile.objects.exists())
+
+            f.seek(0)
+            user.username = "testuser"
+            user.profile_image = File(f, name="image.png")
+            user.save()
+        self.assertEqual(
+            StoredFile.objects.get(name=user.profile_image.name).ref_count, 1
+        )
+
+    def test_参照数の無い保存中のファイルは削除しない(self):
+        name = self.storage.save("uploads/image.png", ContentFile(b"content"))
+        # 同時に保存中で、参照数の行がまだ見えない状態
+        StoredFile.objects.filter(name=name).delete()
+
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_削除したファイルは同じ内容の保存で書き込み直す(self):
+        name = self.storage.save("uploads/image.png", ContentFile(b"content"))
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+
+        self.assertEqual(
+            self.storage.save("uploads/image.png", ContentFile(b"content")), name
+        )
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).ref_count, 1)
+
+    def test_参照数の無いファイルも削除できる(self):
+        Path(self.media_root, "uploads").mkdir()
+        Path(self.media_root, "uploads", "legacy.png").write_bytes(b"legacy")
+
+        self.storage.delete("uploads/legacy.png")
+
+        self.assertFalse(self.storage.exists("uploads/legacy.png"))
+
+    def test_プロフィール画像の変更で以前の画像の参照を解放(self):
+        users = [
+            User.objects.create_user(username=f"testuser_{i}", password="testuser")
+            for i in range(2)
+        ]
+        sample_files = Path(tests.__path__[0]) / "sample_files"
+        with (sample_files / "profile_image.png").open(mode="rb") as f:
+            for user in users:
+                user.profile_image.save(f"{user.username}.png", File(f))
+        name = users[0].profile_image.name
+        self.assertEqual(users[1].profile_image.name, name)
+        self.assertEqual(StoredFile.objects.get(name=name).ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with (sample_files / "profile_image_new.png").open(mode="rb") as f:
+                users[0].profile_image.save("new.png", File(f))
+        self.assertEqual(StoredFile.objects.get(name=name).ref_count, 1)
+        self.assertTrue(self.storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            users[1].deactivate()
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertFalse(self.storage.exists(name))
+
+    def test_保存したファイルは期限なくキャッシュさせる(self):
+        name = self.storage.save("uploads/image.png", ContentFile(b"content"))
+        Path(self.media_root, "uploads").mkdir(exist_ok=True)
+        Path(self.media_root, "uploads", "legacy.png").write_bytes(b"legacy")
+        request = RequestFactory().get("/")
+
+        response = serve_media(request, name, document_root=self.media_root)
+        self.assertEqual(response["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+
+        response = serve_media(
+            request, "uploads/legacy.png", document_root=self.media_root
+        )
+        self.assertNotIn("Cache-Control", response)
@@ -0,0 +1,109 @@
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from articleapp import tests
+from articleapp.models import Task, User
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+
+class ProfileThumbnailsTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.user = User.objects.create_user(username="testuser", password="testuser")
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def set_profile_image(self, filename):
+        path = Path(tests.__path__[0]) / "sample_files" / filename
+        with path.open(mode="rb") as f:
+            self.user.profile_image.save(f"testuser_{filename}", File(f))
+
+    def run_worker(self):
+        call_command("runworker", burst=True, stdout=StringIO())
+        self.user.refresh_from_db()
+
+    def test_画像の変更でサムネイルを作成(self):
+        self.set_profile_image("profile_image.png")
+        # リクエストの外（ワーカー）で作成する
+        self.assertEqual(
+            Task.objects.filter(name="create_profile_thumbnails").count(), 1
+        )
+        self.assertEqual(self.user.profile_thumbnails, {})
+
+        self.run_worker()
+        thumbnails = self.user.profile_thumbnails
+        self.assertEqual(thumbnails["source"], self.user.profile_image.name)
+        self.assertEqual(set(thumbnails["variants"]), {"40", "80", "160"})
+        for size, variant in thumbnails["variants"].items():
+            # 透過の無い画像はWebPとJPEG
+            self.assertEqual(set(variant), {"webp", "jpeg"})
+            for image_format, name in variant.items():
+                with default_storage.open(name) as f, Image.open(f) as image:
+                    self.assertEqual(image.size, (int(size), int(size)))
+                    self.assertEqual(image.format, image_format.upper())
+
+        # 画像を変更したら以前のサムネイルは削除する
+        self.set_profile_image("profile_image_new.png")
+        self.run_worker()
+        self.assertNotEqual(self.user.profile_thumbnails, thumbnails)
+        for variant in thumbnails["variants"].values():
+            for name in variant.values():
+                self.assertFalse(default_storage.exists(name))
+
+        # 画像を削除したらサムネイルも削除する
+        thumbnails = self.user.profile_thumbnails
+        self.user.profile_image.delete()
+        self.run_worker()
+        self.assertEqual(self.user.profile_thumbnails, {})
+        self.assertFalse(default_storage.exists(thumbnails["variants"]["40"]["webp"]))
+
+    def test_サムネイルをsrcsetで表示(self):
+        self.set_profile_image("profile_image.png")
+        url = reverse("user_home", kwargs={"username": "testuser"})
+        # 作成前は元の画像を表示する
+        response = Client().get(url)
+        self.assertContains(response, self.user.profile_image.url)
+        self.assertNotContains(response, "<picture>")
+
+        self.run_worker()
+        variants = self.user.profile_thumbnails["variants"]
+        response = Client().get(url)
+        # ユーザーホームの画像は80px
+        webp_1x = default_storage.url(variants["80"]["webp"])
+        webp_2x = default_storage.url(variants["160"]["webp"])
+        self.assertContains(
+            response,
+            f'<source type="image/webp" srcset="{webp_1x} 1x, {webp_2x} 2x">',
+            html=True,
+        )
+        self.assertContains(
+            response, f'src="{default_storage.url(variants["80"]["jpeg"])}"'
+        )
+        self.assertNotContains(response, f'src="{self.user.profile_image.url}"')
+
+    def test_サムネイルの作成コマンド(self):
+        self.set_profile_image("profile_image.png")
+        Task.objects.all().delete()
+
+        call_command("create_profile_thumbnails", sync=True, stdout=StringIO())
+        self.user.refresh_from_db()
+        self.assertEqual(
+            self.user.profile_thumbnails["source"], self.user.profile_image.name
+        )
+
+        # 作成済みのユーザーは対象にしない
+        out = StringIO()
+        call_command("create_profile_thumbnails", stdout=out)
+        self.assertIn("0人", out.getvalue())
+        self.assertFalse(Task.objects.exists())
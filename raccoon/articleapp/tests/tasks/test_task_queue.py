@@ -0,0 +1,205 @@
+import datetime
+import threading
+from io import StringIO
+from unittest import mock
+
+from articleapp import task_queue
+from articleapp.models import Post, Tag, Task, User
+from articleapp.tasks import delete_user_posts
+from django.core.management import call_command
+from django.conf import settings
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+
+@task_queue.task
+def failing_task(task, message):
+    raise RuntimeError(message)
+
+
+# WorkerPoolTestsで使う（全てのスレッドがタスクを1つずつ取り出すまで待つ）
+worker_barrier = threading.Barrier(3, timeout=10)
+worker_threads = []
+
+
+@task_queue.task
+def barrier_task(task):
+    worker_threads.append(threading.get_ident())
+    worker_barrier.wait()
+
+
+class TaskQueueTests(TestCase):
+    def test_タスクの追加と取り出し(self):
+        tasks = [delete_user_posts.enqueue(user_id=i) for i in range(2)]
+        self.assertEqual(tasks[0].status, Task.Status.QUEUED)
+
+        # 追加した順に取り出す
+        self.assertEqual(task_queue.claim_next_task(), tasks[0])
+        self.assertEqual(task_queue.claim_next_task(), tasks[1])
+        self.assertIsNone(task_queue.claim_next_task())
+        self.assertEqual(Task.objects.get(id=tasks[0].id).status, Task.Status.RUNNING)
+
+    def test_未登録のタスク(self):
+        with self.assertRaises(ValueError):
+            task_queue.enqueue("unknown_task")
+
+    def test_失敗したタスクを再実行(self):
+        task = task_queue.enqueue(
+            "failing_task", max_attempts=2, message="error_message"
+        )
+
+        call_command("runworker", burst=True, stdout=StringIO())
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.QUEUED)
+        self.assertEqual(task.attempts, 1)
+        self.assertIn("error_message", task.error)
+        self.assertGreater(task.run_at, timezone.now())
+
+        # 再実行の日時までは実行しない
+        self.assertIsNone(task_queue.claim_next_task())
+
+        Task.objects.filter(id=task.id).update(run_at=timezone.now())
+        call_command("runworker", burst=True, stdout=StringIO())
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.FAILED)
+        self.assertEqual(task.attempts, 2)
+
+    @override_settings(TASK_RETRY_BASE_DELAY=10, TASK_RETRY_MAX_DELAY=60)
+    def test_再実行までの秒数(self):
+        for attempts, delay in [(1, 10), (2, 20), (3, 40), (4, 60), (10, 60)]:
+            self.assertGreaterEqual(task_queue.get_retry_delay(attempts), delay)
+            self.assertLessEqual(task_queue.get_retry_delay(attempts), delay * 1.1)
+
+    def test_応答が途絶えたタスクを再実行(self):
+        task = delete_user_posts.enqueue(user_id=0)
+        self.assertEqual(task_queue.claim_next_task("worker_1"), task)
+        self.assertIsNone(task_queue.claim_next_task("worker_2"))
+
+        # ワーカーの応答がTASK_LOCK_TIMEOUT秒以上無い
+        Task.objects.filter(id=task.id).update(
+            locked_at=timezone.now()
+            - datetime.timedelta(seconds=settings.TASK_LOCK_TIMEOUT + 1)
+        )
+        claimed = task_queue.claim_next_task("worker_2")
+        self.assertEqual(claimed, task)
+        self.assertEqual(claimed.attempts, 2)
+        self.assertEqual(claimed.locked_by, "worker_2")
+
+    def test_応答が途絶えたまま最大の回数に達したタスクは失敗にする(self):
+        task = task_queue.enqueue("failing_task", max_attempts=1, message="")
+        self.assertEqual(task_queue.claim_next_task("worker_1"), task)
+        Task.objects.filter(id=task.id).update(
+            locked_at=timezone.now()
+            - datetime.timedelta(seconds=settings.TASK_LOCK_TIMEOUT + 1)
+        )
+
+        self.assertIsNone(task_queue.claim_next_task("worker_2"))
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.FAILED)
+        self.assertEqual(task.attempts, 1)
+        self.assertEqual(task.locked_by, "")
+
+    @mock.patch("articleapp.task_queue.time.sleep")
+    def test_DBのエラーで取り出しに失敗したら再試行(self, sleep):
+        task = delete_user_posts.enqueue(user_id=0)
+        claim_next_task = task_queue.claim_next_task
+        errors = [OperationalError("database table is locked")] * 2
+        with mock.patch(
+            "articleapp.task_queue.claim_next_task",
+            side_effect=lambda *args: (
+                _raise(errors.pop()) if errors else claim_next_task(*args)
+            ),
+        ):
+            self.assertEqual(task_queue.work(burst=True), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.DONE)
+        self.assertEqual(sleep.call_count, 2)
+
+    @mock.patch("articleapp.task_queue.time.sleep")
+    def test_DBのエラーで再試行しても取り出せなければ待ってから確認(self, sleep):
+        task = delete_user_posts.enqueue(user_id=0)
+        claim_next_task = task_queue.claim_next_task
+        errors = [OperationalError("database table is locked")] * (
+            task_queue.DB_RETRY_ATTEMPTS + 1
+        )
+        with mock.patch(
+            "articleapp.task_queue.claim_next_task",
+            side_effect=lambda *args: (
+                _raise(errors.pop()) if errors else claim_next_task(*args)
+            ),
+        ), self.assertLogs("articleapp.task_queue", "ERROR"):
+            # ワーカーは終了せずに次の取り出しで実行する
+            self.assertEqual(task_queue.work(burst=True, sleep=5), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.DONE)
+        self.assertIn(mock.call(5), sleep.call_args_list)
+
+    @mock.patch("articleapp.task_queue.time.sleep")
+    def test_DBのエラーで結果の保存に失敗したら再試行(self, sleep):
+        task = delete_user_posts.enqueue(user_id=0)
+        save = Task.save
+        errors = [OperationalError("database table is locked")]
+
+        def save_or_raise(self, *args, **kwargs):
+            if errors and kwargs.get("update_fields", [None])[0] == "status":
+                raise errors.pop()
+            return save(self, *args, **kwargs)
+
+        with mock.patch.object(Task, "save", save_or_raise):
+            self.assertEqual(task_queue.work(burst=True), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.DONE)
+        self.assertEqual(task.attempts, 1)
+        self.assertEqual(sleep.call_count, 1)
+
+
+def _raise(error):
+    raise error
+
+
+class WorkerPoolTests(TransactionTestCase):
+    def test_複数のスレッドで実行(self):
+        worker_barrier.reset()
+        worker_threads.clear()
+        tasks = [task_queue.enqueue("barrier_task") for _ in range(6)]
+        out = StringIO()
+        call_command("runworker", burst=True, threads=3, stdout=out)
+        self.assertFalse(Task.objects.exclude(status=Task.Status.DONE).exists())
+        # 各タスクは1回ずつ実行する
+        self.assertEqual(
+            list(Task.objects.order_by("id").values_list("attempts", flat=True)),
+            [1] * len(tasks),
+        )
+        # 各スレッドは他のスレッドがタスクを取り出すまで待つため、2つずつ実行する
+        self.assertEqual(
+            sorted(worker_threads.count(ident) for ident in set(worker_threads)),
+            [2, 2, 2],
+        )
+
+
+class DeleteUserPostsTests(TestCase):
+    def test_投稿を分けて削除(self):
+        users = [
+            User.objects.create_user(username=f"testuser_{i}", password="testuser")
+            for i in range(2)
+        ]
+        tag = Tag.objects.create(name="tag")
+        for user in users:
+            for i in range(5):
+                post = Post.objects.create(
+                    title=f"post_{i}", body="body", user=user, slug=f"post_{i}"
+                )
+                post.tags.add(tag)
+
+        task = delete_user_posts.enqueue(user_id=users[0].id, batch_size=2)
+        call_command("runworker", burst=True, stdout=StringIO())
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.DONE)
+        self.assertEqual(task.progress, {"total": 5, "deleted": 5})
+        self.assertFalse(Post.objects.filter(user=users[0]).exists())
+        self.assertFalse(Post.tags.through.objects.filter(post__user=users[0]).exists())
+        # 他のユーザーの投稿とタグは削除しない
+        self.assertEqual(Post.objects.filter(user=users[1]).count(), 5)
+        self.assertTrue(Tag.objects.filter(id=tag.id).exists())
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from articleapp.models import Post, Tag, User
+from django.conf import settings
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+
+@override_settings(
+    CACHES={
+        **settings.CACHES,
+        "fragments": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test_post_cards",
+        },
+    }
+)
+class PostCardsTests(TestCase):
+    def setUp(self):
+        caches["fragments"].clear()
+        self.user = User.objects.create_user(username="testuser", password="testuser")
+        self.posts = []
+        for i in range(3):
+            post = Post.objects.create(
+                title=f"post_{i}",
+                body=f"post_{i}_body",
+                user=self.user,
+                slug=f"post_{i}",
+            )
+            post.publish()
+            self.posts.append(post)
+
+    def get_index(self):
+        response = Client().get(reverse("index"))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_カードの描画結果をまとめて取得(self):
+        self.get_index()
+        cache = caches["fragments"]
+        with mock.patch.object(
+            cache, "get_many", wraps=cache.get_many
+        ) as get_many, mock.patch.object(
+            cache, "set_many", wraps=cache.set_many
+        ) as set_many:
+            response = self.get_index()
+        # ページ内のカードは1回で取得し、描画し直さない
+        get_many.assert_called_once()
+        set_many.assert_not_called()
+        for post in self.posts:
+            self.assertContains(response, post.title)
+
+    def test_投稿の更新で描画し直す(self):
+        self.get_index()
+        self.posts[0].title = "updated_title"
+        self.posts[0].save()
+        self.assertContains(self.get_index(), "updated_title")
+
+    def test_タグの変更で描画し直す(self):
+        self.get_index()
+        tag = Tag.objects.create(name="tag_0")
+        self.posts[0].tags.add(tag)
+        self.assertContains(self.get_index(), "# tag_0")
+
+        tag.name = "renamed_tag"
+        tag.save()
+        response = self.get_index()
+        self.assertContains(response, "# renamed_tag")
+        self.assertNotContains(response, "# tag_0")
+
+        tag.delete()
+        self.assertNotContains(self.get_index(), "# renamed_tag")
+
+    def test_プロフィールの変更で描画し直す(self):
+        self.get_index()
+        self.user.display_name = "new_display_name"
+        self.user.save()
+        self.assertContains(self.get_index(), "(new_display_name)")
+
+    def test_自分のユーザーホームでは編集のリンクを表示する(self):
+        url = reverse("user_home", kwargs={"username": self.user.username})
+        edit_url = reverse(
+            "post_update", kwargs={"username": self.user.username, "slug": "post_0"}
+        )
+        self.assertNotContains(Client().get(url), edit_url)
+
+        c = Client()
+        c.login(username="testuser", password="testuser")
+        self.assertContains(c.get(url), edit_url)
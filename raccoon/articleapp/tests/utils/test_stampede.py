@@ -0,0 +1,107 @@
+import threading
+import time
+from unittest import mock
+
+from articleapp.utils import stampede
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+
+class GetOrSetTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LocMemCache("test_stampede", {})
+        self.cache.clear()
+        self.compute = mock.Mock(side_effect=lambda: self.compute.call_count)
+
+    def get_or_set(self, **kwargs):
+        options = {"timeout": 60, "stale_timeout": 60, "beta": 0}
+        options.update(kwargs)
+        return stampede.get_or_set(self.cache, "key", self.compute, **options)
+
+    def expire(self):
+        entry = self.cache.get("key")
+        entry["expires_at"] = time.time() - 1
+        self.cache.set("key", entry)
+
+    def test_期限内は計算し直さない(self):
+        self.assertEqual(self.get_or_set(), 1)
+        self.assertEqual(self.get_or_set(), 1)
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_期限切れで計算し直す(self):
+        self.get_or_set()
+        self.expire()
+        self.assertEqual(self.get_or_set(), 2)
+        self.assertFalse(self.cache.has_key("key:lock"))
+
+    def test_版が異なる場合は計算し直す(self):
+        self.assertEqual(self.get_or_set(version="1"), 1)
+        self.assertEqual(self.get_or_set(version="1"), 1)
+        self.assertEqual(self.get_or_set(version="2"), 2)
+
+    def test_計算中は期限切れの値を返す(self):
+        self.get_or_set()
+        self.expire()
+        # 他のプロセスがロックを取得している
+        self.cache.add("key:lock", True)
+        self.assertEqual(self.get_or_set(version=None), 1)
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_計算中でも版が異なる値は返さない(self):
+        self.get_or_set(version="1")
+        # 他のプロセスがロックを取得している
+        self.cache.add("key:lock", True)
+        self.assertEqual(self.get_or_set(version="2", wait_timeout=0.1), 2)
+
+    def test_版が異なる場合は計算が終わるまで待つ(self):
+        self.get_or_set(version="1")
+        self.cache.add("key:lock", True)
+
+        def finish_computing():
+            # 他のプロセスの計算が終わる
+            time.sleep(0.1)
+            stampede._compute_and_set(
+                self.cache, "key", lambda: "computed", 60, 60, "2"
+            )
+
+        thread = threading.Thread(target=finish_computing)
+        thread.start()
+        self.assertEqual(self.get_or_set(version="2", wait_timeout=5), "computed")
+        thread.join()
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_値が無く計算中の場合は待ってから自分で計算する(self):
+        self.cache.add("key:lock", True)
+        self.assertEqual(self.get_or_set(wait_timeout=0.1), 1)
+
+    def test_期限前に計算し直す確率(self):
+        self.get_or_set()
+        entry = self.cache.get("key")
+        entry["delta"] = 1000
+        self.cache.set("key", entry)
+        # 計算に時間がかかる値は期限前でも計算し直す
+        with mock.patch("random.random", return_value=0.5):
+            self.assertEqual(self.get_or_set(beta=1.0), 2)
+
+    def test_同時に呼び出しても計算は1回(self):
+        def compute():
+            time.sleep(0.2)
+            return "value"
+
+        compute = mock.Mock(side_effect=compute)
+        results = []
+
+        def worker():
+            results.append(
+                stampede.get_or_set(
+                    self.cache, "key", compute, timeout=60, stale_timeout=60
+                )
+            )
+
+        threads = [threading.Thread(target=worker) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["value"] * 10)
+        self.assertEqual(compute.call_count, 1)
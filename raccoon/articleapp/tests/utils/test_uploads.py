@@ -0,0 +1,116 @@
+import shutil
+import struct
+import tempfile
+import zlib
+from io import BytesIO
+
+from articleapp.models import User
+from articleapp.utils.uploads import check_image_header
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse_lazy
+from PIL import Image
+
+
+def create_png(width, height):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (255, 0, 0)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def create_png_header(width, height):
+    """IHDRだけが正しい（画像データを持たない）PNGのバイト列を作成する"""
+
+    def chunk(chunk_type, data):
+        crc = zlib.crc32(chunk_type + data)
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", b"")
+
+
+class CheckImageHeaderTests(TestCase):
+    def test_問題の無い画像(self):
+        self.assertIsNone(check_image_header(create_png(10, 10)))
+
+    def test_ピクセル数が大きすぎる画像(self):
+        error = check_image_header(create_png_header(20000, 20000))
+        self.assertIn("大きすぎます", error)
+
+    def test_許可されていない形式の画像(self):
+        buffer = BytesIO()
+        Image.new("RGB", (10, 10)).save(buffer, format="BMP")
+        self.assertIn("BMP", check_image_header(buffer.getvalue()))
+
+    def test_判別できないバイト列(self):
+        with self.assertRaises(ValueError):
+            check_image_header(b"not an image")
+
+
+class ProfileImageUploadTests(TestCase):
+    url = reverse_lazy("user_settings_profile")
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+        self.user = User.objects.create_user(username="testuser", password="testuser")
+        self.client = Client()
+        self.client.login(username="testuser", password="testuser")
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
+    def post_profile_image(self, content, name="image.png", content_type="image/png"):
+        return self.client.post(
+            self.url,
+            {
+                "display_name": "ニックネーム",
+                "profile_image": SimpleUploadedFile(name, content, content_type),
+            },
+        )
+
+    def assertRejected(self, response, message):
+        self.assertEqual(response.status_code, 400)
+        errors = response.context["form"].errors
+        self.assertIn("profile_image", errors)
+        self.assertIn(message, " ".join(errors["profile_image"]))
+        user = User.objects.get(pk=self.user.pk)
+        self.assertIsNone(user.profile_image or None)
+        self.assertIsNone(user.display_name)
+
+    def test_問題の無い画像はアップロードできる(self):
+        response = self.post_profile_image(create_png(100, 100))
+
+        self.assertEqual(response.status_code, 302)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertIsNotNone(user.profile_image or None)
+        self.assertEqual(user.display_name, "ニックネーム")
+        user.profile_image.delete(save=False)
+
+    @override_settings(PROFILE_IMAGE_MAX_SIZE=1024)
+    def test_最大サイズを越えるファイルは受信中に拒否する(self):
+        response = self.post_profile_image(create_png(200, 200) + b"\0" * 2048)
+        self.assertRejected(response, "MB以下の画像")
+
+    def test_ピクセル数が大きすぎる画像は展開せずに拒否する(self):
+        response = self.post_profile_image(create_png_header(20000, 20000))
+        self.assertRejected(response, "大きすぎます")
+
+    def test_画像ではないファイルは拒否する(self):
+        response = self.post_profile_image(
+            b"not an image", name="image.txt", content_type="text/plain"
+        )
+        self.assertRejected(response, "画像ファイル")
+
+    def test_Content_Typeを偽装したファイルは拒否する(self):
+        response = self.post_profile_image(b"not an image")
+        self.assertRejected(response, "判別できません")
+
+    def test_CSRFの検証は行われる(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username="testuser", password="testuser")
+        response = client.post(self.url, {"display_name": "ニックネーム"})
+
+        self.assertEqual(response.status_code, 403)
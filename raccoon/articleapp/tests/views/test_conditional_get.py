@@ -0,0 +1,147 @@
+import time
+
+from articleapp.models import Post, Tag, User
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testuser")
+        self.posts = []
+        for i in range(2):
+            post = Post.objects.create(
+                title=f"post_{i}",
+                body=f"post_{i}_body",
+                user=self.user,
+                slug=f"post_{i}",
+            )
+            post.publish()
+            self.posts.append(post)
+        self.detail_url = self.posts[0].get_absolute_url()
+        self.home_url = reverse("user_home", kwargs={"username": "testuser"})
+
+    def get_etag(self, client, url):
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def assertNotModified(self, client, url, etag):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def assertModified(self, client, url, etag):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_変更が無ければ304を返す(self):
+        c = Client()
+        for url in [self.detail_url, self.home_url]:
+            response = c.get(url)
+            # 投稿の非公開・削除を表せないため、Last-Modifiedは返さない
+            self.assertFalse(response.has_header("Last-Modified"))
+            # ETagの元になる値の集計のみでテンプレートは描画しない
+            with self.assertNumQueries(2):
+                self.assertNotModified(c, url, response["ETag"])
+
+    def test_投稿の公開で変わる(self):
+        c = Client()
+        detail_etag = self.get_etag(c, self.detail_url)
+        home_etag = self.get_etag(c, self.home_url)
+
+        post = Post.objects.create(
+            title="post_2", body="post_2_body", user=self.user, slug="post_2"
+        )
+        # 下書きは表示されないため変わらない
+        self.assertNotModified(c, self.detail_url, detail_etag)
+        self.assertNotModified(c, self.home_url, home_etag)
+
+        post.publish()
+        self.assertModified(c, self.detail_url, detail_etag)
+        self.assertModified(c, self.home_url, home_etag)
+
+    def test_投稿の非公開で変わる(self):
+        c = Client()
+        detail_etag = self.get_etag(c, self.detail_url)
+        home_etag = self.get_etag(c, self.home_url)
+
+        # 他の記事の非公開
+        self.posts[1].unpublish()
+        self.assertModified(c, self.detail_url, detail_etag)
+        self.assertModified(c, self.home_url, home_etag)
+
+        # 表示中の投稿の非公開
+        self.posts[0].unpublish()
+        response = c.get(self.detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 404)
+
+    def test_非公開と削除はIf_Modified_Sinceでも検出する(self):
+        c = Client()
+        if_modified_since = http_date(time.time() + 60)
+        self.posts[1].unpublish()
+        for url in [self.detail_url, self.home_url]:
+            response = c.get(url, HTTP_IF_MODIFIED_SINCE=if_modified_since)
+            self.assertEqual(response.status_code, 200)
+
+        self.posts[0].delete()
+        response = c.get(self.home_url, HTTP_IF_MODIFIED_SINCE=if_modified_since)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "post_0")
+
+    def test_タグの変更で変わる(self):
+        c = Client()
+        detail_etag = self.get_etag(c, self.detail_url)
+        home_etag = self.get_etag(c, self.home_url)
+
+        tag = Tag.objects.create(name="tag")
+        self.posts[0].tags.add(tag)
+        self.assertModified(c, self.detail_url, detail_etag)
+        self.assertModified(c, self.home_url, home_etag)
+
+        detail_etag = self.get_etag(c, self.detail_url)
+        home_etag = self.get_etag(c, self.home_url)
+        tag.name = "renamed_tag"
+        tag.save()
+        self.assertModified(c, self.detail_url, detail_etag)
+        self.assertModified(c, self.home_url, home_etag)
+
+    def test_プロフィールの変更で変わる(self):
+        c = Client()
+        detail_etag = self.get_etag(c, self.detail_url)
+        self.user.display_name = "new_display_name"
+        self.user.save()
+        self.assertModified(c, self.detail_url, detail_etag)
+
+    def test_閲覧者によって変わる(self):
+        c = Client()
+        anonymous_etag = self.get_etag(c, self.home_url)
+        c.login(username="testuser", password="testuser")
+        response = c.get(self.home_url, HTTP_IF_NONE_MATCH=anonymous_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotModified(c, self.home_url, response["ETag"])
+
+    def test_閲覧者のプロフィールの変更で変わる(self):
+        viewer = User.objects.create_user(username="viewer", password="viewer")
+        c = Client()
+        c.login(username="viewer", password="viewer")
+        detail_etag = self.get_etag(c, self.detail_url)
+        home_etag = self.get_etag(c, self.home_url)
+
+        # ヘッダーに表示する閲覧者のプロフィール画像が変わる
+        viewer.profile_thumbnails = {"source": "uploads/viewer.png", "variants": {}}
+        viewer.save()
+        self.assertModified(c, self.detail_url, detail_etag)
+        self.assertModified(c, self.home_url, home_etag)
+
+    def test_表示できないページにはETagを返さない(self):
+        self.posts[0].unpublish()
+        response = Client().get(self.detail_url)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header("ETag"))
+
+        response = Client().get(
+            reverse("user_home_drafts", kwargs={"username": "testuser"})
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.has_header("ETag"))
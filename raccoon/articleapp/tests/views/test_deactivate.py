@@ -1,6 +1,8 @@
+from io import StringIO
 from urllib.parse import urlparse
 
-from articleapp.models import Post, User
+from articleapp.models import Post, Task, User
+from django.core.management import call_command
 from django.test import Client, TestCase
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
@@ -37,6 +39,7 @@ class DeactivateViewTests(TestCase):
             )
             for i in range(5, 10)
         ]
+        Post.objects.bulk_create(posts)
 
     def test_ページアクセス(self):
         c = Client()
@@ -74,7 +77,16 @@ class DeactivateViewTests(TestCase):
         c.login(username="testuser_0", password="testuser_0")
         self.assertFalse("_auth_user_id" in c.session)
 
-        # ユーザーの投稿が全て削除されていることの確認
+        # ユーザーの投稿が全て非公開になっていることの確認
+        self.assertFalse(self.users[0].post_set.filter(is_published=True).exists())
+
+        # ユーザーの投稿の削除がキューに追加されていることの確認
+        task = Task.objects.get()
+        self.assertEqual(task.name, "delete_user_posts")
+        self.assertEqual(task.payload, {"user_id": self.users[0].id})
+
+        # ワーカーの実行後にユーザーの投稿が全て削除されていることの確認
+        call_command("runworker", burst=True, stdout=StringIO())
         self.assertFalse(self.users[0].post_set.exists())
 
         # ユーザー関連ページにアクセスできないことの確認
@@ -2,6 +2,7 @@ import datetime
 import random
 
 from articleapp.models import Post, Tag, User
+from articleapp.utils.tag_pool import published_tag_pool
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.utils import timezone
@@ -12,6 +13,8 @@ class IndexViewTests(TestCase):
         self.today_datetime = timezone.now()
         self.number_of_posts = 5
         self.number_of_tags = 10
+        # タグの候補はプロセス内に保持されるためテストごとに破棄する
+        published_tag_pool.invalidate()
 
     def test_トップページにアクセス_新着記事とタグを最大件数表示(self):
         user = User.objects.create_user(username="testuser", password="testuser")
@@ -177,3 +180,62 @@ class IndexViewTests(TestCase):
         c = Client()
         response = c.get(reverse("index"))
         self.assertEqual(list(response.context["tags"]), [tags[0]])
+
+    def test_クエリ数が投稿数とタグ数に依存しない(self):
+        user = User.objects.create_user(username="testuser", password="testuser")
+        tags = Tag.objects.bulk_create([Tag(name=f"tag_{i}") for i in range(10)])
+        c = Client()
+        for number_of_posts in [1, 5]:
+            posts = Post.objects.bulk_create(
+                [
+                    Post(
+                        title=f"post_{number_of_posts}_{i}",
+                        body=f"post_{i}_body",
+                        slug=f"post_{number_of_posts}_{i}",
+                        user=user,
+                        is_published=True,
+                        date_publish=self.today_datetime.date(),
+                    )
+                    for i in range(number_of_posts)
+                ]
+            )
+            for post in posts:
+                post.tags.add(*tags)
+            # タグの紐づけが変わったのでタグの候補（idの一覧）を読み込み直す
+            with self.assertNumQueries(4):
+                response = c.get(reverse("index"))
+            self.assertEqual(response.status_code, 200)
+            # タグの取得、投稿の取得、投稿のタグの取得
+            with self.assertNumQueries(3):
+                response = c.get(reverse("index"))
+            self.assertEqual(response.status_code, 200)
+
+    def test_タグの候補の読み込み後に非公開になったタグは表示されない(self):
+        user = User.objects.create_user(username="testuser", password="testuser")
+        tags = Tag.objects.bulk_create([Tag(name=f"tag_{i}") for i in range(2)])
+        posts = Post.objects.bulk_create(
+            [
+                Post(
+                    title=f"post_{i}",
+                    body=f"post_{i}_body",
+                    slug=f"post_{i}",
+                    user=user,
+                    is_published=True,
+                    date_publish=self.today_datetime.date(),
+                )
+                for i in range(2)
+            ]
+        )
+        posts[0].tags.add(tags[0])
+        posts[1].tags.add(tags[1])
+
+        c = Client()
+        response = c.get(reverse("index"))
+        self.assertCountEqual(response.context["tags"], tags)
+
+        # 他のプロセスでの更新（このプロセスのタグの候補は無効化されない）と同じく
+        # シグナルを経由せずにDBの投稿とタグの公開中の投稿数を更新する
+        Post.objects.filter(id=posts[1].id).update(is_published=False)
+        Tag.objects.filter(id=tags[1].id).change_published_post_count(-1)
+        response = c.get(reverse("index"))
+        self.assertEqual(list(response.context["tags"]), [tags[0]])
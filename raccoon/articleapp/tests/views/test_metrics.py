@@ -0,0 +1,144 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from articleapp.metrics import METRICS_FILE_SUFFIX, MetricsCollector, collector
+from articleapp.models import Post, User
+from articleapp.tasks import delete_user_posts
+from articleapp.utils.instrumentation import RequestStats
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+
+def get_sample(text, name, **labels):
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = rf"^{re.escape(name)}\{{{re.escape(label_text)}\}} (\S+)$"
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+@override_settings(METRICS_DIRECTORY=None, METRICS_TOKEN="secret")
+class MetricsTests(TestCase):
+    def setUp(self):
+        collector.reset()
+        user = User.objects.create_user(username="testuser", password="testuser")
+        post = Post.objects.create(
+            title="post_0", body="post_0_body", user=user, slug="post_0"
+        )
+        post.publish()
+
+    def get_metrics(self):
+        response = Client().get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        return response.content.decode()
+
+    def test_URLの名前ごとに処理時間のヒストグラムを出力(self):
+        c = Client()
+        for _ in range(2):
+            c.get(reverse("index"))
+        c.get(reverse("search"), {"keyword": "post"})
+
+        text = self.get_metrics()
+        name = "raccoon_http_request_duration_seconds"
+        self.assertEqual(get_sample(text, f"{name}_count", view="index"), 2)
+        self.assertEqual(get_sample(text, f"{name}_count", view="search"), 1)
+        self.assertEqual(get_sample(text, f"{name}_bucket", view="index", le="+Inf"), 2)
+        self.assertGreater(get_sample(text, f"{name}_sum", view="index"), 0)
+        self.assertEqual(
+            get_sample(
+                text,
+                "raccoon_http_requests_total",
+                view="index",
+                method="GET",
+                status="200",
+            ),
+            2,
+        )
+        self.assertGreater(
+            get_sample(text, "raccoon_db_queries_total", view="index"), 0
+        )
+
+    def test_キューのタスクの数を出力(self):
+        for _ in range(3):
+            delete_user_posts.enqueue(user_id=0)
+
+        text = self.get_metrics()
+        self.assertEqual(
+            get_sample(text, "raccoon_task_queue_tasks", status="queued"), 3
+        )
+        self.assertEqual(get_sample(text, "raccoon_task_queue_tasks", status="done"), 0)
+        self.assertIn("raccoon_task_queue_ready 3", text)
+
+    def test_他のプロセスの集計結果を合計(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        stats = RequestStats()
+        stats.record_query(1.0)
+        stats.record_cache("page", hits=3, misses=1)
+        stats.finish()
+        with self.settings(METRICS_DIRECTORY=directory):
+            # 別のプロセスの集計結果
+            other = MetricsCollector()
+            other.record_request("index", "GET", 200, stats)
+            other.flush(force=True)
+
+            collector.record_request("index", "GET", 200, stats)
+            text = self.get_metrics()
+
+        name = "raccoon_http_request_duration_seconds_count"
+        self.assertEqual(get_sample(text, name, view="index"), 2)
+        self.assertEqual(get_sample(text, "raccoon_cache_hits_total", cache="page"), 6)
+        self.assertEqual(
+            get_sample(text, "raccoon_cache_hit_ratio", cache="page"), 0.75
+        )
+
+    def test_トークンを設定した場合は認証する(self):
+        response = Client().get(reverse("metrics"))
+        self.assertEqual(response.status_code, 403)
+        response = Client().get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+
+        self.get_metrics()
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_トークンを設定しない場合は開発環境以外では公開しない(self):
+        response = Client().get(reverse("metrics"))
+        self.assertEqual(response.status_code, 404)
+
+        with self.settings(DEBUG=True):
+            response = Client().get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_終了したプロセスのファイルを削除(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # 終了したプロセスのプロセスID
+        process = subprocess.Popen([sys.executable, "-c", ""])
+        process.wait()
+        dead_file = os.path.join(directory, f"{process.pid}-dead{METRICS_FILE_SUFFIX}")
+        with open(dead_file, "w") as f:
+            f.write('{"requests": {"index": {"GET": {"200": 5}}}}')
+
+        with self.settings(METRICS_DIRECTORY=directory):
+            # 処理中のプロセス（同じプロセスID）のファイルは残す
+            other = MetricsCollector()
+            other.record_request("index", "GET", 200, RequestStats())
+            other.flush(force=True)
+            text = self.get_metrics()
+
+        self.assertFalse(os.path.exists(dead_file))
+        self.assertEqual(len(os.listdir(directory)), 1)
+        self.assertEqual(
+            get_sample(
+                text,
+                "raccoon_http_requests_total",
+                view="index",
+                method="GET",
+                status="200",
+            ),
+            1,
+        )
@@ -0,0 +1,157 @@
+from articleapp.models import Post, Tag, User
+from articleapp.utils import page_cache
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+@override_settings(
+    CACHES={
+        **settings.CACHES,
+        "pages": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test_page_cache",
+        },
+    }
+)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        caches["pages"].clear()
+        page_cache.stats.reset()
+        self.users = [
+            User.objects.create_user(username="testuser_0", password="testuser_0"),
+            User.objects.create_user(username="testuser_1", password="testuser_1"),
+        ]
+        self.post = Post.objects.create(
+            title="post_0", body="post_0_body", user=self.users[0], slug="post_0"
+        )
+        self.post.publish()
+
+    def test_未ログインのアクセスをキャッシュ(self):
+        c = Client()
+        response = c.get(reverse("index"))
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "post_0")
+
+        with self.assertNumQueries(0):
+            response = c.get(reverse("index"))
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertContains(response, "post_0")
+        self.assertEqual((page_cache.stats.hits, page_cache.stats.misses), (1, 1))
+
+    def test_ログイン中のアクセスはキャッシュしない(self):
+        c = Client()
+        c.login(username="testuser_1", password="testuser_1")
+        for _ in range(2):
+            response = c.get(reverse("index"))
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header("X-Page-Cache"))
+        self.assertEqual((page_cache.stats.hits, page_cache.stats.misses), (0, 0))
+
+    def test_クエリ文字列の順序が異なっても同じキャッシュを使う(self):
+        c = Client()
+        url = reverse("user_home", kwargs={"username": "testuser_0"})
+        response = c.get(f"{url}?paginate_by=10&page=1")
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        response = c.get(f"{url}?page=1&paginate_by=10")
+        self.assertEqual(response["X-Page-Cache"], "hit")
+
+    def test_投稿の公開で無効化(self):
+        c = Client()
+        url = reverse("user_home", kwargs={"username": "testuser_0"})
+        other_user_url = reverse("user_home", kwargs={"username": "testuser_1"})
+        for u in [reverse("index"), url, other_user_url]:
+            c.get(u)
+
+        post = Post.objects.create(
+            title="post_1", body="post_1_body", user=self.users[0], slug="post_1"
+        )
+        post.publish()
+
+        response = c.get(reverse("index"))
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "post_1")
+        response = c.get(url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "post_1")
+        # 他のユーザーのページは無効化しない
+        response = c.get(other_user_url)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+
+    def test_タグの変更で無効化(self):
+        c = Client()
+        url = self.post.get_absolute_url()
+        c.get(url)
+
+        tag = Tag.objects.create(name="tag_0")
+        self.post.tags.add(tag)
+        response = c.get(url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "tag_0")
+
+        tag.name = "renamed_tag"
+        tag.save()
+        response = c.get(url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "renamed_tag")
+
+    def test_ユーザー名の変更で変更前のページも無効化(self):
+        c = Client()
+        url = reverse("user_home", kwargs={"username": "testuser_0"})
+        c.get(url)
+
+        self.users[0].username = "renamed_user"
+        self.users[0].save()
+        response = c.get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_ログインではキャッシュを無効化しない(self):
+        c = Client()
+        c.get(reverse("index"))
+        Client().login(username="testuser_0", password="testuser_0")
+        response = c.get(reverse("index"))
+        self.assertEqual(response["X-Page-Cache"], "hit")
+
+    def test_存在しないページはキャッシュしない(self):
+        c = Client()
+        url = reverse("user_home", kwargs={"username": "unknown_user"})
+        for _ in range(2):
+            response = c.get(url)
+            self.assertEqual(response.status_code, 404)
+        self.assertEqual((page_cache.stats.hits, page_cache.stats.misses), (0, 2))
+
+    def test_検索結果の一覧をキャッシュ(self):
+        c = Client()
+        c.login(username="testuser_1", password="testuser_1")
+        url = reverse("search")
+        with CaptureQueriesContext(connection) as first:
+            response = c.get(url, {"keyword": "post", "paginate_by": 1})
+        self.assertEqual(list(response.context["post_list_page"]), [self.post])
+        with CaptureQueriesContext(connection) as second:
+            response = c.get(url, {"paginate_by": 1, "keyword": "post"})
+        self.assertEqual(list(response.context["post_list_page"]), [self.post])
+        self.assertEqual(response.context["post_list_page"].paginator.num_pages, 1)
+        # 投稿・タグ・件数の取得が無くなる
+        self.assertEqual(len(first) - len(second), 3)
+
+        # 投稿の公開ですぐに一覧に反映される
+        post = Post.objects.create(
+            title="post_1", body="post_1_body", user=self.users[1], slug="post_1"
+        )
+        post.publish()
+        response = c.get(url, {"keyword": "post", "paginate_by": 1})
+        self.assertEqual(list(response.context["post_list_page"]), [post])
+        self.assertEqual(response.context["post_list_page"].paginator.num_pages, 2)
+
+    def test_カーソルによる検索結果のページをキャッシュ(self):
+        c = Client()
+        c.login(username="testuser_1", password="testuser_1")
+        for _ in range(2):
+            response = c.get(reverse("search"), {"cursor": ""})
+            page = response.context["post_list_page"]
+            self.assertEqual(list(page), [self.post])
+            self.assertFalse(page.has_next())
+            self.assertIsNone(page.paginator.queryset)
@@ -1,6 +1,6 @@
 import datetime
 
-from articleapp.models import Post, User
+from articleapp.models import Post, Tag, User
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.utils import timezone
@@ -146,3 +146,68 @@ class PostDetailViewTests(TestCase):
         self.assertListEqual(
             list(response.context["other_posts"]), posts[0:2] + posts[4:7]
         )
+
+    def test_クエリ数が他の記事の数に依存しない(self):
+        tags = Tag.objects.bulk_create([Tag(name=f"tag_{i}") for i in range(5)])
+        c = Client()
+        for number_of_posts in [2, 6]:
+            posts = Post.objects.bulk_create(
+                [
+                    Post(
+                        title=f"post_{number_of_posts}_{i}_tite",
+                        body=f"post_{i}_body",
+                        user=self.users[0],
+                        slug=f"post_{number_of_posts}_{i}_slug",
+                        is_published=True,
+                        date_publish=self.today_datetime.date(),
+                    )
+                    for i in range(number_of_posts)
+                ]
+            )
+            for post in posts:
+                post.tags.add(*tags)
+            # bulk_createでは本文が描画されないため、最初の表示時に描画して保存する
+            with self.assertNumQueries(8):
+                response = c.get(posts[0].get_absolute_url())
+            self.assertEqual(response.status_code, 200)
+            # ETagの計算（投稿、他の記事の集計）、
+            # ユーザー、投稿、投稿のタグ、他の記事、他の記事のタグ
+            with self.assertNumQueries(7):
+                response = c.get(posts[0].get_absolute_url())
+            self.assertEqual(response.status_code, 200)
+
+    def test_本文をHTMLで表示(self):
+        post = Post.objects.create(
+            title="post_0_tite",
+            body="# 見出し\n\n```python\nprint('hello')\n```\n\n<script>alert(1)</script>",
+            user=self.users[0],
+            slug="post_0_slug",
+            is_published=True,
+            date_publish=self.today_datetime.date(),
+        )
+        c = Client()
+        response = c.get(post.get_absolute_url())
+        self.assertContains(response, "<h1>見出し</h1>", html=True)
+        self.assertContains(response, '<div class="codehilite">')
+        self.assertContains(response, "&lt;script&gt;alert(1)&lt;/script&gt;")
+        self.assertNotContains(response, "<script>alert(1)</script>")
+
+    def test_描画の設定が変わった投稿を再描画(self):
+        post = Post.objects.create(
+            title="post_0_tite",
+            body="**本文**",
+            user=self.users[0],
+            slug="post_0_slug",
+            is_published=True,
+            date_publish=self.today_datetime.date(),
+        )
+        Post.objects.filter(id=post.id).update(
+            body_html="<p>古いHTML</p>", body_html_signature="old"
+        )
+        c = Client()
+        response = c.get(post.get_absolute_url())
+        self.assertContains(response, "<strong>本文</strong>")
+        post_after = Post.objects.get(id=post.id)
+        self.assertEqual(post_after.body_html, "<p><strong>本文</strong></p>")
+        # 再描画では更新日時を変更しない
+        self.assertEqual(post_after.updated_at, post.updated_at)
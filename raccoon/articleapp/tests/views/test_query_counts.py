@@ -0,0 +1,179 @@
+import datetime
+import difflib
+import re
+from collections import Counter
+
+from articleapp.models import Post, Tag, User
+from articleapp.utils.tag_autocomplete import tag_autocomplete
+from articleapp.utils.tag_pool import published_tag_pool
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+
+def normalize_sql(sql):
+    """
+    値の違いを無視して比較できるよう、SQLのリテラルを?に置き換える
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    return re.sub(r"IN \([?, ]+\)", "IN (...)", sql)
+
+
+# /metricsはトークンで認証する
+@override_settings(METRICS_TOKEN="secret")
+class QueryCountTests(TestCase):
+    """
+    各ビューのクエリ数がデータ量（投稿数・1ページの件数・タグ数）に依存しないことを確認する
+
+    少ないデータと多いデータで同じページを表示し、クエリ数が増えた場合は
+    N+1になっているクエリを表示して失敗する。
+    """
+
+    def setUp(self):
+        published_tag_pool.invalidate()
+        self.users = [
+            User.objects.create_user(username=f"testuser_{i}", password="testuser")
+            for i in range(2)
+        ]
+        self.tags = [Tag.objects.create(name=f"tag_{i}") for i in range(10)]
+        for user in self.users:
+            self.create_posts(user, count=2, tags_per_post=1)
+            self.create_posts(user, count=1, tags_per_post=1, published=False)
+        self.post = Post.objects.filter(user=self.users[0], is_published=True).first()
+
+    def create_posts(self, user, count, tags_per_post, published=True):
+        today = timezone.now().date()
+        start = Post.objects.filter(user=user).count()
+        for i in range(start, start + count):
+            post = Post.objects.create(
+                title=f"post_{i}",
+                body=f"post_{i}_body",
+                user=user,
+                slug=f"post_{i}",
+                is_published=published,
+                date_publish=today - datetime.timedelta(days=i) if published else None,
+            )
+            post.tags.add(*self.tags[:tags_per_post])
+
+    def grow(self):
+        """
+        投稿数とタグ数を増やす（既存の投稿にもタグを追加する）
+        """
+        for user in self.users:
+            self.create_posts(user, count=20, tags_per_post=8)
+            self.create_posts(user, count=10, tags_per_post=8, published=False)
+        for post in Post.objects.all():
+            post.tags.add(*self.tags[:8])
+
+    def get_cases(self):
+        """
+        (名前, URL, 少ないデータでのパラメータ, 多いデータでのパラメータ)のリスト
+        """
+        username = self.users[0].username
+        post_kwargs = {"username": username, "slug": self.post.slug}
+        return [
+            ("index", reverse("index"), {}, {}),
+            (
+                "search",
+                reverse("search"),
+                {"paginate_by": 2},
+                {"paginate_by": 30},
+            ),
+            (
+                "search_tags_filter",
+                reverse("search"),
+                {"tags": ["tag_0"]},
+                {"tags": [f"tag_{i}" for i in range(8)], "paginate_by": 30},
+            ),
+            (
+                "search_cursor",
+                reverse("search"),
+                {"cursor": "", "paginate_by": 2},
+                {"cursor": "", "paginate_by": 30},
+            ),
+            ("search_tags", reverse("search_tags"), {"keyword": "tag"}, {}),
+            ("post_detail", reverse("post_detail", kwargs=post_kwargs), {}, {}),
+            (
+                "user_home",
+                reverse("user_home", kwargs={"username": username}),
+                {"paginate_by": 2},
+                {"paginate_by": 30},
+            ),
+            ("signup", reverse("signup"), {}, {}),
+            ("login", reverse("login"), {}, {}),
+            ("metrics", reverse("metrics"), {}, {}),
+        ]
+
+    def get_login_cases(self):
+        username = self.users[0].username
+        post_kwargs = {"username": username, "slug": self.post.slug}
+        return [
+            *self.get_cases(),
+            (
+                "user_home_drafts",
+                reverse("user_home_drafts", kwargs={"username": username}),
+                {"paginate_by": 2},
+                {"paginate_by": 30},
+            ),
+            ("post_create", reverse("post_create"), {}, {}),
+            ("post_update", reverse("post_update", kwargs=post_kwargs), {}, {}),
+            ("user_settings", reverse("user_settings"), {}, {}),
+            ("user_settings_profile", reverse("user_settings_profile"), {}, {}),
+            ("user_settings_account", reverse("user_settings_account"), {}, {}),
+            ("password_change", reverse("password_change"), {}, {}),
+            ("deactivate", reverse("deactivate"), {}, {}),
+        ]
+
+    def capture_queries(self, client, url, data):
+        # タグのプール・入力補完の索引の再読み込みの有無でクエリ数が変わらないようにする
+        published_tag_pool.invalidate()
+        tag_autocomplete.invalidate()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, data)
+        self.assertLess(response.status_code, 400, url)
+        return [query["sql"] for query in context.captured_queries]
+
+    def assertConstantQueries(self, client, cases):
+        small = {
+            name: self.capture_queries(client, url, small_data)
+            for name, url, small_data, _ in cases
+        }
+        self.grow()
+        for name, url, small_data, large_data in cases:
+            with self.subTest(name):
+                large = self.capture_queries(client, url, {**small_data, **large_data})
+                if len(large) != len(small[name]):
+                    self.fail(self.describe_difference(small[name], large))
+
+    def describe_difference(self, small, large):
+        normalized_small = [normalize_sql(sql) for sql in small]
+        normalized_large = [normalize_sql(sql) for sql in large]
+        repeated = [
+            f"{count}回: {sql}"
+            for sql, count in Counter(normalized_large).items()
+            if count > normalized_small.count(sql)
+        ]
+        diff = difflib.unified_diff(
+            normalized_small, normalized_large, "少ないデータ", "多いデータ", lineterm=""
+        )
+        return "\n".join(
+            [
+                f"データを増やすとクエリ数が{len(small)}から{len(large)}に変わりました。",
+                "増えたクエリ:",
+                *repeated,
+                "差分:",
+                *diff,
+            ]
+        )
+
+    def test_未ログインの場合(self):
+        client = Client(HTTP_AUTHORIZATION="Bearer secret")
+        self.assertConstantQueries(client, self.get_cases())
+
+    def test_ログイン中の場合(self):
+        client = Client(HTTP_AUTHORIZATION="Bearer secret")
+        client.login(username="testuser_0", password="testuser")
+        self.assertConstantQueries(client, self.get_login_cases())
@@ -0,0 +1,90 @@
+import datetime
+import unittest
+
+from articleapp.models import Post, Tag, User
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "SQLiteの実行計画で確認する")
+class QueryPlanTests(TestCase):
+    """
+    公開中の投稿の一覧を取得するクエリがインデックスを使って並び替えていることを確認する
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testuser")
+        tag = Tag.objects.create(name="tag")
+        today = timezone.now().date()
+        for i in range(10):
+            post = Post.objects.create(
+                title=f"post_{i}",
+                body=f"post_{i}_body",
+                user=self.user,
+                slug=f"post_{i}",
+                is_published=i % 2 == 0,
+                date_publish=today - datetime.timedelta(days=i) if i % 2 == 0 else None,
+            )
+            post.tags.add(tag)
+
+    def get_post_list_plans(self, client, url, data=None):
+        """
+        urlにアクセスした際に実行された投稿の一覧のクエリと実行計画を返す
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query["sql"]
+                if not sql.startswith("SELECT") or 'FROM "articleapp_post"' not in sql:
+                    continue
+                if "ORDER BY" not in sql:
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plans.append((sql, "\n".join(row[-1] for row in cursor.fetchall())))
+        self.assertTrue(plans)
+        return plans
+
+    def assertUsesIndex(self, plans, index_name):
+        for sql, plan in plans:
+            with self.subTest(sql=sql):
+                self.assertIn(f"USING INDEX {index_name}", plan)
+                self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan)
+
+    def test_トップページ(self):
+        plans = self.get_post_list_plans(Client(), reverse("index"))
+        self.assertUsesIndex(plans, "post_published_idx")
+
+    def test_検索(self):
+        c = Client()
+        # タグで絞り込む場合は該当する投稿のidから検索するため対象外とする
+        for data in [{}, {"sort": "date_publish_asc"}, {"cursor": ""}]:
+            plans = self.get_post_list_plans(c, reverse("search"), data)
+            self.assertUsesIndex(plans, "post_published_idx")
+            if data.get("sort") == "date_publish_asc":
+                # 昇順の並び替えが適用されている
+                self.assertTrue(any('"date_publish" ASC' in sql for sql, _ in plans))
+
+    def test_ユーザーホーム(self):
+        c = Client()
+        plans = self.get_post_list_plans(
+            c, reverse("user_home", kwargs={"username": self.user.username})
+        )
+        self.assertUsesIndex(plans, "post_user_published_idx")
+
+        c.login(username="testuser", password="testuser")
+        plans = self.get_post_list_plans(
+            c, reverse("user_home_drafts", kwargs={"username": self.user.username})
+        )
+        self.assertUsesIndex(plans, "post_user_published_idx")
+
+    def test_他の記事(self):
+        post = Post.objects.filter(is_published=True).first()
+        plans = self.get_post_list_plans(Client(), post.get_absolute_url())
+        self.assertUsesIndex(plans, "post_user_published_idx")
@@ -0,0 +1,87 @@
+import json
+
+from articleapp.models import Post, User
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+class RequestTimingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="testuser")
+        self.post = Post.objects.create(
+            title="post_0", body="post_0_body", user=self.user, slug="post_0"
+        )
+        self.post.publish()
+        self.url = reverse(
+            "post_detail", kwargs={"username": "testuser", "slug": "post_0"}
+        )
+
+    def get_with_log(self, client, url):
+        with self.assertLogs("articleapp.requests") as logs:
+            response = client.get(url)
+        self.assertEqual(len(logs.records), 1)
+        return response, logs.records[0]
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    def test_処理時間の内訳をServer_Timingヘッダに付ける(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(self.url)
+
+        server_timing = response["Server-Timing"]
+        self.assertIn("db;dur=", server_timing)
+        self.assertIn(f'desc="{len(queries)} queries"', server_timing)
+        for name in ["tpl", "view", "total"]:
+            self.assertIn(f"{name};dur=", server_timing)
+
+    @override_settings(SERVER_TIMING_HEADER=False)
+    def test_設定が無効ならServer_Timingヘッダを付けない(self):
+        response = Client().get(self.url)
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_リクエストごとに1行のログを出力(self):
+        with CaptureQueriesContext(connection) as queries:
+            response, record = self.get_with_log(Client(), self.url)
+
+        self.assertEqual(record.levelname, "INFO")
+        stats = json.loads(record.getMessage())
+        self.assertEqual(stats["view"], "post_detail")
+        self.assertEqual(stats["path"], self.url)
+        self.assertEqual(stats["status"], 200)
+        self.assertEqual(stats["db_queries"], len(queries))
+        self.assertGreater(stats["template_ms"], 0)
+        self.assertGreaterEqual(stats["total_ms"], stats["view_ms"])
+        self.assertEqual(stats["over_budget"], [])
+        self.assertEqual(record.request_stats, stats)
+
+    @override_settings(REQUEST_QUERY_BUDGET=1)
+    def test_上限を超えたリクエストは警告(self):
+        response, record = self.get_with_log(Client(), self.url)
+
+        self.assertEqual(record.levelname, "WARNING")
+        self.assertEqual(json.loads(record.getMessage())["over_budget"], ["db_queries"])
+
+    @override_settings(
+        CACHES={
+            **settings.CACHES,
+            "pages": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "test_request_timing",
+            },
+        }
+    )
+    def test_キャッシュのヒット数を記録(self):
+        caches["pages"].clear()
+        c = Client()
+        response, record = self.get_with_log(c, self.url)
+        miss_stats = json.loads(record.getMessage())
+        self.assertEqual(miss_stats["cache"]["page"], {"hits": 0, "misses": 1})
+
+        response, record = self.get_with_log(c, self.url)
+        hit_stats = json.loads(record.getMessage())
+        self.assertEqual(hit_stats["cache"]["page"], {"hits": 1, "misses": 0})
+        # 条件付きGETの検証のクエリのみ実行する
+        self.assertLess(hit_stats["db_queries"], miss_stats["db_queries"])
@@ -1,8 +1,13 @@
 import datetime
 import random
+from io import StringIO
 
 from articleapp.models import Post, Tag, User
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy
 from django.utils import timezone
 
@@ -43,13 +48,14 @@ class SearchViewTests(TestCase):
     def test_フィルタ_タグ(self):
         tags = [Tag(name=f"tag_{i}") for i in range(3)]
         Tag.objects.bulk_create(tags)
+        # タグで絞り込んだ結果もデフォルトの並び順（投稿日の降順）になる
         posts = [
             Post(
                 title=f"post_{i}",
                 body=f"post_{i}_body",
                 user=self.users[0],
                 is_published=True,
-                date_publish=(self.today_datetime.date()),
+                date_publish=(self.today_datetime.date() - datetime.timedelta(days=i)),
             )
             for i in range(10)
         ]
@@ -95,6 +101,18 @@ class SearchViewTests(TestCase):
             response.context["post_list_page"].object_list, Post.objects.none()
         )
 
+        # 存在しないタグ名は無視する
+        response = c.get(self.url_path, {"tags": ["tag_0", "tag_1", "tag_x"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            list(response.context["post_list_page"].object_list), posts[6:10]
+        )
+        response = c.get(self.url_path, {"tags": ["tag_x"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertQuerysetEqual(
+            response.context["post_list_page"].object_list, Post.objects.none()
+        )
+
     def test_フィルタ_期間(self):
         posts = [
             Post(
@@ -222,6 +240,132 @@ class SearchViewTests(TestCase):
             list(response.context["post_list_page"].object_list), posts
         )
 
+    def test_フィルタ_キーワード_索引の同期(self):
+        post = Post.objects.create(
+            title="古いタイトル",
+            body="本文",
+            user=self.users[0],
+            is_published=True,
+            date_publish=self.today_datetime.date(),
+        )
+
+        c = Client()
+        response = c.get(self.url_path, {"keyword": "古いタイトル"})
+        self.assertListEqual(
+            list(response.context["post_list_page"].object_list), [post]
+        )
+
+        # 保存すると新しいタイトルで検索できる
+        post.title = "新しいタイトル"
+        post.save()
+        response = c.get(self.url_path, {"keyword": "古いタイトル"})
+        self.assertListEqual(list(response.context["post_list_page"].object_list), [])
+        response = c.get(self.url_path, {"keyword": "新しいタイ"})
+        self.assertListEqual(
+            list(response.context["post_list_page"].object_list), [post]
+        )
+
+        # 3文字未満のキーワードはn-gram（bigram）の転置索引で検索する
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get(self.url_path, {"keyword": "新し"})
+        self.assertListEqual(
+            list(response.context["post_list_page"].object_list), [post]
+        )
+        sql = "\n".join(query["sql"] for query in queries.captured_queries)
+        self.assertIn("articleapp_postsearchtoken", sql)
+        self.assertNotIn("LIKE", sql)
+        # 1文字のキーワードは索引を使えないためLIKEで検索する
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get(self.url_path, {"keyword": "新"})
+        self.assertListEqual(
+            list(response.context["post_list_page"].object_list), [post]
+        )
+        sql = "\n".join(query["sql"] for query in queries.captured_queries)
+        self.assertIn("LIKE", sql)
+        # 全角・半角や大文字・小文字の違いを無視する
+        post.title = "ＤＢの新しいタイトル"
+        post.save()
+        response = c.get(self.url_path, {"keyword": "db"})
+        self.assertListEqual(
+            list(response.context["post_list_page"].object_list), [post]
+        )
+
+        # 削除すると検索結果に表示されない
+        post.delete()
+        response = c.get(self.url_path, {"keyword": "新しいタイ"})
+        self.assertListEqual(list(response.context["post_list_page"].object_list), [])
+
+    @override_settings(
+        POST_SEARCH_BACKEND="articleapp.search.backends.NgramSearchBackend"
+    )
+    def test_フィルタ_キーワード_n_gram索引(self):
+        posts = [
+            Post.objects.create(
+                title=title,
+                body=body,
+                user=self.users[0],
+                is_published=True,
+                date_publish=(self.today_datetime.date() - datetime.timedelta(days=i)),
+            )
+            for i, (title, body) in enumerate(
+                [
+                    ("東京都の天気", "明日は晴れ"),
+                    ("京都の観光", "清水寺に行きました"),
+                    ("Pythonの入門", "ＤＪＡＮＧＯを使う"),
+                ]
+            )
+        ]
+
+        c = Client()
+        # 空白で区切られていない複合語の一部に一致する
+        response = c.get(self.url_path, {"keyword": "京都"})
+        self.assertListEqual(
+            list(response.context["post_list_page"].object_list), posts[0:2]
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get(self.url_path, {"keyword": "都の天"})
+        self.assertListEqual(
+            list(response.context["post_list_page"].object_list), [posts[0]]
+        )
+        # 候補の部分一致の確認はSQLで行い、候補の本文を読み込まない
+        sql = "\n".join(query["sql"] for query in queries.captured_queries)
+        self.assertIn("articleapp_postsearchdocument", sql)
+        self.assertNotIn('"articleapp_post"."body"', sql)
+        # n-gramが全て含まれていても連続していなければ一致しない
+        response = c.get(self.url_path, {"keyword": "京都天気"})
+        self.assertListEqual(list(response.context["post_list_page"].object_list), [])
+        # 1文字のキーワード
+        response = c.get(self.url_path, {"keyword": "寺"})
+        self.assertListEqual(
+            list(response.context["post_list_page"].object_list), [posts[1]]
+        )
+        # 大文字小文字を区別しない
+        response = c.get(self.url_path, {"keyword": "python"})
+        self.assertListEqual(
+            list(response.context["post_list_page"].object_list), [posts[2]]
+        )
+        # 全角・半角の違いを無視する（索引と同じく正規化して確認する）
+        for keyword in ["django", "ＰＹＴＨＯＮ", "ｄｊａ"]:
+            response = c.get(self.url_path, {"keyword": keyword})
+            self.assertListEqual(
+                list(response.context["post_list_page"].object_list), [posts[2]]
+            )
+
+        # bulk_createした投稿はコマンドで索引に登録する
+        bulk_post = Post(
+            title="京都の紅葉",
+            user=self.users[0],
+            is_published=True,
+            date_publish=self.today_datetime.date() - datetime.timedelta(days=5),
+        )
+        Post.objects.bulk_create([bulk_post])
+        call_command("rebuild_search_index", stdout=StringIO())
+        response = c.get(self.url_path, {"keyword": "京都の"})
+        self.assertListEqual(
+            list(response.context["post_list_page"].object_list),
+            posts[0:2] + [bulk_post],
+        )
+
     def test_フィルタ_並び順(self):
         posts = [
             Post(
@@ -306,6 +450,169 @@ class SearchViewTests(TestCase):
         )
         self.assertEqual(response.context["post_list_page"].number, 3)
 
+    def test_ページネーション_カーソル(self):
+        # 同じ投稿日の投稿が複数ある
+        posts = [
+            Post(
+                title=f"post_{i}_タイトル",
+                body=f"post_{i}_body_本文",
+                user=self.users[0],
+                is_published=True,
+                date_publish=(
+                    self.today_datetime.date() - datetime.timedelta(days=i // 3)
+                ),
+            )
+            for i in range(25)
+        ]
+        Post.objects.bulk_create(posts)
+        expected = list(
+            Post.objects.filter(is_published=True).order_by(
+                "-date_publish", "-created_at", "-id"
+            )
+        )
+
+        c = Client()
+        for sort, ordered in [
+            ("date_publish_desc", expected),
+            ("date_publish_asc", list(reversed(expected))),
+        ]:
+            # 次のページへ順に辿る
+            query = {"sort": sort, "paginate_by": 10, "cursor": ""}
+            pages = []
+            while True:
+                response = c.get(self.url_path, query)
+                self.assertEqual(response.status_code, 200)
+                page = response.context["post_list_page"]
+                nav = response.context["post_list_pagination_nav"]
+                self.assertTrue(nav["cursor"])
+                pages.append(list(page.object_list))
+                if nav["next_cursor"] is None:
+                    break
+                query["cursor"] = nav["next_cursor"]
+            self.assertListEqual(pages, [ordered[0:10], ordered[10:20], ordered[20:25]])
+            self.assertFalse(page.has_next())
+
+            # 前のページへ戻る
+            query["cursor"] = nav["previous_cursor"]
+            response = c.get(self.url_path, query)
+            self.assertListEqual(
+                list(response.context["post_list_page"].object_list), ordered[10:20]
+            )
+            query["cursor"] = response.context["post_list_pagination_nav"][
+                "previous_cursor"
+            ]
+            response = c.get(self.url_path, query)
+            self.assertListEqual(
+                list(response.context["post_list_page"].object_list), ordered[0:10]
+            )
+            self.assertIsNone(
+                response.context["post_list_pagination_nav"]["previous_cursor"]
+            )
+
+        # 件数を数えるクエリを実行しない（投稿の取得、投稿のタグの取得のみ）
+        with self.assertNumQueries(2):
+            response = c.get(self.url_path, {"paginate_by": 0, "cursor": ""})
+
+        # 不正なカーソルは最初のページとして扱う
+        response = c.get(self.url_path, {"paginate_by": 10, "cursor": "invalid"})
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            list(response.context["post_list_page"].object_list), expected[0:10]
+        )
+
+    @override_settings(PAGINATION_COUNT_CAP=5)
+    def test_ページネーション_件数の上限(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        posts = [
+            Post(
+                title=f"post_{i}_タイトル",
+                body=f"post_{i}_body_本文",
+                user=self.users[0],
+                is_published=True,
+                date_publish=(self.today_datetime.date() - datetime.timedelta(days=i)),
+            )
+            for i in range(8)
+        ]
+        Post.objects.bulk_create(posts)
+
+        c = Client()
+        # 上限以下の件数は正確に数える
+        response = c.get(self.url_path, {"keyword": "post_1", "paginate_by": 2})
+        paginator = response.context["post_list_page"].paginator
+        self.assertEqual(paginator.count, 1)
+        self.assertEqual(paginator.count_display, "1")
+
+        # 上限を超える件数は上限の件数として表示する
+        response = c.get(self.url_path, {"paginate_by": 2, "page": 3})
+        page = response.context["post_list_page"]
+        self.assertEqual(page.paginator.count, 5)
+        self.assertEqual(page.paginator.count_display, "5+")
+        self.assertEqual(page.paginator.num_pages, 3)
+        # ページは上限の件数で区切らず、次のページの有無は1件多く読み込んで判定する
+        self.assertListEqual(list(page.object_list), posts[4:6])
+        self.assertTrue(page.has_next())
+        self.assertDictEqual(
+            response.context["post_list_pagination_nav"],
+            {"numbers": [1, 2, 3, 4], "display_first": False, "display_last": False},
+        )
+
+        # 上限の件数から求めたページ数より後ろのページも表示できる
+        response = c.get(self.url_path, {"paginate_by": 2, "page": 4})
+        page = response.context["post_list_page"]
+        self.assertEqual(page.number, 4)
+        self.assertListEqual(list(page.object_list), posts[6:8])
+        self.assertFalse(page.has_next())
+        self.assertEqual((page.start_index(), page.end_index()), (7, 8))
+        self.assertDictEqual(
+            response.context["post_list_pagination_nav"],
+            {"numbers": [1, 2, 3, 4], "display_first": False, "display_last": False},
+        )
+        self.assertContains(response, "page=3")
+        self.assertNotContains(response, "page=5")
+
+        # 投稿より後ろのページは空のページとして扱う
+        response = c.get(self.url_path, {"paginate_by": 2, "page": 5})
+        page = response.context["post_list_page"]
+        self.assertListEqual(list(page.object_list), [])
+        self.assertFalse(page.has_next())
+
+        # 上限を超えた件数は絞り込み条件ごとにキャッシュされ、数え直さない
+        Post.objects.filter(id=posts[0].id).delete()
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get(self.url_path, {"paginate_by": 2, "page": 2})
+        self.assertEqual(response.context["post_list_page"].paginator.count, 5)
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+
+    def test_クエリ数が表示件数に依存しない(self):
+        tags = Tag.objects.bulk_create([Tag(name=f"tag_{i}") for i in range(5)])
+        posts = Post.objects.bulk_create(
+            [
+                Post(
+                    title=f"post_{i}_タイトル",
+                    body=f"post_{i}_body_本文",
+                    user=self.users[0],
+                    is_published=True,
+                    date_publish=self.today_datetime.date(),
+                )
+                for i in range(20)
+            ]
+        )
+        for post in posts:
+            post.tags.add(*tags)
+
+        c = Client()
+        for paginate_by in [1, 20]:
+            # 件数、投稿の取得、投稿のタグの取得
+            with self.assertNumQueries(3):
+                c.get(self.url_path, {"paginate_by": paginate_by})
+            # タグの取得が加わる
+            with self.assertNumQueries(4):
+                c.get(self.url_path, {"paginate_by": paginate_by, "tags": "tag_0"})
+            # カーソルによるページ分割では件数を数えない
+            with self.assertNumQueries(2):
+                c.get(self.url_path, {"paginate_by": paginate_by, "cursor": ""})
+
     def test_公開中の投稿のみが表示される(self):
         posts = [
             Post(
@@ -1,4 +1,5 @@
 from articleapp.models import Tag
+from articleapp.utils.tag_autocomplete import tag_autocomplete
 from django.test import Client, TestCase
 from django.urls import reverse_lazy
 
@@ -6,6 +7,13 @@ from django.urls import reverse_lazy
 class SearchTagsViewTests(TestCase):
     def setUp(self):
         self.url_path = reverse_lazy("search_tags")
+        # 索引はプロセス内に保持されるため、他のテストで読み込んだ内容を破棄する
+        tag_autocomplete.invalidate()
+
+    def search(self, **params):
+        response = Client().get(self.url_path, params)
+        self.assertEqual(response.status_code, 200)
+        return [tag["name"] for tag in response.json()["tags"]]
 
     def test_タグ検索(self):
         tags = [Tag(name=f"tag_{i}_タグ{i}") for i in range(20)]
@@ -28,3 +36,67 @@ class SearchTagsViewTests(TestCase):
         # 部分一致
         response = c.get(self.url_path, {"keyword": "ag_1"})
         self.assertListEqual(response.json()["tags"], [tags[1]] + tags[10:20])
+
+    def test_公開中の投稿数の多い順(self):
+        Tag.objects.bulk_create(
+            [
+                Tag(name="Django", published_post_count=1),
+                Tag(name="Python", published_post_count=5),
+                Tag(name="Python入門", published_post_count=10),
+                Tag(name="CPython", published_post_count=20),
+                Tag(name="py", published_post_count=0),
+            ]
+        )
+        self.assertListEqual(
+            self.search(), ["CPython", "Python入門", "Python", "Django", "py"]
+        )
+        # 前方一致するタグの後に部分一致するタグを並べる
+        self.assertListEqual(
+            self.search(keyword="py"), ["Python入門", "Python", "py", "CPython"]
+        )
+        self.assertListEqual(
+            self.search(keyword="py", order="name"),
+            ["py", "Python", "Python入門", "CPython"],
+        )
+        # 不正な並び順は既定の並び順として扱う
+        self.assertListEqual(
+            self.search(keyword="py", order="invalid"),
+            ["Python入門", "Python", "py", "CPython"],
+        )
+        # 全角の英字・1文字の部分一致
+        self.assertListEqual(
+            self.search(keyword="ＴＨＯＮ"), ["CPython", "Python入門", "Python"]
+        )
+        self.assertListEqual(self.search(keyword="門"), ["Python入門"])
+
+    def test_返すタグの個数(self):
+        Tag.objects.bulk_create([Tag(name=f"tag_{i}") for i in range(150)])
+
+        self.assertEqual(len(self.search()), 20)
+        self.assertListEqual(
+            self.search(keyword="tag", limit=3), ["tag_0", "tag_1", "tag_2"]
+        )
+        self.assertListEqual(self.search(keyword="ag_1", limit=2), ["tag_1", "tag_10"])
+        # 上限を超える値・不正な値
+        self.assertEqual(len(self.search(limit=1000)), 100)
+        self.assertEqual(len(self.search(limit=0)), 1)
+        self.assertEqual(len(self.search(limit="invalid")), 20)
+
+    def test_タグの変更を索引に反映(self):
+        tag = Tag.objects.create(name="python")
+        self.assertListEqual(self.search(keyword="py"), ["python"])
+
+        with self.assertNumQueries(0):
+            self.assertListEqual(self.search(keyword="py"), ["python"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name="pypy")
+            tag.name = "django"
+            tag.save()
+        with self.assertNumQueries(0):
+            self.assertListEqual(self.search(keyword="py"), ["pypy"])
+            self.assertListEqual(self.search(keyword="ang"), ["django"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.delete()
+        self.assertListEqual(self.search(), ["pypy"])
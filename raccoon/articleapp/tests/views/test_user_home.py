@@ -1,7 +1,8 @@
 import datetime
 
-from articleapp.models import Post, User
-from django.test import Client, TestCase
+from articleapp.models import Post, Tag, User
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
@@ -296,6 +297,96 @@ class UserHomeViewTests(TestCase):
         )
         self.assertEqual(response.context["post_list_page"].number, 3)
 
+    @override_settings(PAGINATION_COUNT_CAP=3)
+    def test_投稿数の表示(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        posts = [
+            Post(
+                title=f"post_{i}",
+                body=f"post_{i}_body",
+                slug=f"post_{i}_slug",
+                user=self.users[0],
+                is_published=True,
+                date_publish=self.today_datetime.date(),
+            )
+            for i in range(4)
+        ]
+        c = Client()
+        url = reverse("user_home", kwargs={"username": self.users[0].username})
+
+        Post.objects.bulk_create(posts[0:3])
+        response = c.get(url)
+        self.assertContains(response, "投稿数: 3")
+
+        # 上限を超える場合は「上限+」と表示する
+        Post.objects.bulk_create(posts[3:4])
+        response = c.get(url)
+        self.assertContains(response, "投稿数: 3+")
+
+    def test_クエリ数が表示件数に依存しない(self):
+        tags = Tag.objects.bulk_create([Tag(name=f"tag_{i}") for i in range(5)])
+        posts = Post.objects.bulk_create(
+            [
+                Post(
+                    title=f"post_{i}",
+                    body=f"post_{i}_body",
+                    slug=f"post_{i}_slug",
+                    user=self.users[0],
+                    is_published=True,
+                    date_publish=self.today_datetime.date(),
+                )
+                for i in range(20)
+            ]
+        )
+        for post in posts:
+            post.tags.add(*tags)
+
+        c = Client()
+        url = reverse("user_home", kwargs={"username": self.users[0].username})
+        for paginate_by in [1, 20]:
+            # ETagの計算（ユーザー、投稿の集計）、
+            # ユーザー、件数、投稿の取得、投稿のタグの取得
+            with self.assertNumQueries(6):
+                c.get(url, {"paginate_by": paginate_by})
+
+    def test_ページネーション_カーソル(self):
+        posts = [
+            Post(
+                title=f"post_{i}",
+                body=f"post_{i}_body",
+                slug=f"post_{i}_slug",
+                user=self.users[0],
+                is_published=False,
+            )
+            for i in range(5)
+        ]
+        Post.objects.bulk_create(posts)
+        expected = list(Post.objects.order_by("-created_at", "-id"))
+
+        c = Client()
+        c.login(username="testuser_0", password="testuser_0")
+        url = reverse("user_home_drafts", kwargs={"username": self.users[0].username})
+
+        # 投稿日が無い下書きもカーソルで辿れる
+        response = c.get(url, {"paginate_by": 2, "cursor": ""})
+        self.assertListEqual(list(response.context["post_list_page"]), expected[0:2])
+        nav = response.context["post_list_pagination_nav"]
+        self.assertDictEqual(
+            {key: nav[key] for key in ["numbers", "display_first", "display_last"]},
+            {"numbers": [], "display_first": False, "display_last": False},
+        )
+        self.assertIsNone(nav["previous_cursor"])
+
+        response = c.get(url, {"paginate_by": 2, "cursor": nav["next_cursor"]})
+        self.assertListEqual(list(response.context["post_list_page"]), expected[2:4])
+        nav = response.context["post_list_pagination_nav"]
+        response = c.get(url, {"paginate_by": 2, "cursor": nav["next_cursor"]})
+        self.assertListEqual(list(response.context["post_list_page"]), expected[4:5])
+        self.assertIsNone(response.context["post_list_pagination_nav"]["next_cursor"])
+        # 総件数は表示しない
+        self.assertNotContains(response, "投稿数:")
+
     def test_ページネーション_ナビゲーション(self):
         """
         ページネーションのナビゲーションに表示するページ番号を決めるロジックのテスト
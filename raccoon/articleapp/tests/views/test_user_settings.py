@@ -1,16 +1,21 @@
+import shutil
+import tempfile
 from pathlib import Path
 
 from articleapp import tests
 from articleapp.forms import AccountUpdateForm, ProfileUpdateForm
 from articleapp.models import User
 from django.core.files import File
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse_lazy
 import filecmp
 
 
 class UserSettingsTests(TestCase):
     def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
         self.users = [
             User.objects.create_user(username=f"testuser_{i}", password=f"testuser_{i}")
             for i in range(4)
@@ -41,6 +46,10 @@ class UserSettingsTests(TestCase):
         self.url_user_settings_profile = reverse_lazy("user_settings_profile")
         self.url_user_settings_account = reverse_lazy("user_settings_account")
 
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root)
+
     def test_デフォルトurlで設定ページにアクセスするとリダイレクト(self):
         c = Client()
 
@@ -1,7 +1,6 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.auth.views import LoginView, LogoutView, PasswordChangeView
-from django.urls import path, reverse_lazy
+from django.urls import path, re_path, reverse_lazy
 from django.views.generic.base import RedirectView
 
 from . import views
@@ -48,6 +47,7 @@ urlpatterns = [
         name="password_change",
     ),
     path("deactivate/", views.deactivate, name="deactivate"),
+    path("metrics", views.metrics, name="metrics"),
     # ユーザー関連ページ（先頭が任意のユーザー名のため末尾にまとめる）
     path("<str:username>/home/", views.user_home, name="user_home"),
     path(
@@ -65,4 +65,10 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += [
+        re_path(
+            rf"^{settings.MEDIA_URL.lstrip('/')}(?P<path>.*)$",
+            views.serve_media,
+            kwargs={"document_root": settings.MEDIA_ROOT},
+        ),
+    ]
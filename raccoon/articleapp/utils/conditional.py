@@ -0,0 +1,108 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+
+from ..models import Post, User
+from .markup import get_renderer_signature
+
+
+def conditional_page(get_validators):
+    """
+    ETagを返し、条件付きGET（If-None-Match）には304を返すデコレータ。
+
+    Last-Modifiedは返さない。投稿の非公開・削除やプロフィールの変更では
+    投稿の更新日時の最大値が進まない（戻ることもある）ため、If-Modified-Sinceでは
+    ページの変更を検出できない。
+
+    Args:
+        get_validators (callable): ビューと同じ引数を受け取り、
+            ETagの元になる値のリストを返す関数。
+            ページを表示できない場合（404等）はNoneを返す。
+    """
+
+    def etag_func(request, *args, **kwargs):
+        parts = get_validators(request, *args, **kwargs)
+        if parts is None:
+            return None
+        # ログイン中のユーザーによって表示が変わるため閲覧者もETagに含める
+        # （ヘッダーに閲覧者のプロフィール画像を表示するため、プロフィールの版も含める）
+        viewer = request.user
+        viewer_version = viewer.get_profile_version() if viewer.is_authenticated else ""
+        parts = [str(viewer.pk), viewer_version, *parts]
+        return hashlib.sha256("\n".join(map(str, parts)).encode()).hexdigest()
+
+    return condition(etag_func=etag_func)
+
+
+def _aggregate_posts(posts):
+    # 一覧の投稿の更新日時の最大値と件数（非公開・削除の検出に使う）
+    return posts.aggregate(last_modified=Max("updated_at"), count=Count("id"))
+
+
+def post_detail_validators(request, username, slug):
+    """
+    投稿の詳細ページのETagの元になる値を返す（views.post_detailを参照）
+    """
+    try:
+        post = (
+            Post.objects.select_related("user")
+            .only(
+                "updated_at",
+                "is_published",
+                "user__username",
+                "user__display_name",
+                "user__profile_image",
+                "user__profile_thumbnails",
+            )
+            .get(
+                user__username=username,
+                user__is_staff=False,
+                user__is_superuser=False,
+                user__is_active=True,
+                slug=slug,
+            )
+        )
+    except Post.DoesNotExist:
+        return None
+    if not post.is_published and request.user.pk != post.user_id:
+        return None
+
+    # 他の記事
+    other_posts = _aggregate_posts(
+        Post.objects.filter(user_id=post.user_id, is_published=True).exclude(id=post.id)
+    )
+    parts = [
+        post.id,
+        post.updated_at.isoformat(),
+        post.user.get_profile_version(),
+        other_posts["last_modified"],
+        other_posts["count"],
+        # 本文の描画の設定が変わった場合は表示も変わる
+        get_renderer_signature(),
+    ]
+    return parts
+
+
+def user_home_validators(request, username, drafts=False):
+    """
+    ユーザーホームのETagの元になる値を返す（views.user_homeを参照）
+    """
+    try:
+        user = User.objects.only(
+            "username", "display_name", "profile_image", "profile_thumbnails"
+        ).get(username=username, is_active=True)
+    except User.DoesNotExist:
+        return None
+    if drafts and request.user.pk != user.pk:
+        return None
+
+    posts = _aggregate_posts(Post.objects.filter(user=user, is_published=not drafts))
+    parts = [
+        user.pk,
+        drafts,
+        user.get_profile_version(),
+        posts["last_modified"],
+        posts["count"],
+    ]
+    return parts
@@ -0,0 +1,76 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# プロフィール画像のサムネイルの大きさ（正方形の一辺のピクセル数）
+THUMBNAIL_SIZES = (40, 80, 160)
+# サムネイルの保存先（ストレージ内のディレクトリ）
+THUMBNAIL_DIRECTORY = "uploads/thumbnails"
+
+
+def create_thumbnails(image_field, sizes=THUMBNAIL_SIZES, storage=None):
+    """
+    画像の中央を正方形に切り抜いたサムネイルをsizesの大きさごとに作成して保存する。
+
+    各大きさについて、WebPと、WebPに対応していないブラウザ向けの画像
+    （透過がある場合はPNG、無い場合はJPEG）を作成する。
+
+    Args:
+        image_field (django.db.models.fields.files.ImageFieldFile): 元の画像
+        sizes (tuple of int): サムネイルの大きさ
+        storage (django.core.files.storage.Storage): 保存先（省略時は元の画像と同じ）
+
+    Returns:
+        dict: 保存したサムネイルのパス
+            {
+                "source": 元の画像のパス,
+                "variants": {"40": {"webp": path, "png" or "jpeg": path}, ...},
+            }
+
+    Raises:
+        ValueError: 画像のピクセル数がPROFILE_IMAGE_MAX_PIXELSを超える場合
+    """
+    if storage is None:
+        storage = image_field.storage
+    with image_field.open("rb") as f:
+        with Image.open(f) as image:
+            width, height = image.size
+            if width * height > settings.PROFILE_IMAGE_MAX_PIXELS:
+                raise ValueError(f"画像の大きさ（{width}×{height}）が大きすぎます。")
+            # JPEGは必要な大きさに近い縮小率で展開する（他の形式では何もしない）
+            max_size = max(sizes)
+            image.draft("RGB", (max_size, max_size))
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ("RGBA", "LA", "P") and (
+                image.mode != "P" or "transparency" in image.info
+            )
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+    fallback_format = "png" if has_alpha else "jpeg"
+    stem = os.path.splitext(os.path.basename(image_field.name))[0]
+    variants = {}
+    for size in sizes:
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        variants[str(size)] = {}
+        for image_format in ["webp", fallback_format]:
+            buffer = BytesIO()
+            thumbnail.save(buffer, format=image_format, quality=85)
+            name = storage.save(
+                f"{THUMBNAIL_DIRECTORY}/{stem}_{size}.{image_format}",
+                ContentFile(buffer.getvalue()),
+            )
+            variants[str(size)][image_format] = name
+    return {"source": image_field.name, "variants": variants}
+
+
+def delete_thumbnails(thumbnails, storage=default_storage):
+    """
+    create_thumbnailsで保存したサムネイルを削除する
+    """
+    for variant in thumbnails.get("variants", {}).values():
+        for name in variant.values():
+            storage.delete(name)
@@ -0,0 +1,125 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates as BaseDjangoTemplates
+from django.template.backends.django import Template as BaseTemplate
+
+# 処理中のリクエストの計測結果（RequestStats）。リクエストの外ではNone
+_current_stats = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    """
+    1つのリクエストの処理時間の内訳（RequestTimingMiddlewareが記録する）
+
+    時間はすべてミリ秒。
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.total_time = 0.0
+        self.view_time = 0.0
+        self.query_count = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        # {キャッシュの名前: {"hits": ヒット数, "misses": ミス数}}
+        self.cache = {}
+        self._template_depth = 0
+
+    def record_query(self, duration):
+        self.query_count += 1
+        self.query_time += duration
+
+    def record_cache(self, name, hits=0, misses=0):
+        counts = self.cache.setdefault(name, {"hits": 0, "misses": 0})
+        counts["hits"] += hits
+        counts["misses"] += misses
+
+    @property
+    def cache_hits(self):
+        return sum(counts["hits"] for counts in self.cache.values())
+
+    @property
+    def cache_misses(self):
+        return sum(counts["misses"] for counts in self.cache.values())
+
+    def finish(self):
+        self.total_time = (time.perf_counter() - self.started_at) * 1000
+
+
+def get_current_stats():
+    return _current_stats.get()
+
+
+@contextmanager
+def collect_stats():
+    """
+    with文の中の処理（リクエスト）の計測結果をRequestStatsに記録する
+    """
+    stats = RequestStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        stats.finish()
+        _current_stats.reset(token)
+
+
+def record_cache(name, hits=0, misses=0):
+    """
+    キャッシュのヒット・ミスの回数を処理中のリクエストに記録する（リクエストの外では何もしない）
+
+    Args:
+        name (str): キャッシュの名前（Server-Timingやログに表示する）
+        hits (int): ヒットした回数
+        misses (int): ミスした回数
+    """
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record_cache(name, hits=hits, misses=misses)
+
+
+def query_timer(execute, sql, params, many, context):
+    """
+    SQLの実行回数と時間を記録する（connection.execute_wrapperに渡す）
+    """
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started_at = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query((time.perf_counter() - started_at) * 1000)
+
+
+class Template(BaseTemplate):
+    def render(self, context=None, request=None):
+        stats = _current_stats.get()
+        if stats is None:
+            return super().render(context, request)
+        # テンプレートの中で描画したテンプレート（render_post_cards等）は二重に数えない
+        stats._template_depth += 1
+        started_at = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats._template_depth -= 1
+            if stats._template_depth == 0:
+                stats.template_time += (time.perf_counter() - started_at) * 1000
+
+
+class DjangoTemplates(BaseDjangoTemplates):
+    """
+    描画にかかった時間を処理中のリクエストに記録するテンプレートエンジン
+
+    settings.TEMPLATESのBACKENDに指定する。
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return Template(template.template, self)
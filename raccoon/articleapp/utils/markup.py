@@ -0,0 +1,122 @@
+import hashlib
+import html
+import json
+import re
+
+import bleach
+import markdown
+from django.conf import settings
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+# 一覧に表示する本文の抜粋の最大文字数
+EXCERPT_LENGTH = 150
+
+# 描画結果のHTMLに残すタグ・属性（それ以外はエスケープする）
+ALLOWED_TAGS = [
+    "a",
+    "blockquote",
+    "br",
+    "code",
+    "del",
+    "div",
+    "em",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "hr",
+    "img",
+    "li",
+    "ol",
+    "p",
+    "pre",
+    "span",
+    "strong",
+    "table",
+    "tbody",
+    "td",
+    "th",
+    "thead",
+    "tr",
+    "ul",
+]
+ALLOWED_ATTRIBUTES = {
+    "a": ["href", "title"],
+    "img": ["src", "alt", "title"],
+    # シンタックスハイライトはclass属性で色を付ける
+    "code": ["class"],
+    "div": ["class"],
+    "pre": ["class"],
+    "span": ["class"],
+    "td": ["align"],
+    "th": ["align"],
+}
+
+
+def markdown_to_text(body):
+    """
+    マークダウンの本文から記法を取り除いたプレーンテキストを返す。
+    """
+    text = strip_tags(markdown.markdown(body))
+    # タグを取り除いた後に残る文字参照を元に戻し、改行等の空白を1つにまとめる
+    return re.sub(r"\s+", " ", html.unescape(text)).strip()
+
+
+def create_excerpt(body, length=EXCERPT_LENGTH):
+    """
+    一覧に表示する本文の抜粋を作成する。
+
+    マークダウンの記法を取り除き、length文字を超える場合は末尾を「…」にして切り詰める
+    （テンプレートのtruncatecharsフィルタと同じ結果になる）。
+    """
+    return Truncator(markdown_to_text(body)).chars(length)
+
+
+def render_markdown(body):
+    """
+    マークダウンの本文をHTMLに変換する。
+
+    コードブロックはcodehilite拡張（Pygments）でシンタックスハイライトし、
+    ユーザーが書いたHTMLはbleachで許可したタグ・属性以外をエスケープする。
+    """
+    rendered = markdown.markdown(
+        body,
+        extensions=settings.POST_MARKDOWN_EXTENSIONS,
+        extension_configs=settings.POST_MARKDOWN_EXTENSION_CONFIGS,
+    )
+    return bleach.clean(
+        rendered,
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        protocols=["http", "https", "mailto"],
+    )
+
+
+def get_renderer_signature():
+    """
+    render_markdownの設定を表す文字列を返す。
+
+    投稿には描画時の値を保存し、設定やライブラリのバージョンが変わった場合に
+    再描画が必要な投稿を判別する（rerender_post_bodiesコマンド）。
+    """
+    try:
+        import pygments
+
+        pygments_version = pygments.__version__
+    except ImportError:
+        pygments_version = None
+
+    renderer = {
+        "markdown": markdown.__version__,
+        "pygments": pygments_version,
+        "bleach": bleach.__version__,
+        "extensions": settings.POST_MARKDOWN_EXTENSIONS,
+        "extension_configs": settings.POST_MARKDOWN_EXTENSION_CONFIGS,
+        "tags": ALLOWED_TAGS,
+        "attributes": ALLOWED_ATTRIBUTES,
+    }
+    data = json.dumps(renderer, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
@@ -0,0 +1,190 @@
+import hashlib
+import threading
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import instrumentation, stampede
+
+# 全てのページに関わる変更（タグ名の変更等）で無効化するスコープ
+SCOPE_ALL = "all"
+# 全ユーザーの投稿の一覧（トップページ・検索結果）
+SCOPE_INDEX = "index"
+
+
+def user_scope(username):
+    """
+    ユーザーのページ（ユーザーホーム・投稿の詳細）のスコープ名を返す
+    """
+    return f"user:{username}"
+
+
+class PageCacheStats:
+    """
+    ページのキャッシュのヒット・ミスの回数（プロセスごと）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+stats = PageCacheStats()
+
+
+def get_page_cache():
+    return caches[settings.PAGE_CACHE_ALIAS]
+
+
+def _generation_key(scope):
+    return f"page_cache:generation:{scope}"
+
+
+def get_generations(scopes):
+    """
+    スコープごとの世代（無効化のたびに変わる値）を返す。
+
+    キャッシュに世代が無ければ新しく作成する。
+    キャッシュが使えない場合（DummyCache等）はNoneを返す。
+    """
+    cache = get_page_cache()
+    keys = [_generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # 他のプロセスが同時に作成した場合はそちらの値を使う
+            cache.add(key, uuid.uuid4().hex, None)
+            generations[key] = cache.get(key)
+            if generations[key] is None:
+                return None
+    return [generations[key] for key in keys]
+
+
+def invalidate(*scopes):
+    """
+    スコープに含まれるページのキャッシュを無効化する。
+
+    世代を新しい値にすることで、古い世代のキーで保存されたページを参照しなくする
+    （古いページはタイムアウトかキャッシュの容量超過で削除される）。
+    """
+    get_page_cache().set_many(
+        {_generation_key(scope): uuid.uuid4().hex for scope in scopes}, None
+    )
+
+
+def normalize_query(querydict):
+    """
+    パラメータの順序が異なるだけのクエリ文字列が同じ値になるよう正規化する
+    """
+    return urlencode(
+        sorted((key, value) for key in querydict for value in querydict.getlist(key))
+    )
+
+
+def cache_page_for_anonymous(get_scopes):
+    """
+    未ログインのユーザーへのレスポンスをキャッシュするデコレータ。
+
+    キーはパス、正規化したクエリ文字列、スコープの世代から作成する。
+    スコープはsignals.pyで投稿・タグ・ユーザーの変更時に無効化する。
+
+    Args:
+        get_scopes (callable): ビューと同じ引数を受け取り、
+            ページが依存するスコープ名のリストを返す関数
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+                return view_func(request, *args, **kwargs)
+
+            scopes = [SCOPE_ALL, *get_scopes(request, *args, **kwargs)]
+            generations = get_generations(scopes)
+            if generations is None:
+                return view_func(request, *args, **kwargs)
+
+            cache = get_page_cache()
+            source = "\n".join(
+                [request.path, normalize_query(request.GET), *generations]
+            )
+            key = f"page_cache:page:{hashlib.sha256(source.encode()).hexdigest()}"
+            response = cache.get(key)
+            if response is not None:
+                stats.record_hit()
+                instrumentation.record_cache("page", hits=1)
+                response["X-Page-Cache"] = "hit"
+                return response
+
+            stats.record_miss()
+            instrumentation.record_cache("page", misses=1)
+            response = view_func(request, *args, **kwargs)
+            response["X-Page-Cache"] = "miss"
+            # Cookieを設定するレスポンスは他のユーザーに返さない
+            if (
+                response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+            ):
+                cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def get_listing(name, compute):
+    """
+    全ユーザーの投稿の一覧（トップページ・検索結果）をキャッシュから取得する。
+
+    ログイン中のユーザーにも使えるよう、ページではなくcompute()の結果を保存する。
+    期限切れの場合は計算中の他のリクエストに期限切れの値を返すが、
+    投稿の変更時はSCOPE_INDEXの世代が変わるため、変更前の値は返さずに計算を待つ
+    （stampede.get_or_setを参照）。
+
+    Args:
+        name (str): 一覧を識別する名前
+        compute (callable): 一覧を取得する関数（結果はpickleできること）
+    """
+    generations = get_generations([SCOPE_ALL, SCOPE_INDEX])
+    if generations is None:
+        return compute()
+
+    computed = False
+
+    def compute_and_record():
+        nonlocal computed
+        computed = True
+        return compute()
+
+    listing = stampede.get_or_set(
+        get_page_cache(),
+        f"page_cache:listing:{hashlib.sha256(name.encode()).hexdigest()}",
+        compute_and_record,
+        timeout=settings.LISTING_CACHE_TIMEOUT,
+        stale_timeout=settings.LISTING_CACHE_STALE_TIMEOUT,
+        version=":".join(generations),
+    )
+    if computed:
+        instrumentation.record_cache("listing", misses=1)
+    else:
+        instrumentation.record_cache("listing", hits=1)
+    return listing
@@ -1,9 +1,32 @@
+import base64
+import binascii
+import copy
+import hashlib
+import json
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
+
+
 def create_navigation_context_from_page(page):
     """
     ページネーションのリンクに表示するページ番号を決定して返す。
 
+    カーソルによるページ（CursorPage）の場合は総件数が分からないため、
+    ページ番号は表示せず前後のページへのカーソルのみを返す。
+    総件数が正確でないページ（OpenEndedPage）の場合は、最後のページが分からないため
+    最後のページの番号は表示せず、次のページがあれば次のページまでの番号を表示する。
+
     Args:
-        page (django.core.paginator.Page): 基準となるページ
+        page (django.core.paginator.Page or CursorPage): 基準となるページ
 
     Returns:
         dict: 表示する番号一覧及び最初・最後の番号の表示有無
@@ -12,16 +35,37 @@ def create_navigation_context_from_page(page):
                 'display_first': True if display first page, False otherwise.
                 'display_last': True if display last page, False otherwise.
             }
+            CursorPageの場合は以下のキーが加わる
+            {
+                'cursor': True.
+                'previous_cursor': cursor token of previous page or None.
+                'next_cursor': cursor token of next page or None.
+            }
     """
 
+    if isinstance(page, CursorPage):
+        return {
+            "numbers": [],
+            "display_first": False,
+            "display_last": False,
+            "cursor": True,
+            "previous_cursor": page.previous_cursor,
+            "next_cursor": page.next_cursor,
+        }
+
     paginator = page.paginator
+    num_pages = paginator.num_pages
+    open_ended = isinstance(page, OpenEndedPage)
+    if open_ended:
+        # 件数の上限（推定値）から求めたページ数より後ろのページも辿れるようにする
+        num_pages = max(num_pages, page.number + 1 if page.has_next() else page.number)
     numbers = []
     display_first = False
     display_last = False
 
     # 現在のページを中心として前後最大5ページ分を表示する
     # 上記の内、最初・最後のページを優先して表示する
-    if paginator.num_pages >= 5:
+    if num_pages >= 5:
         # 最初に、現在のページを真ん中にする
         left = page.number - 2
         right = page.number + 2
@@ -29,23 +73,411 @@ def create_navigation_context_from_page(page):
         if left < 1:
             right = right + (1 - left)
             left = 1
-        elif right > paginator.num_pages:
-            left = left - (right - paginator.num_pages)
-            right = paginator.num_pages
+        elif right > num_pages:
+            left = left - (right - num_pages)
+            right = num_pages
         numbers = list(range(left, right + 1))
         # 左端が2以上の場合、左端の代わりに最初のページを表示する
         if left > 1:
             numbers.remove(left)
             display_first = True
         # 右端が最後のページの1個前以下の場合、代わりに最後のページを表示する
-        if right < paginator.num_pages:
+        if right < num_pages and not open_ended:
             numbers.remove(right)
             display_last = True
     else:
-        numbers = list(range(1, paginator.num_pages + 1))
+        numbers = list(range(1, num_pages + 1))
 
     return {
         "numbers": numbers,
         "display_first": display_first,
         "display_last": display_last,
     }
+
+
+def paginate_queryset(queryset, querydict, cursor_ordering):
+    """
+    クエリパラメータに応じてquerysetをページ分割し、表示するページを返す。
+
+    cursorパラメータがあればカーソル（キーセット）によるページ分割を行い、
+    無ければページ番号（pageパラメータ）によるページ分割を行う。
+
+    Args:
+        queryset (django.db.models.QuerySet): ページ分割するqueryset
+        querydict (django.http.QueryDict): リクエストのクエリパラメータ
+        cursor_ordering (list of str): カーソルによるページ分割で使う並び順
+
+    Returns:
+        django.core.paginator.Page or CursorPage: 表示するページ
+    """
+    paginate_by = 10
+    if "paginate_by" in querydict:
+        try:
+            paginate_by = int(querydict["paginate_by"])
+        except ValueError:
+            pass
+
+    if "cursor" in querydict:
+        paginator = CursorPaginator(queryset, paginate_by, cursor_ordering)
+        try:
+            return paginator.get_page(querydict["cursor"])
+        except InvalidCursor:
+            # 不正なカーソルは最初のページとして扱う
+            return paginator.get_page(None)
+
+    paginator = CountingPaginator(queryset, paginate_by)
+    page_number = 1
+    if "page" in querydict:
+        try:
+            page_number = int(querydict["page"])
+        except ValueError:
+            # intに変換できない値はスルー
+            pass
+    return paginator.get_page(page_number)
+
+
+def freeze_page(page):
+    """
+    ページをキャッシュに保存できるよう、ページの要素を読み込んで元のクエリセットを切り離す。
+
+    元のクエリセットはpickleすると全件が読み込まれるため、
+    総ページ数を計算した上でページ分割のオブジェクトから取り除く。
+
+    Args:
+        page (django.core.paginator.Page or CursorPage): 対象のページ
+
+    Returns:
+        django.core.paginator.Page or CursorPage: 元のクエリセットを参照しないページ
+    """
+    page.object_list = list(page.object_list)
+    paginator = copy.copy(page.paginator)
+    if isinstance(paginator, CursorPaginator):
+        paginator.queryset = None
+    else:
+        paginator.num_pages  # cached_propertyのため計算結果が保持される
+        paginator.object_list = None
+    page.paginator = paginator
+    return page
+
+
+def estimate_count(queryset):
+    """
+    データベースの実行計画から、querysetの件数の推定値を返す。
+
+    推定値を得られないデータベース（PostgreSQL以外）ではNoneを返す。
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class CountingPaginator(Paginator):
+    """
+    総件数のCOUNT(*)を上限付きで行うページネーター。
+
+    件数はsettings.PAGINATION_COUNT_CAP + 1件までしか数えない。上限以下であれば
+    正確な件数を使い、上限を超える場合は実行計画の推定値を、推定値を得られなければ
+    上限の件数を使う（表示は「1000+」のようになる）。
+    上限を超える場合の件数は、絞り込み条件（SQL）ごとに
+    settings.PAGINATION_COUNT_CACHE_TIMEOUT秒間キャッシュする。
+
+    件数が正確でない場合（上限・推定値）は、ページ番号を件数から求めた最後のページに
+    丸めず、次のページの有無は1件多く読み込んで判定する（OpenEndedPageを返す）。
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.count_is_capped = False
+        self.count_is_estimated = False
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, "query"):
+            # querysetではない場合は通常通り数える
+            return len(self.object_list)
+        if self.object_list.query.is_empty():
+            # none()のquerysetはSQLを発行しない
+            return 0
+
+        cap = settings.PAGINATION_COUNT_CAP
+        cache_key = self.get_count_cache_key(cap)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            count, self.count_is_capped, self.count_is_estimated = cached
+            return count
+
+        # 上限+1件までに絞ったサブクエリを数える
+        count = self.object_list.order_by()[: cap + 1].count()
+        if count <= cap:
+            # 上限以下は安価に正確な件数が分かるためキャッシュしない
+            return count
+
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > cap:
+            count = estimate
+            self.count_is_estimated = True
+        else:
+            count = cap
+            self.count_is_capped = True
+        cache.set(
+            cache_key,
+            (count, self.count_is_capped, self.count_is_estimated),
+            settings.PAGINATION_COUNT_CACHE_TIMEOUT,
+        )
+        return count
+
+    @property
+    def count_is_exact(self):
+        self.count  # 件数を数えてから判定する
+        return not (self.count_is_capped or self.count_is_estimated)
+
+    def validate_number(self, number):
+        if self.count_is_exact:
+            return super().validate_number(number)
+        # 最後のページが分からないため、1以上の整数であることのみ確認する
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(gettext_lazy("That page number is not an integer"))
+        if number < 1:
+            raise EmptyPage(gettext_lazy("That page number is less than 1"))
+        return number
+
+    def page(self, number):
+        if self.count_is_exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        items = list(self.object_list[bottom : bottom + self.per_page + 1])
+        return OpenEndedPage(
+            items[: self.per_page], number, self, len(items) > self.per_page
+        )
+
+    @property
+    def count_display(self):
+        """
+        画面に表示する件数（上限を超えた場合は「1000+」、推定値の場合は「約12345」）
+        """
+        count = self.count
+        if self.count_is_capped:
+            return f"{count}+"
+        if self.count_is_estimated:
+            return f"約{count}"
+        return str(count)
+
+    def get_count_cache_key(self, cap):
+        # 並び順は件数に関係しないため除いたSQLを絞り込み条件の識別に使う
+        queryset = self.object_list.order_by()
+        sql, params = queryset.query.sql_with_params()
+        signature = f"{queryset.db}:{cap}:{sql}:{params!r}"
+        return "pagination_count:" + hashlib.sha256(signature.encode()).hexdigest()
+
+
+class OpenEndedPage(Page):
+    """
+    総件数が正確でない場合にCountingPaginatorが返すページ。
+
+    次のページの有無を総ページ数ではなく、1件多く読み込んだ結果で判定する。
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPaginator:
+    """
+    キーセット（カーソル）方式のページネーター。
+
+    OFFSETの代わりに、直前のページの最後（または最初）の要素の並び順のキーの値を
+    カーソルとして受け取り、「そのキーより後ろ（前）」の条件で絞り込む。
+    COUNT(*)を実行せず、ページが深くなっても取得のコストが変わらない。
+
+    並び順の最後のフィールドは一意である必要がある（idなど）。
+    NULLの値は並び順の向きに関わらず最後に並べる。
+
+    Args:
+        queryset (django.db.models.QuerySet): ページ分割するqueryset
+        per_page (int): 1ページの件数
+        ordering (list of str): 並び順（"-date_publish"のように降順は"-"を付ける）
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = [
+            (field_name.lstrip("-"), field_name.startswith("-"))
+            for field_name in ordering
+        ]
+        # 総件数は数えない
+        self.count = None
+
+    def get_page(self, cursor):
+        """
+        カーソルが指すページを返す。
+
+        Args:
+            cursor (str or None): カーソルのトークン。空文字列かNoneの場合は最初のページ
+
+        Raises:
+            InvalidCursor: カーソルのトークンを解釈できない場合
+        """
+        if not cursor:
+            position, reverse = None, False
+        else:
+            position, reverse = self.decode_cursor(cursor)
+
+        queryset = self.queryset.order_by(*self._order_by(reverse))
+        if position is not None:
+            queryset = queryset.filter(self._after(position, reverse))
+        items = list(queryset[: self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[: self.per_page]
+
+        if reverse:
+            items.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = position is not None, has_more
+        return CursorPage(items, self, has_previous, has_next)
+
+    def _order_by(self, reverse):
+        # 逆順に読む場合は向きを反転し、NULLを先頭に並べる
+        return [
+            OrderBy(
+                F(field_name),
+                descending=descending != reverse,
+                nulls_first=reverse,
+                nulls_last=not reverse,
+            )
+            for field_name, descending in self.ordering
+        ]
+
+    def _after(self, position, reverse):
+        """
+        並び順（reverseの場合は逆順）でpositionより後ろにある行の条件を返す。
+        """
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field_name, descending), value in zip(self.ordering, position):
+            lookup = "lt" if descending != reverse else "gt"
+            if not reverse:
+                # NULLは最後に並ぶ
+                if value is None:
+                    beyond = Q(pk__in=[])
+                else:
+                    beyond = Q(**{f"{field_name}__{lookup}": value}) | Q(
+                        **{f"{field_name}__isnull": True}
+                    )
+            else:
+                # 逆順ではNULLが先頭に並ぶ
+                if value is None:
+                    beyond = Q(**{f"{field_name}__isnull": False})
+                else:
+                    beyond = Q(**{f"{field_name}__{lookup}": value})
+            condition |= equal & beyond
+            if value is None:
+                equal &= Q(**{f"{field_name}__isnull": True})
+            else:
+                equal &= Q(**{field_name: value})
+        return condition
+
+    def get_position(self, item):
+        return [getattr(item, field_name) for field_name, _ in self.ordering]
+
+    def encode_cursor(self, position, reverse):
+        # 日時はマイクロ秒まで保持する（DjangoJSONEncoderはミリ秒に丸めるため使わない）
+        values = [
+            value.isoformat() if hasattr(value, "isoformat") else value
+            for value in position
+        ]
+        data = json.dumps({"p": values, "r": reverse})
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            padding = "=" * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            values, reverse = data["p"], bool(data["r"])
+            if len(values) != len(self.ordering):
+                raise InvalidCursor()
+            position = []
+            for (field_name, _), value in zip(self.ordering, values):
+                field = self.queryset.model._meta.get_field(field_name)
+                position.append(None if value is None else field.to_python(value))
+        except (
+            binascii.Error,
+            UnicodeDecodeError,
+            ValueError,
+            TypeError,
+            KeyError,
+            ValidationError,
+        ) as e:
+            raise InvalidCursor() from e
+        return position, reverse
+
+
+class CursorPage(Sequence):
+    """
+    CursorPaginatorが返すページ。
+
+    django.core.paginator.Pageと同様にobject_list・has_next・has_previous等を持つが、
+    ページ番号の代わりに前後のページのカーソル（トークン）を持つ。
+    """
+
+    def __init__(self, object_list, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __repr__(self):
+        return f"<CursorPage of {len(self.object_list)} items>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        position = self.paginator.get_position(self.object_list[-1])
+        return self.paginator.encode_cursor(position, reverse=False)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        position = self.paginator.get_position(self.object_list[0])
+        return self.paginator.encode_cursor(position, reverse=True)
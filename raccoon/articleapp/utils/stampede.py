@@ -0,0 +1,95 @@
+import math
+import random
+import time
+
+# 値を計算中のプロセスが無い場合に、計算の完了を待つ間隔（秒）
+POLL_INTERVAL = 0.05
+
+
+def _is_fresh(entry, version, beta):
+    """
+    保存された値をそのまま使ってよいかを返す。
+
+    有効期限が近づくほど高い確率で期限切れとして扱い（probabilistic early
+    expiration）、計算に時間がかかる値ほど早めに計算し直す。
+    """
+    if entry["version"] != version:
+        return False
+    early = entry["delta"] * beta * -math.log(1.0 - random.random())
+    return time.time() + early < entry["expires_at"]
+
+
+def get_or_set(
+    cache,
+    key,
+    compute,
+    timeout,
+    stale_timeout,
+    version=None,
+    lock_timeout=10,
+    wait_timeout=1.0,
+    beta=1.0,
+):
+    """
+    キャッシュから値を取得し、無いか期限切れの場合はcompute()で計算して保存する。
+
+    期限切れの値を計算し直すのは、cache.addでロックを取得できた1つの呼び出しのみで、
+    その間の他の呼び出しには期限切れの値を返す（stale-while-revalidate）。
+    値が無いか版が異なる場合は、古い値は返さずにロックを取得した呼び出しの計算を
+    wait_timeout秒まで待ち、終わらなければ自分で計算する。
+    Django のキャッシュの API のみを使うため、LocMemCache でも動作する。
+
+    Args:
+        cache (django.core.cache.backends.base.BaseCache): 使用するキャッシュ
+        key (str): キャッシュのキー
+        compute (callable): 値を計算する関数
+        timeout (int): 値を計算し直すまでの秒数
+        stale_timeout (int): 期限切れ後も計算中の代わりに返してよい秒数
+        version (str): 値の版。保存された値と異なる場合は期限切れとして扱う
+        lock_timeout (int): ロックを保持する最大の秒数
+        wait_timeout (float): 値が無い場合に他の呼び出しの計算を待つ最大の秒数
+        beta (float): 期限切れ前に計算し直す確率の大きさ（0で無効）
+
+    Returns:
+        compute()の結果
+    """
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(entry, version, beta):
+        return entry["value"]
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, True, lock_timeout):
+        try:
+            return _compute_and_set(
+                cache, key, compute, timeout, stale_timeout, version
+            )
+        finally:
+            cache.delete(lock_key)
+
+    # 他の呼び出しが計算中
+    # 期限切れの値は返してよいが、版が異なる（明示的に無効化された）値は返さない
+    if entry is not None and entry["version"] == version:
+        return entry["value"]
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry["version"] == version:
+            return entry["value"]
+    # 待っても計算が終わらない場合は自分で計算する
+    return _compute_and_set(cache, key, compute, timeout, stale_timeout, version)
+
+
+def _compute_and_set(cache, key, compute, timeout, stale_timeout, version):
+    started_at = time.time()
+    value = compute()
+    finished_at = time.time()
+    entry = {
+        "value": value,
+        "version": version,
+        # 計算にかかった秒数（期限切れ前に計算し直す確率に使う）
+        "delta": finished_at - started_at,
+        "expires_at": finished_at + timeout,
+    }
+    cache.set(key, entry, timeout + stale_timeout)
+    return value
@@ -0,0 +1,212 @@
+import bisect
+import heapq
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+
+from ..models import Tag
+
+# 部分一致の検索に使うn-gramの最大の文字数（1文字からこの文字数までのn-gramを索引に登録する）
+NGRAM_SIZE = 2
+
+# 並び順
+ORDER_POPULAR = "popular"  # 公開中の投稿数の多い順（同数はidの順）
+ORDER_NAME = "name"  # 名前の順
+ORDERINGS = [ORDER_POPULAR, ORDER_NAME]
+
+
+def normalize(text):
+    """
+    検索用にタグの名前を正規化する（全角の英数字を半角にし、大文字小文字を区別しない）
+    """
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def ngrams(text):
+    """
+    1文字からNGRAM_SIZE文字までのn-gramの集合を返す
+    """
+    return {
+        text[i : i + n]
+        for n in range(1, NGRAM_SIZE + 1)
+        for i in range(len(text) - n + 1)
+    }
+
+
+class TagAutocomplete:
+    """
+    タグの名前の入力補完に使う索引をプロセス内に保持する。
+
+    前方一致するタグは正規化した名前の順のリストを二分探索して探し、
+    件数が足りない場合はn-gramの転置索引で部分一致するタグを探して後ろに加える。
+
+    タグの作成・名前の変更・削除はシグナルでadd()・remove()を呼び出して反映する。
+    公開中の投稿数（人気の順の並び替えに使う）の変化や他のプロセスでの変更は
+    反映されないため、settings.TAG_AUTOCOMPLETE_TIMEOUT秒ごとに全て読み込み直す。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._expires_at = 0.0
+        # タグのid -> (名前, 正規化した名前, 公開中の投稿数)
+        self._tags = {}
+        # (正規化した名前, id)の昇順のリスト（前方一致の検索に使う）
+        self._prefix_index = []
+        # (-公開中の投稿数, id)の昇順のリスト（キーワードが空の場合に使う）
+        self._popular_index = []
+        # n-gram -> 正規化した名前にそのn-gramを含むタグのidの集合
+        self._ngram_index = {}
+
+    def invalidate(self):
+        """
+        保持している索引を破棄し、次回の検索時に読み込み直す
+        """
+        with self._lock:
+            self._expires_at = 0.0
+            self._tags = {}
+            self._prefix_index = []
+            self._popular_index = []
+            self._ngram_index = {}
+
+    def is_loaded(self):
+        return self._expires_at > 0.0
+
+    def ensure_loaded(self):
+        """
+        索引を読み込んでいないか、読み込んでから一定時間が経っていれば読み込み直す
+        """
+        if time.monotonic() >= self._expires_at:
+            with self._lock:
+                if time.monotonic() >= self._expires_at:
+                    self._load()
+
+    def _load(self):
+        rows = Tag.objects.values_list("id", "name", "published_post_count")
+        self._tags = {}
+        self._ngram_index = {}
+        for tag_id, name, count in rows:
+            self._tags[tag_id] = (name, normalize(name), count)
+            self._add_ngrams(tag_id)
+        self._prefix_index = sorted(
+            (key, tag_id) for tag_id, (_, key, _) in self._tags.items()
+        )
+        self._popular_index = sorted(
+            (-count, tag_id) for tag_id, (_, _, count) in self._tags.items()
+        )
+        self._expires_at = time.monotonic() + settings.TAG_AUTOCOMPLETE_TIMEOUT
+
+    def _add_ngrams(self, tag_id):
+        for gram in ngrams(self._tags[tag_id][1]):
+            self._ngram_index.setdefault(gram, set()).add(tag_id)
+
+    def _discard(self, tag_id):
+        _, key, count = self._tags.pop(tag_id)
+        self._prefix_index.pop(bisect.bisect_left(self._prefix_index, (key, tag_id)))
+        self._popular_index.pop(
+            bisect.bisect_left(self._popular_index, (-count, tag_id))
+        )
+        for gram in ngrams(key):
+            ids = self._ngram_index[gram]
+            ids.discard(tag_id)
+            if not ids:
+                del self._ngram_index[gram]
+        return count
+
+    def add(self, tag_id, name):
+        """
+        作成されたタグを索引に追加する（既にあれば名前を更新する）
+
+        索引を読み込んでいない場合は、次回の読み込みで反映されるため何もしない。
+
+        Args:
+            tag_id (int): タグのid
+            name (str): タグの名前
+        """
+        with self._lock:
+            if not self.is_loaded():
+                return
+            count = self._discard(tag_id) if tag_id in self._tags else 0
+            key = normalize(name)
+            self._tags[tag_id] = (name, key, count)
+            bisect.insort(self._prefix_index, (key, tag_id))
+            bisect.insort(self._popular_index, (-count, tag_id))
+            self._add_ngrams(tag_id)
+
+    def remove(self, tag_id):
+        """
+        削除されたタグを索引から取り除く
+
+        Args:
+            tag_id (int): タグのid
+        """
+        with self._lock:
+            if tag_id in self._tags:
+                self._discard(tag_id)
+
+    def search(self, keyword="", limit=20, order=ORDER_POPULAR):
+        """
+        名前がキーワードに一致するタグを探す。
+
+        Args:
+            keyword (str): 検索キーワード（空文字の場合は全てのタグが対象）
+            limit (int): 返すタグの最大の個数
+            order (str): 並び順（ORDER_POPULAR、ORDER_NAME）
+
+        Returns:
+            list of dict: タグのidと名前（"id"、"name"）。
+                前方一致するタグを並び順に並べ、その後に部分一致するタグを並べる
+        """
+        self.ensure_loaded()
+        key = normalize(keyword)
+        with self._lock:
+            if not key and order == ORDER_POPULAR:
+                tag_ids = [tag_id for _, tag_id in self._popular_index[:limit]]
+            else:
+                tag_ids = self._search_prefix(key, limit, order)
+            if key and len(tag_ids) < limit:
+                tag_ids += self._search_substring(key, limit - len(tag_ids), order)
+            return [{"id": tag_id, "name": self._tags[tag_id][0]} for tag_id in tag_ids]
+
+    def _sort_key(self, order):
+        if order == ORDER_NAME:
+            return lambda tag_id: (self._tags[tag_id][1], tag_id)
+        return lambda tag_id: (-self._tags[tag_id][2], tag_id)
+
+    def _search_prefix(self, key, limit, order):
+        start = bisect.bisect_left(self._prefix_index, (key,))
+        end = bisect.bisect_left(self._prefix_index, (key + chr(0x10FFFF),))
+        if order == ORDER_NAME:
+            # 名前の順に並んでいるため先頭から取り出せばよい
+            return [
+                tag_id
+                for _, tag_id in self._prefix_index[start : min(end, start + limit)]
+            ]
+        matched = (tag_id for _, tag_id in self._prefix_index[start:end])
+        return heapq.nsmallest(limit, matched, key=self._sort_key(order))
+
+    def _search_substring(self, key, limit, order):
+        if len(key) <= NGRAM_SIZE:
+            candidates = self._ngram_index.get(key, set())
+        else:
+            # キーワードのn-gramを全て含むタグに絞り込んでから部分一致を確認する
+            sets = sorted(
+                (
+                    self._ngram_index.get(key[i : i + NGRAM_SIZE], set())
+                    for i in range(len(key) - NGRAM_SIZE + 1)
+                ),
+                key=len,
+            )
+            candidates = sets[0].intersection(*sets[1:])
+        matched = (
+            tag_id
+            for tag_id in candidates
+            if key in self._tags[tag_id][1]
+            and not self._tags[tag_id][1].startswith(key)
+        )
+        return heapq.nsmallest(limit, matched, key=self._sort_key(order))
+
+
+# searchビューのタグの入力補完（search_tagsビュー）に使う
+tag_autocomplete = TagAutocomplete()
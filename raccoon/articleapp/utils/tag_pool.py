@@ -0,0 +1,67 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from ..models import Tag
+
+
+class TagPool:
+    """
+    公開中の投稿が1つ以上あるタグ（Tag.published_post_countが1以上）のidを
+    プロセス内に保持し、ランダムに取り出す。
+
+    タグのidの一覧はsettings.TAG_POOL_TIMEOUT秒ごとに読み込み直す。
+    投稿の公開状態やタグの紐づけが変わった場合はシグナルでinvalidate()を呼び出すが、
+    他のプロセスには伝わらないため、取り出したタグは毎回DBで条件を確認し直す。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tag_ids = []
+        self._expires_at = 0.0
+
+    def invalidate(self):
+        """
+        保持しているタグのidを破棄し、次回の取り出し時に読み込み直す
+        """
+        self._expires_at = 0.0
+
+    def get_tag_ids(self):
+        """
+        公開中の投稿が1つ以上あるタグのidの一覧を返す
+        """
+        if time.monotonic() >= self._expires_at:
+            with self._lock:
+                if time.monotonic() >= self._expires_at:
+                    self._tag_ids = list(
+                        Tag.objects.filter(published_post_count__gt=0).values_list(
+                            "id", flat=True
+                        )
+                    )
+                    self._expires_at = time.monotonic() + settings.TAG_POOL_TIMEOUT
+        return self._tag_ids
+
+    def sample(self, k):
+        """
+        公開中の投稿が1つ以上あるタグを最大k個ランダムに選んで返す。
+
+        Args:
+            k (int): 選ぶタグの個数
+
+        Returns:
+            list of Tag: 選んだタグ（ランダムな順）
+        """
+        tag_ids = self.get_tag_ids()
+        # 読み込んだ後に条件を満たさなくなったタグを除いてもk個残るよう多めに選ぶ
+        sampled_ids = random.sample(tag_ids, min(k * 2, len(tag_ids)))
+        if not sampled_ids:
+            return []
+        tags = Tag.objects.filter(id__in=sampled_ids, published_post_count__gt=0)
+        tags_by_id = {tag.id: tag for tag in tags}
+        return [tags_by_id[id] for id in sampled_ids if id in tags_by_id][:k]
+
+
+# トップページに表示するタグの取り出しに使う
+published_tag_pool = TagPool()
@@ -0,0 +1,120 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from PIL import Image, UnidentifiedImageError
+
+# 画像の形式・大きさを判別するために読み込むファイルの先頭の最大バイト数
+IMAGE_HEADER_MAX_BYTES = 256 * 1024
+
+
+def check_image_header(data):
+    """
+    画像のファイルの先頭のバイト列から形式と大きさを確認する（全体は展開しない）。
+
+    Args:
+        data (bytes): ファイルの先頭のバイト列
+
+    Returns:
+        str or None: 問題がある場合はエラーメッセージ、無い場合はNone
+
+    Raises:
+        ValueError: 形式・大きさを判別するにはバイト列が足りない場合
+    """
+    try:
+        with Image.open(BytesIO(data)) as image:
+            image_format = image.format
+            width, height = image.size
+    except Image.DecompressionBombError:
+        return "画像の大きさが大きすぎます。"
+    except (UnidentifiedImageError, OSError, SyntaxError) as e:
+        raise ValueError("画像の形式を判別できません。") from e
+
+    if image_format not in settings.PROFILE_IMAGE_FORMATS:
+        return f"{image_format}形式の画像はアップロードできません。"
+    if width * height > settings.PROFILE_IMAGE_MAX_PIXELS:
+        return (
+            f"画像の大きさ（{width}×{height}）が大きすぎます。"
+            f"{settings.PROFILE_IMAGE_MAX_PIXELS}ピクセル以下の画像にしてください。"
+        )
+    return None
+
+
+class ProfileImageUploadHandler(FileUploadHandler):
+    """
+    プロフィール画像のアップロードを受信しながら確認するアップロードハンドラ。
+
+    ファイルの大きさ、送信されたContent-Type、先頭のバイト列から判別した
+    画像の形式と縦横のピクセル数を確認し、問題があればその時点で受信を打ち切る
+    （SkipFileでファイルを破棄し、以降のデータは保存しない）。
+    展開後に巨大になる画像（decompression bomb）も展開せずに拒否できる。
+
+    エラーはrequest.upload_errorsに{フィールド名: メッセージ}で記録し、
+    フォーム（ProfileUpdateForm）のエラーとして表示する。
+    受信したデータは後続のハンドラ（FILE_UPLOAD_HANDLERS）に渡して保存させる。
+    """
+
+    field_names = ["profile_image"]
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        if request is not None and not hasattr(request, "upload_errors"):
+            request.upload_errors = {}
+        self.checking = False
+
+    def new_file(self, field_name, file_name, content_type, *args, **kwargs):
+        super().new_file(field_name, file_name, content_type, *args, **kwargs)
+        self.checking = field_name in self.field_names
+        self.header = b""
+        self.header_checked = False
+        if not self.checking:
+            return
+        if content_type not in settings.PROFILE_IMAGE_CONTENT_TYPES:
+            self.reject("画像ファイル（JPEG、PNG、GIF、WebP）を選択してください。")
+        if (
+            self.content_length
+            and self.content_length > settings.PROFILE_IMAGE_MAX_SIZE
+        ):
+            self.reject_too_large()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.checking:
+            return raw_data
+
+        if start + len(raw_data) > settings.PROFILE_IMAGE_MAX_SIZE:
+            self.reject_too_large()
+
+        if not self.header_checked:
+            self.header += raw_data
+            try:
+                error = check_image_header(self.header)
+            except ValueError as e:
+                # 先頭の一定のバイト数までに判別できなければ画像ではないとみなす
+                if len(self.header) >= IMAGE_HEADER_MAX_BYTES:
+                    self.reject(str(e))
+            else:
+                if error is not None:
+                    self.reject(error)
+                self.header_checked = True
+                self.header = b""
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.checking and not self.header_checked:
+            # ファイル全体を受信した後に形式を確認する
+            # （ここではファイルを破棄できないため、エラーを記録してフォームで拒否する）
+            try:
+                error = check_image_header(self.header)
+            except ValueError as e:
+                error = str(e)
+            if error is not None:
+                self.request.upload_errors[self.field_name] = error
+        return None
+
+    def reject_too_large(self):
+        max_size_mb = settings.PROFILE_IMAGE_MAX_SIZE / 1024 / 1024
+        self.reject(f"{max_size_mb:g}MB以下の画像を選択してください。")
+
+    def reject(self, message):
+        self.request.upload_errors[self.field_name] = message
+        raise SkipFile()
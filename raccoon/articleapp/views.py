@@ -1,39 +1,55 @@
 import datetime
-import random
 
+from django.conf import settings
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
-from django.core.paginator import Paginator
-from django.db.models import Count, Q
-from django.http import JsonResponse, Http404
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, Http404
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.static import serve
 
 from .forms import AccountUpdateForm, PostForm, ProfileUpdateForm, UserCreationForm
+from .metrics import render_metrics
 from .models import Post, Tag, User
-from .utils.pagination import create_navigation_context_from_page
+from .search import get_search_backend
+from .storage import IMMUTABLE_CACHE_CONTROL, is_content_addressed
+from .utils import page_cache
+from .utils.conditional import (
+    conditional_page,
+    post_detail_validators,
+    user_home_validators,
+)
+from .utils.pagination import (
+    create_navigation_context_from_page,
+    freeze_page,
+    paginate_queryset,
+)
+from .utils.tag_autocomplete import ORDER_POPULAR, ORDERINGS, tag_autocomplete
+from .utils.tag_pool import published_tag_pool
+from .utils.uploads import ProfileImageUploadHandler
 from django.http import Http404
 
 
+# カーソルによるページ分割で使う並び順（Post.Meta.orderingにidを加えたもの）
+POST_CURSOR_ORDERING = ["-date_publish", "-created_at", "-id"]
+
+
 # Create your views here.
+@page_cache.cache_page_for_anonymous(lambda request: [page_cache.SCOPE_INDEX])
 def index(request):
-    # tagをランダムに10個取得
-    tags = list(
-        Tag.objects.filter(
-            # 少なくとも1つ以上の投稿が公開されているタグのみにする
-            post__is_published__exact=True
-        ).distinct()  # 重複を除外
-    )
-    tags_sample = []
-    random_indexes = random.sample(range(len(tags)), min([10, len(tags)]))
-    for index in random_indexes:
-        tags_sample.append(tags[index])
+    # 公開中の投稿が1つ以上あるタグをランダムに10個取得
+    tags_sample = published_tag_pool.sample(10)
 
     # Postの新着5件を取得
     # デフォルトの並び順は投稿日の降順→created_atの降順
-    posts = Post.objects.filter(is_published=True)[0:5]
+    posts = page_cache.get_listing(
+        "index",
+        lambda: list(Post.objects.for_listing().filter(is_published=True)[0:5]),
+    )
 
     return render(
         request, "articleapp/index.html", {"posts": posts, "tags": tags_sample}
@@ -41,26 +57,14 @@ def index(request):
 
 
 def search(request):
-    queryset = Post.objects.all()
+    queryset = Post.objects.for_listing()
     querydict = request.GET
     context = {}
 
     # フィルタ: タグ
     if "tags" in querydict:
-        # 空のquerysetを生成
-        posts_filtered_tags = Post.objects.none()
-
-        # タグ名からタグのリストを生成
-        tags_name = querydict.getlist("tags")
-        tags = Tag.objects.filter(name__in=tags_name)
-        for tag in tags:
-            posts_filtered_tags = posts_filtered_tags | Post.objects.filter(tags=tag)
-
-        posts_filtered_tags = posts_filtered_tags.annotate(
-            post_count=Count("id")
-        ).filter(post_count__exact=len(tags))
-
-        queryset = posts_filtered_tags
+        # 指定されたタグを全て持つ投稿に絞り込む
+        queryset = queryset.filter_tags(querydict.getlist("tags"))
 
     # フィルタ: 期間_開始
     if "period_start_date" in querydict:
@@ -90,101 +94,83 @@ def search(request):
     # フィルタ:検索キーワード
     if "keyword" in querydict:
         keywords = querydict["keyword"].split()  # 全角/半角スペースで区切る
+        # 全文検索の索引を使って絞り込む（索引の種類はデータベースによって異なる）
+        search_backend = get_search_backend()
         for keyword in keywords:
-            queryset = queryset.filter(
-                Q(title__icontains=keyword) | Q(body__icontains=keyword)
-            )
+            queryset = search_backend.filter(queryset, keyword)
 
     # フィルタ: 並び順
     # デフォルトの並び順は投稿日の降順→created_atの降順
+    # カーソルによるページ分割ではidを加えて並び順を一意にする
+    cursor_ordering = POST_CURSOR_ORDERING
     if "sort" in querydict:
         sort_value = querydict["sort"]
         if sort_value == "date_publish_desc":
             pass  # 何もしない
         if sort_value == "date_publish_asc":
             queryset = queryset.order_by("date_publish", "created_at")
+            cursor_ordering = ["date_publish", "created_at", "id"]
 
     # 公開中の投稿のみを表示する
     queryset = queryset.filter(is_published__exact=True)
 
-    # ページネーション
-    paginate_by = 10
-    if "paginate_by" in querydict:
-        try:
-            paginate_by = int(querydict["paginate_by"])
-        except ValueError:
-            pass
-
-    paginator = Paginator(queryset, paginate_by)
-    page_number = 1
-    if "page" in querydict:
-        try:
-            page_number = int(querydict["page"])
-        except ValueError:
-            # intに変換できない値はスルー
-            pass
-    page = paginator.get_page(page_number)
+    # ページネーション（cursorパラメータがあればカーソルによるページ分割）
+    # 同じ条件の検索結果のページはキャッシュする
+    page = page_cache.get_listing(
+        f"search?{page_cache.normalize_query(querydict)}",
+        lambda: freeze_page(paginate_queryset(queryset, querydict, cursor_ordering)),
+    )
     context["post_list_page"] = page
-
     # ページネーションのナビゲーションに表示する番号を予め決めておく
-    pagination_nav_numbers = []
-    pagination_nav_display_first = False
-    pagination_nav_display_last = False
-
-    # 現在のページを中心として前後最大5ページ分を表示する
-    # 上記の内、最初・最後のページを優先して表示する
-    if paginator.num_pages >= 5:
-        # 最初に、現在のページを真ん中にする
-        left = page.number - 2
-        right = page.number + 2
-        # 左側か右側がページ範囲を逸脱する場合、その分を他方の側に加える
-        if left < 1:
-            right = right + (1 - left)
-            left = 1
-        elif right > paginator.num_pages:
-            left = left - (right - paginator.num_pages)
-            right = paginator.num_pages
-        pagination_nav_numbers = list(range(left, right + 1))
-        # 左端が2以上の場合、左端の代わりに最初のページを表示する
-        if left > 1:
-            pagination_nav_numbers.remove(left)
-            pagination_nav_display_first = True
-        # 右端が最後のページの1個前以下の場合、代わりに最後のページを表示する
-        if right < paginator.num_pages:
-            pagination_nav_numbers.remove(right)
-            pagination_nav_display_last = True
-    else:
-        pagination_nav_numbers = list(range(1, paginator.num_pages + 1))
-
-    context["post_list_pagination_nav"] = {
-        "numbers": pagination_nav_numbers,
-        "display_first": pagination_nav_display_first,
-        "display_last": pagination_nav_display_last,
-    }
+    context["post_list_pagination_nav"] = create_navigation_context_from_page(page)
 
     return render(request, "articleapp/search.html", context)
 
 
 def search_tags(request):
-    keyword = request.GET.get("keyword")
-    tags = Tag.objects.all()
-    if keyword is not None:
-        tags = tags.filter(name__icontains=keyword)
-    data = {"tags": list(tags.values())}
-    return JsonResponse(data)
-
-
+    querydict = request.GET
+    # 返すタグの個数（上限はsettings.TAG_AUTOCOMPLETE_MAX_LIMIT）
+    limit = settings.TAG_AUTOCOMPLETE_LIMIT
+    if "limit" in querydict:
+        try:
+            limit = int(querydict["limit"])
+        except ValueError:
+            # intに変換できない値はスルー
+            pass
+    limit = max(1, min(limit, settings.TAG_AUTOCOMPLETE_MAX_LIMIT))
+    # 並び順（既定は公開中の投稿数の多い順）
+    order = querydict.get("order", ORDER_POPULAR)
+    if order not in ORDERINGS:
+        order = ORDER_POPULAR
+
+    # プロセス内の索引で前方一致→部分一致の順に探す（DBは索引の読み込み時のみ使う）
+    keyword = querydict.get("keyword", "").strip()
+    tags = tag_autocomplete.search(keyword, limit, order)
+    return JsonResponse({"tags": tags})
+
+
+@conditional_page(post_detail_validators)
+@page_cache.cache_page_for_anonymous(
+    lambda request, username, slug: [page_cache.user_scope(username)]
+)
 def post_detail(request, username, slug):
     user = get_object_or_404(
-        User, username=username, is_staff=False, is_superuser=False
+        User, username=username, is_staff=False, is_superuser=False, is_active=True
+    )
+    post = get_object_or_404(
+        Post.objects.select_related("user").prefetch_related("tags"),
+        user=user,
+        slug=slug,
     )
-    post = get_object_or_404(Post, user=user, slug=slug)
     if post.is_published is False and request.user != user:
         raise Http404()
+    post.ensure_body_html()
 
-    other_posts = Post.objects.filter(user=user, is_published=True).exclude(id=post.id)[
-        0:5
-    ]
+    other_posts = (
+        Post.objects.for_listing()
+        .filter(user=user, is_published=True)
+        .exclude(id=post.id)[0:5]
+    )
     context = {"post": post, "post_user": user, "other_posts": other_posts}
     return render(request, "articleapp/post_detail.html", context)
 
@@ -206,6 +192,10 @@ def signup(request):
         return render(request, "articleapp/signup.html", {"form": form})
 
 
+@conditional_page(user_home_validators)
+@page_cache.cache_page_for_anonymous(
+    lambda request, username, drafts=False: [page_cache.user_scope(username)]
+)
 def user_home(request, username, drafts=False):
     querydict = request.GET
     context = {}
@@ -220,44 +210,39 @@ def user_home(request, username, drafts=False):
         context["is_logged_in_user_home"] = True
 
     # ユーザーの公開中の投稿取得
-    posts = Post.objects.filter(user=user_to_display, is_published=True)
+    posts = Post.objects.for_listing().filter(user=user_to_display, is_published=True)
 
     # 下書き一覧がリクエストされ、かつログイン中のユーザーであれば、下書きを取得する
     if drafts:
         if request.user.is_authenticated and request.user == user_to_display:
-            posts = Post.objects.filter(user=user_to_display, is_published=False)
+            posts = Post.objects.for_listing().filter(
+                user=user_to_display, is_published=False
+            )
             # コンテキストで下書き一覧であることのフラグを保持
             context["drafts"] = True
         else:
             # ログイン中のユーザーでなければ通常のユーザーページにリダイレクトする
             return redirect("user_home", username=username)
 
-    # ページネーション
-    # ページネーター作成
-    paginate_by = 10
-    if "paginate_by" in querydict:
-        try:
-            paginate_by = int(querydict["paginate_by"])
-        except ValueError:
-            pass
-    paginator = Paginator(posts, paginate_by)
-    # ページ作成
-    page_number = 1
-    if "page" in querydict:
-        try:
-            page_number = int(querydict["page"])
-        except ValueError:
-            # intに変換できない値はスルー
-            pass
-    page = paginator.get_page(page_number)
+    # ページネーション（cursorパラメータがあればカーソルによるページ分割）
+    page = paginate_queryset(posts, querydict, POST_CURSOR_ORDERING)
     context["post_list_page"] = page
     context["post_list_pagination_nav"] = create_navigation_context_from_page(page)
 
     return render(request, "articleapp/user_home.html", context)
 
 
+@csrf_exempt
 @login_required
 def user_settings(request, current_menu_item="profile"):
+    # CSRFの検証でリクエストボディが読み込まれる前にアップロードハンドラを追加する
+    # （CSRFの検証は_user_settingsで行う）
+    request.upload_handlers.insert(0, ProfileImageUploadHandler(request))
+    return _user_settings(request, current_menu_item)
+
+
+@csrf_protect
+def _user_settings(request, current_menu_item):
     context = {"current_menu_item": current_menu_item}
     context["menu_items"] = [
         {"name": "profile", "label": "プロフィール", "url_name": "user_settings_profile"},
@@ -270,7 +255,12 @@ def user_settings(request, current_menu_item="profile"):
 
     if request.method == "POST":
         if current_menu_item == "profile":
-            form = ProfileUpdateForm(request.POST, request.FILES, instance=request.user)
+            form = ProfileUpdateForm(
+                request.POST,
+                request.FILES,
+                instance=request.user,
+                upload_errors=request.upload_errors,
+            )
         elif current_menu_item == "account":
             form = AccountUpdateForm(request.POST, instance=request.user)
 
@@ -413,3 +403,36 @@ def post_update(request, username, slug):
     context["form"] = form
 
     return render(request, "articleapp/post_form.html", context)
+
+
+def serve_media(request, path, document_root=None):
+    """
+    開発用のメディアファイルの配信（本番環境ではWebサーバーで配信する）
+
+    ContentAddressedStorageで保存したファイルは内容が変わらないため、
+    期限なくキャッシュさせる。
+    """
+    response = serve(request, path, document_root=document_root)
+    if response.status_code == 200 and is_content_addressed(path):
+        response["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def metrics(request):
+    """
+    Prometheusが収集するメトリクス（articleapp.metrics.render_metricsを参照）
+
+    settings.METRICS_TOKENを設定した場合は「Authorization: Bearer トークン」を必須にする。
+    設定していない場合は、開発環境（DEBUG=True）以外では公開しない（404を返す）。
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            raise Http404()
+    elif not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "articleapp.middleware.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -59,7 +60,8 @@ ROOT_URLCONF = "raccoon.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # 描画時間を計測する（articleapp.middleware.RequestTimingMiddleware）
+        "BACKEND": "articleapp.utils.instrumentation.DjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -138,3 +140,95 @@ MEDIA_URL = "media/"
 LOGIN_REDIRECT_URL = "index"
 LOGIN_URL = "login"
 LOGOUT_REDIRECT_URL = "index"
+
+# 投稿のキーワード検索に利用するバックエンドのクラスのパス
+# Noneの場合はデータベースの種類から決定する（articleapp.search.get_search_backend）
+POST_SEARCH_BACKEND = None
+
+# n-gramの転置索引（NgramSearchBackend）の1トークンの文字数
+# 変更した場合はrebuild_search_indexコマンドで索引を作り直す
+POST_SEARCH_NGRAM_SIZE = 2
+
+# ページネーションで総件数を正確に数える上限（超えた場合は推定値か「1000+」と表示）
+PAGINATION_COUNT_CAP = 1000
+
+# 上限を超えた総件数をキャッシュする秒数
+PAGINATION_COUNT_CACHE_TIMEOUT = 300
+
+# 投稿の本文（マークダウン）をHTMLに変換する際の拡張機能
+# 変更した場合はrerender_post_bodiesコマンドで投稿を再描画する
+POST_MARKDOWN_EXTENSIONS = ["fenced_code", "codehilite", "tables", "nl2br"]
+POST_MARKDOWN_EXTENSION_CONFIGS = {
+    "codehilite": {"css_class": "codehilite", "guess_lang": False},
+}
+
+# トップページに表示するタグの候補（公開中の投稿があるタグのid）を読み込み直す秒数
+TAG_POOL_TIMEOUT = 60
+
+# タグの入力補完（search_tags）の索引を読み込み直す秒数（公開中の投稿数の変化を反映する）
+TAG_AUTOCOMPLETE_TIMEOUT = 300
+# タグの入力補完で返すタグの個数（limitパラメータの既定値と上限）
+TAG_AUTOCOMPLETE_LIMIT = 20
+TAG_AUTOCOMPLETE_MAX_LIMIT = 100
+
+# キャッシュ
+# 未ログインのユーザー向けのページのキャッシュ（pages）は無効化に使う世代も保存するため、
+# 複数のプロセスで動かす場合はプロセス間で共有できるバックエンドを設定する
+# （production.pyではDJANGO_REDIS_URLのRedisを使い、設定されていなければ無効にする）
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "pages": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "pages",
+    },
+    "fragments": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "fragments",
+    },
+}
+
+# 未ログインのユーザー向けのページのキャッシュに使うキャッシュのエイリアスと秒数
+PAGE_CACHE_ALIAS = "pages"
+PAGE_CACHE_TIMEOUT = 600
+
+# 投稿の一覧の項目（カード）の描画結果のキャッシュに使うキャッシュのエイリアスと秒数
+POST_CARD_CACHE_ALIAS = "fragments"
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# トップページ・検索結果の一覧をキャッシュする秒数と、期限切れ後に計算し直す間だけ
+# 古い一覧を返してよい秒数（キャッシュはPAGE_CACHE_ALIASを使う）
+LISTING_CACHE_TIMEOUT = 60
+LISTING_CACHE_STALE_TIMEOUT = 300
+
+# タスク（runworkerコマンドで実行する処理）の最大の実行回数と再実行までの秒数
+# （再実行までの秒数は失敗するたびに2倍にし、TASK_RETRY_MAX_DELAYを上限とする）
+TASK_MAX_ATTEMPTS = 3
+TASK_RETRY_BASE_DELAY = 10
+TASK_RETRY_MAX_DELAY = 60 * 60
+# 実行中のタスクのワーカーからこの秒数応答が無い場合は、中断したとみなして再実行する
+TASK_LOCK_TIMEOUT = 60 * 10
+
+# プロフィール画像としてアップロードできるファイル（utils.uploads.ProfileImageUploadHandler）
+# 最大のバイト数、最大のピクセル数（幅×高さ）、画像の形式（Pillowの形式名）、Content-Type
+PROFILE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+PROFILE_IMAGE_MAX_PIXELS = 4096 * 4096
+PROFILE_IMAGE_FORMATS = ["JPEG", "PNG", "GIF", "WEBP"]
+PROFILE_IMAGE_CONTENT_TYPES = ["image/jpeg", "image/png", "image/gif", "image/webp"]
+
+# リクエストの計測（articleapp.middleware.RequestTimingMiddleware）
+# Server-Timingヘッダを付けるか（処理の内訳が利用者に見えるため開発環境のみ）
+SERVER_TIMING_HEADER = False
+# 超えた場合に警告を出力するSQLの実行回数とリクエスト全体の処理時間（ミリ秒）。Noneで無効
+REQUEST_QUERY_BUDGET = None
+REQUEST_TIME_BUDGET = None
+
+# /metrics（articleapp.metrics）
+# プロセスごとの集計結果を書き込むディレクトリ（Noneの場合は処理中のプロセスのみ出力）
+METRICS_DIRECTORY = None
+# 集計結果をファイルに書き込む最短の間隔（秒）
+METRICS_FLUSH_INTERVAL = 5
+# 設定した場合は「Authorization: Bearer トークン」の無いリクエストを拒否する
+# （設定しない場合、DEBUG=False では/metricsは404を返す）
+METRICS_TOKEN = None
@@ -17,6 +17,17 @@ DATABASES = {
 SECRET_KEY = "django-insecure-m=$(!zp$+6&o#4@bqbi@gac@p2f=rx$*9r#t@wx_3!dmk6ie4+"
 
 
+# テンプレート等の変更をすぐに確認できるよう、ページ・部分テンプレートのキャッシュは無効にする
+CACHES["pages"] = {
+    "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+}
+CACHES["fragments"] = {
+    "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+}
+
+# ブラウザの開発者ツールでリクエストの処理時間の内訳を確認できるようにする
+SERVER_TIMING_HEADER = True
+
 # ホットリロード用の設定
 INSTALLED_APPS += ["django_browser_reload"]
 
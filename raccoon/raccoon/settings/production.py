@@ -21,6 +21,37 @@ DATABASES = {
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
 
+# キャッシュ
+# 投稿の公開・編集時のページのキャッシュの無効化（世代の更新）を全てのワーカーに反映するため、
+# DJANGO_REDIS_URL（例: redis://127.0.0.1:6379/0）のRedisを全てのワーカーで共有する。
+# 設定されていない場合は、他のワーカーが無効化されていない古いページを返さないよう
+# ページ・一覧のキャッシュ（pages）を無効にする
+# （投稿のカードのキャッシュ（fragments）はキーに更新日時等を含むためワーカーごとでもよい）
+REDIS_URL = os.environ.get("DJANGO_REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        alias: {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": alias,
+        }
+        for alias in ["default", "pages", "fragments"]
+    }
+else:
+    CACHES["pages"] = {
+        "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+    }
+
+# MEDIA_URL配下の「xx/yy/（SHA-256）.拡張子」のファイル（articleapp.storage.ContentAddressedStorage）
+# は内容が変わらないため、Webサーバーで「Cache-Control: public, max-age=31536000, immutable」
+# を付けて配信する
+
+# gunicornの各ワーカーの集計結果を合計して/metricsで出力する
+# （終了したワーカーのファイルは集計時に削除する。サーバーごとのディレクトリを指定する）
+# DJANGO_METRICS_TOKENを設定しない場合、/metricsは404を返す
+METRICS_DIRECTORY = os.environ.get("DJANGO_METRICS_DIRECTORY")
+METRICS_TOKEN = os.environ.get("DJANGO_METRICS_TOKEN")
+
 # 以下の変数等も本ファイルで設定
 # MEDIA_ROOT
 # STATIC_ROOT